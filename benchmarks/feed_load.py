@@ -0,0 +1,171 @@
+"""Load test for the live standings stream with many idle subscribers.
+
+Serves the API (with a change feed) on a local port over a synthetic
+contest, opens --subscribers event streams that each read the standings
+snapshot and then sit idle, and makes --trades trades. Records:
+
+  snapshot_ms        time for every subscriber to connect and get its snapshot
+  fanout_ms          per trade, from calling process_trade until the last
+                     subscriber received its event (median / p99 / max)
+  process_trade_ms   the trade itself, including publishing (median)
+  get_leaderboard_ms a full leaderboard read, which polling viewers pay per refresh
+  event_bytes        size of one trade's event on the wire (median)
+  threads            threads in the process while every stream is open
+
+    python benchmarks/feed_load.py [--subscribers 500] [--trades 50] [--players 1000] [--output feed.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from api import ApiServer, create_app  # noqa: E402
+from cache import ReadCache  # noqa: E402
+from contest import ContestManager  # noqa: E402
+from database import init_db  # noqa: E402
+from feed import ChangeFeed  # noqa: E402
+from synthetic import generate_contest  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def subscribe(port, path, received):
+    """Read one event stream, recording (arrival time, size) of each event by id."""
+    # The snapshot is one line with every standings row
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=2 ** 24)
+    # HTTP/1.0, so the body is not chunked
+    writer.write(f"GET {path} HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    await writer.drain()
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    event_id, size = None, 0
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            size += len(line)
+            if line.startswith(b"id: "):
+                event_id = int(line[4:])
+            elif line == b"\n" and event_id is not None:
+                received[event_id] = (time.perf_counter(), size)
+                event_id, size = None, 0
+            elif line == b"\n":
+                size = 0
+    finally:
+        writer.close()
+
+
+async def wait_until(condition, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("subscribers did not catch up")
+        await asyncio.sleep(0.001)
+
+
+async def measure(subscribers, trades, players, seed=0):
+    with tempfile.TemporaryDirectory() as scratch:
+        db = init_db(os.path.join(scratch, "feed.db"))
+        cache, feed = ReadCache(), ChangeFeed()
+        manager = ContestManager(db, cache=cache, feed=feed)
+        contest = generate_contest(manager, players=players, tickers=20, trades=players * 5, seed=seed)
+        contest_id = contest["contest_id"]
+
+        port = free_port()
+        server = ApiServer(create_app(sessionmaker(bind=db.get_bind(), expire_on_commit=False), cache, feed),
+                           port=port)
+        server.start()
+        await wait_until(lambda: server.server.started)
+
+        loop = asyncio.get_running_loop()
+        streams = [{} for _ in range(subscribers)]
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(subscribe(port, f"/api/contests/{contest_id}/events", received))
+                 for received in streams]
+        await wait_until(lambda: all(streams))
+        snapshot_ms = (time.perf_counter() - start) * 1000
+        threads = threading.active_count()
+
+        rng = random.Random(seed)
+        dates = (contest["last_trade_date"] + timedelta(minutes=i + 1) for i in range(trades))
+        fanout, trade_ms, sizes = [], [], []
+        for date in dates:
+            player_id, ticker = rng.choice(contest["player_ids"]), rng.choice(contest["tickers"])
+            start = time.perf_counter()
+            await loop.run_in_executor(None, manager.process_trade, player_id, ticker, "BUY", 1, 100.0, date)
+            trade_ms.append((time.perf_counter() - start) * 1000)
+            seq = feed.latest(contest_id)
+            await wait_until(lambda: all(seq in received for received in streams))
+            fanout.append((max(received[seq][0] for received in streams) - start) * 1000)
+            sizes.append(streams[0][seq][1])
+
+        leaderboard_ms = []
+        for _ in range(5):
+            start = time.perf_counter()
+            ContestManager(db).get_leaderboard(contest_id)
+            leaderboard_ms.append((time.perf_counter() - start) * 1000)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.stop(timeout=10)
+        db.close()
+
+    fanout.sort()
+    return {
+        "subscribers": subscribers,
+        "trades": trades,
+        "players": players,
+        "snapshot_ms": snapshot_ms,
+        "fanout_ms": {
+            "median": statistics.median(fanout),
+            "p99": fanout[min(len(fanout) - 1, int(len(fanout) * 0.99))],
+            "max": fanout[-1],
+        },
+        "process_trade_ms": statistics.median(trade_ms),
+        "get_leaderboard_ms": statistics.median(leaderboard_ms),
+        "event_bytes": statistics.median(sizes),
+        "threads": threads,
+    }
+
+
+def run_load(subscribers=500, trades=50, players=1000, seed=0):
+    return asyncio.run(measure(subscribers, trades, players, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--trades", type=int, default=50)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    result = run_load(args.subscribers, args.trades, args.players)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
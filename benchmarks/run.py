@@ -0,0 +1,201 @@
+"""Benchmarks for ContestManager hot paths on synthetic contests.
+
+Run the suite at one or more scales and save the timings as JSON:
+
+    python benchmarks/run.py run --scales small medium --output after.json
+
+Compare two result files; exits non-zero if any operation's median got
+slower by more than --threshold (a fraction) and --min-delta-ms:
+
+    python benchmarks/run.py compare before.json after.json --threshold 0.2
+
+Reads are timed without the ReadCache, so they measure the queries.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from contest import ContestManager  # noqa: E402
+from database import init_db  # noqa: E402
+from synthetic import generate_contest  # noqa: E402
+
+# name -> (players, tickers, trades)
+SCALES = {
+    "small": (10, 20, 1_000),
+    "medium": (100, 100, 20_000),
+    "large": (1_000, 500, 200_000),
+}
+
+
+def summarize(timings_ms):
+    ordered = sorted(timings_ms)
+    return {
+        "n": len(ordered),
+        "min_ms": ordered[0],
+        "median_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "mean_ms": statistics.fmean(ordered),
+    }
+
+
+def time_calls(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def run_scale(name, players, tickers, trades, repeat, seed=0):
+    """Generate a contest at this scale in a scratch database and time each operation."""
+    with tempfile.TemporaryDirectory() as scratch:
+        db = init_db(os.path.join(scratch, "bench.db"))
+        manager = ContestManager(db)
+        rng = random.Random(seed)
+
+        start = time.perf_counter()
+        contest = generate_contest(manager, players, tickers, trades, seed=seed)
+        generate_s = time.perf_counter() - start
+
+        contest_id = contest["contest_id"]
+        trade_dates = iter(contest["last_trade_date"] + timedelta(minutes=i + 1) for i in range(10 ** 9))
+        names = iter(f"bench{i}" for i in range(10 ** 9))
+        middle = manager.get_contest_trades(contest_id, limit=max(trades // 2, 1))["next_cursor"]
+
+        operations = {
+            "create_contest": lambda: manager.create_contest("Bench", "profit >= 1000"),
+            "join_contest": lambda: manager.join_contest(contest["join_code"], next(names)),
+            "process_trade": lambda: manager.process_trade(
+                rng.choice(contest["player_ids"]), rng.choice(contest["tickers"]), "BUY", 1, 100.0,
+                next(trade_dates)
+            ),
+            "get_leaderboard": lambda: manager.get_leaderboard(contest_id),
+            "get_leaderboard_top10": lambda: manager.get_leaderboard(contest_id, limit=10),
+            "get_contest_trades": lambda: manager.get_contest_trades(contest_id),
+            "get_contest_trades_deep_page": lambda: manager.get_contest_trades(contest_id, before=middle),
+        }
+        results = {operation: time_calls(fn, repeat) for operation, fn in operations.items()}
+        db.close()
+
+    return {
+        "players": players,
+        "tickers": tickers,
+        "trades": trades,
+        "generate_s": generate_s,
+        "operations": results,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "scales": {},
+    }
+    for name in args.scales:
+        players, tickers, trades = SCALES[name]
+        print(f"{name}: {players} players, {tickers} tickers, {trades:,} trades", file=sys.stderr)
+        results["scales"][name] = run_scale(name, players, tickers, trades, args.repeat)
+        for operation, stats in results["scales"][name]["operations"].items():
+            print(f"  {operation:<30} median {stats['median_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms",
+                  file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+def compare_results(before, after, threshold=0.2, min_delta_ms=0.1):
+    """Return one row per operation present in both runs; "regression" marks slowdowns."""
+    rows = []
+    for scale, scale_results in after["scales"].items():
+        baseline = before["scales"].get(scale)
+        if baseline is None:
+            continue
+        for operation, stats in scale_results["operations"].items():
+            old = baseline["operations"].get(operation)
+            if old is None:
+                continue
+            delta = stats["median_ms"] - old["median_ms"]
+            change = delta / old["median_ms"] if old["median_ms"] else 0.0
+            rows.append({
+                "scale": scale,
+                "operation": operation,
+                "before_ms": old["median_ms"],
+                "after_ms": stats["median_ms"],
+                "change": change,
+                "regression": change > threshold and delta > min_delta_ms,
+            })
+    return rows
+
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows = compare_results(before, after, args.threshold, args.min_delta_ms)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['scale']:<8} {row['operation']:<30} {row['before_ms']:9.3f} -> {row['after_ms']:9.3f} ms "
+              f"{row['change']:+7.1%} {flag}")
+    regressions = [row for row in rows if row["regression"]]
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--scales", nargs="+", choices=sorted(SCALES), default=["small", "medium"])
+    run_parser.add_argument("--repeat", type=int, default=20, help="timed calls per operation")
+    run_parser.add_argument("--output", help="write the results as JSON to this file")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.2,
+                                help="fractional median slowdown that counts as a regression")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                                help="ignore slowdowns smaller than this many milliseconds")
+
+    args = parser.parse_args()
+    return run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
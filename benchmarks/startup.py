@@ -0,0 +1,101 @@
+"""Cold-start benchmark for the Streamlit app.
+
+Each sample runs in a fresh interpreter (and a scratch working directory, so
+the app creates its own empty database) and records:
+
+  streamlit_import_ms  importing streamlit and its test harness
+  first_render_ms      running app.py once with AppTest, i.e. the app's own
+                       imports, engine setup and the first page render
+  heavy_modules        which of HEAVY_MODULES the first render loaded
+
+It also times importing each heavy module on its own, which is what a cold
+start paid for them when app.py imported them eagerly. To compare two
+versions, check the older one out (e.g. `git worktree add /tmp/before <rev>`)
+and pass its app with --app.
+
+    python benchmarks/startup.py [--app src/app.py] [--samples 5] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ["openai", "paymanai", "pandas", "numpy", "PIL"]
+
+SAMPLE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=60)
+app.run()
+rendered = time.perf_counter()
+print(json.dumps({
+    "streamlit_import_ms": (imported - start) * 1000,
+    "first_render_ms": (rendered - imported) * 1000,
+    "exceptions": [e.value for e in app.exception],
+    "heavy_modules": sorted(m for m in json.loads(sys.argv[2]) if m in sys.modules),
+}))
+"""
+
+IMPORT = """
+import sys, time
+start = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+except ImportError:
+    print("null")
+else:
+    print((time.perf_counter() - start) * 1000)
+"""
+
+
+def run_python(code, *args, cwd=None):
+    result = subprocess.run([sys.executable, "-c", code, *args], cwd=cwd, capture_output=True,
+                            text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(app_path, samples):
+    app_path = os.path.abspath(app_path)
+    runs = []
+    for _ in range(samples):
+        with tempfile.TemporaryDirectory() as scratch:
+            runs.append(run_python(SAMPLE, app_path, json.dumps(HEAVY_MODULES), cwd=scratch))
+
+    module_import_ms = {}
+    for module in HEAVY_MODULES:
+        timings = [run_python(IMPORT, module) for _ in range(samples)]
+        module_import_ms[module] = None if None in timings else statistics.median(timings)
+
+    return {
+        "app": app_path,
+        "samples": samples,
+        "streamlit_import_ms": statistics.median(run["streamlit_import_ms"] for run in runs),
+        "first_render_ms": statistics.median(run["first_render_ms"] for run in runs),
+        "exceptions": runs[0]["exceptions"],
+        "heavy_modules": runs[0]["heavy_modules"],
+        "module_import_ms": module_import_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=os.path.join(os.path.dirname(__file__), "..", "src", "app.py"))
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = measure(args.app, args.samples)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
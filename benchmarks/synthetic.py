@@ -0,0 +1,88 @@
+"""Synthetic contests of configurable size for benchmarks."""
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from sqlalchemy import insert, select, update
+
+from contest import ContestManager
+from database import Player, Position, Trade
+from ledger import PlayerState, replay
+from money import QUANTITY_SCALE, to_cents, to_micros, value
+
+
+def generate_contest(manager: ContestManager, players: int = 100, tickers: int = 50, trades: int = 10000,
+                     seed: int = 0, start: datetime = datetime(2024, 1, 1),
+                     starting_balance: float = 1e9) -> Dict[str, Any]:
+    """Create a contest with `players` players holding `tickers` symbols through `trades` trades.
+
+    Trades are a random walk per ticker, one minute apart from `start`; about
+    40% of trades on a held ticker are partial sells, so no trade oversells.
+    Rows are bulk inserted, then positions, cash and standings are set to
+    what replaying the trades gives, as if each went through process_trade.
+    The starting balance is large enough that no buy is short of cash, and
+    the win condition is far off so no trade completes the contest.
+    Returns the contest id, player ids, ticker symbols and last trade date.
+    """
+    rng = random.Random(seed)
+    db = manager.db
+    contest = manager.create_contest(f"Synthetic {players}x{trades}", "top 3 at 2999-12-31", starting_balance)
+    contest_id = contest.id
+    balance = to_cents(starting_balance)
+
+    db.execute(insert(Player), [
+        {"name": f"player{i}", "contest_id": contest_id,
+         "starting_balance": balance, "cash_balance": balance}
+        for i in range(players)
+    ])
+    player_ids = list(db.scalars(select(Player.id).where(Player.contest_id == contest_id).order_by(Player.id)))
+
+    symbols = [f"T{i:04d}" for i in range(tickers)]
+    prices = {symbol: rng.uniform(10, 500) for symbol in symbols}
+    states = {player_id: PlayerState(balance) for player_id in player_ids}
+    rows = []
+    for i in range(trades):
+        player_id = rng.choice(player_ids)
+        ticker = rng.choice(symbols)
+        prices[ticker] = max(1.0, prices[ticker] * (1 + rng.gauss(0, 0.01)))
+        price = to_cents(round(prices[ticker], 2))
+        held = states[player_id].positions.get(ticker)
+        if held and rng.random() < 0.4:
+            trade_type, quantity = "SELL", to_micros(rng.randint(1, held[0] // QUANTITY_SCALE))
+        else:
+            trade_type, quantity = "BUY", to_micros(rng.randint(1, 100))
+        replay(states, [(player_id, ticker, trade_type, quantity, price, value(quantity, price))])
+        rows.append({
+            "player_id": player_id,
+            "contest_id": contest_id,
+            "ticker": ticker,
+            "quantity": -quantity if trade_type == "SELL" else quantity,
+            "price": price,
+            "type": trade_type,
+            "total_amount": value(quantity, price),
+            "trade_date": start + timedelta(minutes=i),
+        })
+    if rows:
+        db.execute(insert(Trade), rows)
+
+    positions = [
+        {"player_id": player_id, "ticker": ticker, "quantity": quantity,
+         "average_price": average, "current_price": last}
+        for player_id, state in states.items()
+        for ticker, (quantity, average, last) in state.positions.items()
+    ]
+    if positions:
+        db.execute(insert(Position), positions)
+    if player_ids:
+        db.execute(update(Player), [{"id": player_id, "cash_balance": state.cash}
+                                    for player_id, state in states.items()])
+    db.commit()
+    manager.rebuild_standings(contest_id)
+
+    return {
+        "contest_id": contest_id,
+        "join_code": contest.join_code,
+        "player_ids": player_ids,
+        "tickers": symbols,
+        "last_trade_date": start + timedelta(minutes=max(trades - 1, 0)),
+    }
@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import secrets
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy.orm import Session
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from cache import ALL_CONTESTS, ReadCache
+from contest import ContestManager
+from database import Contest, ContestStatus
+from feed import ChangeFeed
+from metrics import METRICS
+from money import dollars
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 500
+# Comment line sent to idle event streams so proxies keep them open
+HEARTBEAT_SECONDS = 15
+
+
+class ApiError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _contest_dict(contest: Contest) -> Dict[str, Any]:
+    return {
+        "id": contest.id,
+        "name": contest.name,
+        "win_condition": contest.win_condition,
+        "status": contest.status.value,
+        "starting_balance": dollars(contest.starting_balance),
+        "created_at": contest.created_at,
+        "ends_at": contest.ends_at,
+        "completed_at": contest.completed_at,
+        "winner_id": contest.winner_id,
+        "winner_ids": contest.winners,
+    }
+
+
+def _int_param(request: Request, name: str, default: Optional[int] = None, maximum: Optional[int] = None):
+    text = request.query_params.get(name)
+    if text is None:
+        return default
+    try:
+        value = int(text)
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer") from None
+    if value < 1 or (maximum is not None and value > maximum):
+        raise ApiError(400, f"{name} must be between 1 and {maximum}" if maximum else f"{name} must be positive")
+    return value
+
+
+def encode_cursor(cursor) -> Optional[str]:
+    """A trades page cursor (trade_date, id) as an opaque query parameter."""
+    return None if cursor is None else f"{cursor[0].isoformat()}_{cursor[1]}"
+
+
+def decode_cursor(text: str):
+    try:
+        date, trade_id = text.rsplit("_", 1)
+        return datetime.fromisoformat(date), int(trade_id)
+    except ValueError:
+        raise ApiError(400, f"Invalid cursor {text!r}") from None
+
+
+def sse(event_id: int, kind: str, data: Any) -> str:
+    """One server-sent event."""
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def create_app(session_factory: Callable[[], Session], cache: ReadCache,
+               feed: Optional[ChangeFeed] = None) -> Starlette:
+    """Read-only JSON API over ContestManager's cached reads.
+
+    Routes:
+
+        GET /api/contests                         every contest
+        GET /api/contests/{id}                    one contest
+        GET /api/contests/{id}/standings?limit=   ranked standings
+        GET /api/contests/{id}/trades?limit=&before=&player_id=&ticker=&type=
+                                                  trades newest first; pass a page's
+                                                  next_cursor as `before` for the next one
+        GET /api/contests/{id}/events             live standings (with a `feed`), below
+
+    Every response carries an ETag made of the versions the read cache
+    keeps for the contest (or the contest list). Writers bump them after
+    committing, so a request whose If-None-Match is still current gets a
+    304 without opening a session. A token per app instance keeps tags from
+    an earlier process (whose versions also started at 0) from matching.
+    Amounts are in dollars, quantities in shares; responses are gzipped
+    for clients that accept it.
+
+    The events route is a server-sent event stream: a "snapshot" event
+    with every standings row, then a "standings" event with the changed
+    rows after each committed write, and a "contest" event when the
+    contest completes, which ends the stream. Event ids are the feed's
+    seq, so a client that reconnects with Last-Event-ID gets only what it
+    missed (or a new snapshot). Idle streams cost no thread.
+
+    `cache` and `feed` must be the ones the writers' ContestManagers use,
+    so only serve the API from the process that makes the writes (see
+    app.py).
+    """
+    epoch = secrets.token_hex(4)
+
+    def with_manager(read: Callable[[ContestManager, Request], Any], request: Request) -> Any:
+        session = session_factory()
+        try:
+            return read(ContestManager(session, cache=cache), request)
+        finally:
+            session.close()
+
+    def endpoint(name: str, scopes: Callable[[Request], tuple],
+                 read: Callable[[ContestManager, Request], Any]):
+        def handle(request: Request) -> Response:
+            with METRICS.timer(f"api.{name}"):
+                try:
+                    # Versions are taken before reading, so a write racing the
+                    # read makes the tag stale rather than the body
+                    versions = ".".join(str(cache.version(scope)) for scope in scopes(request))
+                    etag = f'W/"{epoch}-{versions}"'
+                    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+                    if _not_modified(request, etag):
+                        return Response(status_code=304, headers=headers)
+                    body = with_manager(read, request)
+                except ApiError as e:
+                    return Response(json.dumps({"error": str(e)}), status_code=e.status_code,
+                                    media_type="application/json")
+                return Response(json.dumps(body, default=str), media_type="application/json", headers=headers)
+        return handle
+
+    def contest_id(request: Request) -> int:
+        return request.path_params["contest_id"]
+
+    def contest(manager: ContestManager, request: Request) -> Contest:
+        for row in manager.get_contests(*ContestStatus):
+            if row.id == contest_id(request):
+                return row
+        raise ApiError(404, f"Contest {contest_id(request)} not found")
+
+    def list_contests(manager, request):
+        return {"contests": [_contest_dict(row) for row in manager.get_contests(*ContestStatus)]}
+
+    def get_contest(manager, request):
+        return _contest_dict(contest(manager, request))
+
+    def get_standings(manager, request):
+        contest(manager, request)
+        limit = _int_param(request, "limit", maximum=MAX_PAGE_SIZE)
+        return {"contest_id": contest_id(request), "standings": manager.get_leaderboard(contest_id(request), limit)}
+
+    def get_trades(manager, request):
+        contest(manager, request)
+        params = request.query_params
+        page = manager.get_contest_trades(
+            contest_id(request),
+            limit=_int_param(request, "limit", 50, MAX_PAGE_SIZE),
+            before=decode_cursor(params["before"]) if params.get("before") else None,
+            player_id=_int_param(request, "player_id"),
+            ticker=params.get("ticker"),
+            trade_type=params.get("type", "").upper() or None,
+        )
+        return {"contest_id": contest_id(request), "trades": page["trades"],
+                "next_cursor": encode_cursor(page["next_cursor"])}
+
+    async def contest_events(request: Request) -> Response:
+        cid = contest_id(request)
+        # Subscribe before reading, so no change falls between the two
+        subscription = feed.subscribe(cid)
+        last_id = request.headers.get("last-event-id", "")
+        missed = feed.since(cid, int(last_id)) if last_id.isdigit() else None
+        seq = feed.latest(cid) if missed is None else (missed[-1].seq if missed else int(last_id))
+
+        def opening(manager, request):
+            completed = contest(manager, request).status == ContestStatus.COMPLETED
+            return completed, get_standings(manager, request) if missed is None else None
+
+        try:
+            completed, snapshot = await run_in_threadpool(with_manager, opening, request)
+        except ApiError as e:
+            subscription.close()
+            return Response(json.dumps({"error": str(e)}), status_code=e.status_code,
+                            media_type="application/json")
+        if completed and missed == []:
+            # Nothing will change; 204 stops EventSource reconnecting
+            subscription.close()
+            return Response(status_code=204)
+
+        async def stream():
+            nonlocal seq, completed
+            try:
+                yield "retry: 2000\n\n"
+                if snapshot is not None:
+                    yield sse(seq, "snapshot", snapshot)
+                for event in missed or ():
+                    yield sse(event.seq, event.kind, event.data)
+                # A subscriber that fell behind is dropped; it reconnects
+                # with Last-Event-ID and catches up from the history
+                while not completed and not subscription.overflowed:
+                    event = await subscription.get(HEARTBEAT_SECONDS)
+                    if event is None:
+                        yield ": keep-alive\n\n"
+                    elif event.seq > seq:
+                        seq = event.seq
+                        completed = event.kind == "contest"
+                        yield sse(event.seq, event.kind, event.data)
+            finally:
+                subscription.close()
+
+        return StreamingResponse(stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    # Contests change on creation and completion (ALL_CONTESTS), a
+    # contest's standings and trades with every trade on it (its own scope)
+    def contests_scope(request) -> tuple:
+        return (ALL_CONTESTS,)
+
+    def contest_scope(request) -> tuple:
+        return (contest_id(request),)
+
+    routes = [
+        Route("/api/contests", endpoint("contests", contests_scope, list_contests)),
+        Route("/api/contests/{contest_id:int}", endpoint("contest", contests_scope, get_contest)),
+        Route("/api/contests/{contest_id:int}/standings", endpoint("standings", contest_scope, get_standings)),
+        Route("/api/contests/{contest_id:int}/trades", endpoint("trades", contest_scope, get_trades)),
+    ]
+    if feed is not None:
+        routes.append(Route("/api/contests/{contest_id:int}/events", contest_events))
+    return Starlette(routes=routes, middleware=[Middleware(GZipMiddleware, minimum_size=500)])
+
+
+class ApiServer:
+    """Serves an ASGI app with uvicorn on a daemon thread."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 8502):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self.server.should_exit = False
+            self._thread = threading.Thread(target=self.server.run, name="api", daemon=True)
+            self._thread.start()
+            logger.info("api started", extra={"host": self.server.config.host, "port": self.server.config.port})
+
+    def stop(self, timeout: Optional[float] = None):
+        self.server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def api_server_from_env(session_factory: Callable[[], Session], cache: ReadCache,
+                        feed: Optional[ChangeFeed] = None) -> Optional[ApiServer]:
+    """An ApiServer on API_HOST (127.0.0.1):API_PORT, or None if API_PORT is not set."""
+    port = os.getenv('API_PORT')
+    if not port:
+        return None
+    return ApiServer(create_app(session_factory, cache, feed), os.getenv('API_HOST', '127.0.0.1'), int(port))
@@ -1,27 +1,90 @@
 import os
+import logging
 from dotenv import load_dotenv
 import streamlit as st
 from datetime import datetime
-import pandas as pd
-from database import init_db, ContestStatus
-from contest import ContestManager
-from ocr import TradeParser
-from paymanai import Paymanai
+from database import get_scoped_session, ContestStatus
+from rules import RuleError
+from contest import ContestManager, TradeRejected
+from cache import ReadCache
+from feed import ChangeFeed
+from api import api_server_from_env
+from payouts import PayoutWorker
+from scheduler import Scheduler, default_jobs
+from logs import configure_logging
+from metrics import METRICS
+from money import dollars
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 
-# Initialize Payman SDK
-payman = Paymanai(
-    x_payman_api_secret=os.getenv('PAYMAN_API_KEY'),
-    environment='sandbox'
-)
+# pandas, OpenAI and Payman are imported on first use rather than here, so
+# opening the app (or just the Leaderboard) does not pay for them
+
+# One engine and connection pool per process; each script run gets its own
+# short-lived session through the thread-local registry
+Session = get_scoped_session()
+
+@st.cache_resource
+def get_read_cache():
+    """One read cache for every browser session, so a write by one invalidates all."""
+    return ReadCache()
+
+@st.cache_resource
+def get_change_feed():
+    """One change feed per process: writers publish the standings they change, live views apply them."""
+    return ChangeFeed()
+
+@st.cache_resource
+def get_trade_parser():
+    """One OCR parser (client, caches, thread pool) per process, built on the first upload."""
+    from ocr import TradeParser
+
+    return TradeParser()
+
+@st.cache_resource
+def get_payout_worker():
+    """One background payout worker per process; it picks up jobs queued before a restart too."""
+    worker = PayoutWorker(Session)
+    worker.start()
+    return worker
+
+get_payout_worker()
+
+@st.cache_resource
+def get_scheduler():
+    """Background jobs (price refresh, snapshots, contest expiry), so page renders only read.
+
+    Shares the read cache so job writes invalidate what pages show.
+    SCHEDULER_ENABLED=0 registers the jobs without running them.
+    """
+    scheduler = Scheduler(Session, default_jobs(), cache=get_read_cache(), feed=get_change_feed())
+    if os.getenv('SCHEDULER_ENABLED', '1') != '0':
+        scheduler.start()
+    return scheduler
+
+get_scheduler()
+
+@st.cache_resource
+def get_api_server():
+    """The read-only JSON API (see api.py) when API_PORT is set, served from this process.
+
+    It must share this process's read cache and change feed: its ETags are
+    the cache's versions and its event streams the feed's events, which
+    only writes made here produce.
+    """
+    server = api_server_from_env(Session, get_read_cache(), get_change_feed())
+    if server is not None:
+        server.start()
+    return server
+
+get_api_server()
 
 # Initialize session state
-if 'db' not in st.session_state:
-    st.session_state.db = init_db()
-    st.session_state.contest_manager = ContestManager(st.session_state.db)
-    st.session_state.trade_parser = TradeParser()
+if 'contest_manager' not in st.session_state:
+    st.session_state.contest_manager = ContestManager(Session, cache=get_read_cache(), feed=get_change_feed())
 
 def create_contest_page():
     st.header("Create New Contest")
@@ -30,7 +93,8 @@ def create_contest_page():
         name = st.text_input("Contest Name")
         win_condition = st.text_input(
             "Win Condition",
-            placeholder="E.g. When a player reaches $1,000 in profits..."
+            placeholder="E.g. profit >= 1000, return >= 10% by 2025-06-30, top 3 at 2025-12-31",
+            help="The contest completes automatically when a player's trade meets it, or at its end date."
         )
         starting_balance = st.number_input(
             "Starting balance for each player ($)",
@@ -41,12 +105,16 @@ def create_contest_page():
         
         if st.form_submit_button("Create Contest"):
             if name and win_condition:
-                contest = st.session_state.contest_manager.create_contest(
-                    name=name,
-                    win_condition=win_condition,
-                    starting_balance=starting_balance
-                )
-                st.success(f"Contest created! Join code: {contest.join_code}")
+                try:
+                    contest = st.session_state.contest_manager.create_contest(
+                        name=name,
+                        win_condition=win_condition,
+                        starting_balance=starting_balance
+                    )
+                except RuleError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"Contest created! Join code: {contest.join_code}")
             else:
                 st.error("Please enter a contest name and win condition")
 
@@ -98,6 +166,14 @@ def upload_trade_page():
         )
 
         if selected_player:
+            mode = st.radio("Input", ["Screenshot", "Multiple screenshots", "CSV file"], horizontal=True)
+            if mode == "Multiple screenshots":
+                batch_screenshot_section(selected_player)
+                return
+            if mode == "CSV file":
+                csv_import_section(selected_player)
+                return
+
             # File uploader for screenshot
             uploaded_file = st.file_uploader("Upload trade screenshot", type=["png", "jpg", "jpeg"])
             
@@ -105,7 +181,7 @@ def upload_trade_page():
             trade_info = None
             if uploaded_file:
                 with st.spinner("Processing screenshot..."):
-                    trade_info = st.session_state.trade_parser.parse_screenshot(uploaded_file.getvalue())
+                    trade_info = get_trade_parser().parse_screenshot(uploaded_file.getvalue())
                     if not trade_info["success"]:
                         st.error(f"Failed to parse screenshot: {trade_info.get('error', 'Unknown error')}")
                         st.info("Please enter trade details manually")
@@ -173,45 +249,243 @@ def upload_trade_page():
                         trade_datetime = datetime.combine(trade_date, datetime.min.time())
                         
                         # Process the trade
-                        trade = st.session_state.contest_manager.process_trade(
-                            player_id=selected_player.id,
-                            ticker=ticker,
-                            trade_type=trade_type,
-                            quantity=quantity,
-                            price=price,
-                            trade_date=trade_datetime
-                        )
-                        if trade:
-                            st.success("Trade processed successfully!")
-                            st.balloons()
+                        try:
+                            trade = st.session_state.contest_manager.process_trade(
+                                player_id=selected_player.id,
+                                ticker=ticker,
+                                trade_type=trade_type,
+                                quantity=quantity,
+                                price=price,
+                                trade_date=trade_datetime
+                            )
+                        except TradeRejected as e:
+                            st.error(f"Trade rejected: {e}")
                         else:
-                            st.error("Failed to process trade. Check the terminal for detailed error message.")
+                            if trade:
+                                st.success("Trade processed successfully!")
+                                st.balloons()
+                            else:
+                                st.error("Failed to process trade. Check the terminal for detailed error message.")
+
+def batch_screenshot_section(player):
+    uploaded_files = st.file_uploader(
+        "Upload trade screenshots",
+        type=["png", "jpg", "jpeg"],
+        accept_multiple_files=True
+    )
+    if not uploaded_files:
+        return
+
+    with st.spinner(f"Processing {len(uploaded_files)} screenshots..."):
+        results = get_trade_parser().parse_screenshots(
+            [uploaded_file.getvalue() for uploaded_file in uploaded_files]
+        )
+
+    rows = []
+    for uploaded_file, result in zip(uploaded_files, results):
+        if result["success"]:
+            rows.append({
+                "file": uploaded_file.name,
+                "date": result["date"],
+                "ticker": (result["ticker"] or "").upper(),
+                "trade_type": (result["trade_type"] or "").upper(),
+                "quantity": result["quantity"],
+                "price": result["price"],
+            })
+        else:
+            st.error(f"Failed to parse {uploaded_file.name}: {result.get('error', 'Unknown error')}")
+
+    if not rows:
+        return
+
+    import pandas as pd
+
+    st.write("Review the extracted trades before importing:")
+    edited = st.data_editor(pd.DataFrame(rows), hide_index=True, disabled=["file"])
+
+    if st.button(f"Import {len(edited)} trades for {player.name}"):
+        try:
+            result = st.session_state.contest_manager.import_trades(player.id, edited)
+        except TradeRejected as e:
+            st.error(f"Could not import trades: {e}")
+            return
+        if result["imported"]:
+            st.success(f"Imported {result['imported']} trades")
+        for rejection in result["rejected"]:
+            st.warning(f"{edited.iloc[rejection['row']]['file']}: {rejection['error']}")
+
+def csv_import_section(player):
+    uploaded_csv = st.file_uploader(
+        "Upload trades CSV (Robinhood activity export, or date/ticker/trade_type/quantity/price columns)",
+        type=["csv"]
+    )
+    if not uploaded_csv:
+        return
+
+    from trade_import import read_trades_csv
+
+    try:
+        rows = read_trades_csv(uploaded_csv)
+    except ValueError as e:
+        st.error(f"Could not read CSV: {e}")
+        return
+
+    st.write(f"Found {len(rows):,} trades")
+    st.dataframe(rows.head(100), hide_index=True)
+
+    if st.button(f"Import {len(rows):,} trades for {player.name}"):
+        try:
+            with st.spinner("Importing trades..."):
+                result = st.session_state.contest_manager.import_trades(player.id, rows)
+        except TradeRejected as e:
+            st.error(f"Could not import trades: {e}")
+            return
+        if result["imported"]:
+            st.success(f"Imported {result['imported']:,} trades")
+        if result["rejected"]:
+            st.warning(f"{len(result['rejected']):,} rows were rejected")
+            st.dataframe(result["rejected"], hide_index=True)
+
+TRADE_PAGE_SIZE = 50
+
+def trade_history_section(contest):
+    """Show one page of the contest's trades with filters and page controls.
+
+    Only the visible page is queried; pages are keyset cursors kept in
+    session state, so rendering cost does not grow with the trade count.
+    """
+    st.subheader("Trade History")
+    manager = st.session_state.contest_manager
+
+    filter_col1, filter_col2, filter_col3 = st.columns(3)
+    with filter_col1:
+        player = st.selectbox(
+            "Player",
+            options=[None] + manager.get_contest_players(contest.id),
+            format_func=lambda x: "All players" if x is None else x.name
+        )
+    with filter_col2:
+        ticker = st.text_input("Ticker").strip().upper() or None
+    with filter_col3:
+        side = st.selectbox("Side", ["All", "BUY", "SELL"])
+
+    # Cursors of the pages visited so far; reset when the filters change
+    filters = (contest.id, player.id if player else None, ticker, side)
+    if st.session_state.get("trade_filters") != filters:
+        st.session_state.trade_filters = filters
+        st.session_state.trade_cursors = [None]
+    cursors = st.session_state.trade_cursors
+
+    page = manager.get_contest_trades(
+        contest.id,
+        limit=TRADE_PAGE_SIZE,
+        before=cursors[-1],
+        player_id=player.id if player else None,
+        ticker=ticker,
+        trade_type=None if side == "All" else side
+    )
+    trades = page["trades"]
+    if not trades:
+        if player or ticker or side != "All":
+            st.info("No trades match these filters.")
+        else:
+            st.info("No trades recorded yet in this contest.")
+        return
+
+    trade_data = [{
+        "Date": trade["date"].strftime("%Y-%m-%d %H:%M"),
+        "Player": trade["player"],
+        "Action": f"{'🔴 SELL' if trade['type'] == 'SELL' else '🟢 BUY'}",
+        "Ticker": trade["ticker"],
+        "Quantity": f"{trade['quantity']:,.0f}",
+        "Price": f"${trade['price']:,.2f}",
+        "Total": f"${abs(trade['total']):,.2f}"
+    } for trade in trades]
+            
+    st.dataframe(
+        trade_data,
+        column_config={
+            "Date": st.column_config.DatetimeColumn(
+                "Date & Time",
+                format="MMM D, YYYY h:mm A",
+                width="medium"
+            ),
+            "Player": st.column_config.TextColumn(
+                "Player",
+                width="small"
+            ),
+            "Action": st.column_config.TextColumn(
+                "Action",
+                width="small"
+            ),
+            "Ticker": st.column_config.TextColumn(
+                "Symbol",
+                width="small"
+            ),
+            "Quantity": st.column_config.NumberColumn(
+                "Quantity",
+                format="%d",
+                width="small"
+            ),
+            "Price": st.column_config.TextColumn(
+                "Price/Share",
+                width="small"
+            ),
+            "Total": st.column_config.TextColumn(
+                "Total Amount",
+                width="medium",
+                help="Total amount of the trade (price × quantity)"
+            ),
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("← Newer", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with page_col:
+        st.caption(f"Page {len(cursors)}")
+    with next_col:
+        if st.button("Older →", disabled=page["next_cursor"] is None):
+            cursors.append(page["next_cursor"])
+            st.rerun()
 
 def view_leaderboard_page():
     st.header("Leaderboard")
     
-    # Get active contests
-    active_contests = st.session_state.contest_manager.get_active_contests()
-    if not active_contests:
+    # Completed contests stay listed so their winners can be paid
+    contests = st.session_state.contest_manager.get_contests(ContestStatus.ACTIVE, ContestStatus.COMPLETED)
+    if not contests:
         st.warning("No active contests found. Create or join a contest to view leaderboards.")
         return
 
     # Contest selection
     selected_contest = st.selectbox(
         "Select Contest",
-        options=active_contests,
+        options=contests,
         format_func=lambda x: f"{x.name} (Join Code: {x.join_code})"
+        + (" - completed" if x.status == ContestStatus.COMPLETED else "")
     )
 
     if selected_contest:
+        players = st.session_state.contest_manager.get_contest_players(selected_contest.id)
         # Show contest details
         st.subheader(f"📊 {selected_contest.name}")
+        if selected_contest.status == ContestStatus.COMPLETED:
+            names = {p.id: p.name for p in players}
+            winner_names = [names[winner_id] for winner_id in selected_contest.winners if winner_id in names]
+            label = "winners" if len(winner_names) > 1 else "winner"
+            st.success(f"🏁 Completed {selected_contest.completed_at:%Y-%m-%d}"
+                       + (f" - {label}: {', '.join(winner_names)}" if winner_names else " with no winner"))
         st.markdown(f"""
         **Win Condition:**  
         {selected_contest.win_condition}
 
         **Starting Balance:**
-        ${selected_contest.starting_balance:,.2f}
+        ${dollars(selected_contest.starting_balance):,.2f}
 
         **Join Code:**  
         `{selected_contest.join_code}`
@@ -219,33 +493,25 @@ def view_leaderboard_page():
         
         # Get and display leaderboard
         leaderboard = st.session_state.contest_manager.get_leaderboard(selected_contest.id)
+        starting_balance = dollars(selected_contest.starting_balance)
         if leaderboard:
             st.subheader("Rankings")
-            # Create a formatted table
-            data = []
-            for rank, player in enumerate(leaderboard, 1):
-                data.append({
-                    "Rank": rank,
-                    "Player": player["name"],
-                    "Portfolio Value": f"${player['portfolio_value']:,.2f}",
-                    "Cash Balance": f"${player['cash_balance']:,.2f}",
-                    "Total Profit/Loss": f"${player['total_profit']:,.2f}",
-                    "Return": f"{(player['total_profit'] / selected_contest.starting_balance * 100):.1f}%"
-                })
-            
-            st.dataframe(
-                data,
-                column_config={
-                    "Rank": st.column_config.NumberColumn(format="%d"),
-                    "Player": st.column_config.TextColumn(),
-                    "Portfolio Value": st.column_config.TextColumn(),
-                    "Cash Balance": st.column_config.TextColumn(),
-                    "Total Profit/Loss": st.column_config.TextColumn(),
-                    "Return": st.column_config.TextColumn(),
-                },
-                hide_index=True
-            )
-            
+            live_rankings(selected_contest.id, starting_balance)
+
+            # Equity curves: one range query over the precomputed daily points
+            curve = st.session_state.contest_manager.get_equity_curve(selected_contest.id)
+            if curve:
+                import pandas as pd
+
+                st.subheader("Portfolio Value Over Time")
+                chart = (
+                    pd.DataFrame(curve)
+                    .pivot_table(index="day", columns="name", values="portfolio_value")
+                    .ffill()
+                    .fillna(starting_balance)
+                )
+                st.line_chart(chart)
+
             # Payout Section
             st.subheader("Contest Payout")
             
@@ -266,23 +532,13 @@ def view_leaderboard_page():
                 """)
                 
                 # Show current rankings again
-                st.dataframe(
-                    data,
-                    column_config={
-                        "Rank": st.column_config.NumberColumn(format="%d"),
-                        "Player": st.column_config.TextColumn(),
-                        "Portfolio Value": st.column_config.TextColumn(),
-                        "Cash Balance": st.column_config.TextColumn(),
-                        "Total Profit/Loss": st.column_config.TextColumn(),
-                        "Return": st.column_config.TextColumn(),
-                    },
-                    hide_index=True
-                )
+                rankings_table(leaderboard, starting_balance)
                 
-                # Winner selection
+                # Winner selection; "top N" contests pay each winner separately
                 winner = st.selectbox(
                     "Select Winner",
-                    options=[player for player in st.session_state.contest_manager.get_contest_players(selected_contest.id)],
+                    options=players,
+                    index=next((i for i, p in enumerate(players) if p.id == selected_contest.winner_id), 0),
                     format_func=lambda x: f"{x.name}"
                 )
                 
@@ -290,96 +546,187 @@ def view_leaderboard_page():
                     payout_col1, payout_col2 = st.columns([1, 3])
                     with payout_col1:
                         if st.button("💰 Send Payment"):
-                            print(f"\nProcessing payout for contest {selected_contest.id}")
-                            print(f"Selected winner: {winner.name} (ID: {winner.id})")
-                            
-                            print("Processing payment...")
-                            payment_success = st.session_state.contest_manager.payout_winner(selected_contest.id, winner.id)
-                            print(f"Payment result: {'Success' if payment_success else 'Failed'}")
-                            
-                            if payment_success:
+                            logger.info("payout requested", extra={
+                                "contest_id": selected_contest.id, "winner_id": winner.id,
+                            })
+                            # Queued, not sent: a repeat click returns the same job
+                            payout = st.session_state.contest_manager.payout_winner(selected_contest.id, winner.id)
+
+                            if payout:
+                                get_payout_worker().wake()
+                                st.session_state.payout_id = payout["id"]
                                 st.session_state.payout_clicked = False  # Reset the state
-                                st.success(f"🎉 Payment sent to {winner.name}!")
-                                st.balloons()
                             else:
-                                st.error("Payment failed. Please try again.")
+                                st.error("Could not queue the payment. Please try again.")
                     with payout_col2:
                         st.button("❌ Cancel", on_click=lambda: setattr(st.session_state, 'payout_clicked', False))
             
-            # Show trade history
-            st.subheader("Trade History")
-            trades = st.session_state.contest_manager.get_contest_trades(selected_contest.id)
-            if trades:
-                trade_data = [{
-                    "Date": trade["date"].strftime("%Y-%m-%d %H:%M"),
-                    "Player": trade["player"],
-                    "Action": f"{'🔴 SELL' if trade['type'] == 'SELL' else '🟢 BUY'}",
-                    "Ticker": trade["ticker"],
-                    "Quantity": f"{trade['quantity']:,.0f}",
-                    "Price": f"${trade['price']:,.2f}",
-                    "Total": f"${abs(trade['total']):,.2f}"
-                } for trade in trades]
-                
-                st.dataframe(
-                    trade_data,
-                    column_config={
-                        "Date": st.column_config.DatetimeColumn(
-                            "Date & Time",
-                            format="MMM D, YYYY h:mm A",
-                            width="medium"
-                        ),
-                        "Player": st.column_config.TextColumn(
-                            "Player",
-                            width="small"
-                        ),
-                        "Action": st.column_config.TextColumn(
-                            "Action",
-                            width="small"
-                        ),
-                        "Ticker": st.column_config.TextColumn(
-                            "Symbol",
-                            width="small"
-                        ),
-                        "Quantity": st.column_config.NumberColumn(
-                            "Quantity",
-                            format="%d",
-                            width="small"
-                        ),
-                        "Price": st.column_config.TextColumn(
-                            "Price/Share",
-                            width="small"
-                        ),
-                        "Total": st.column_config.TextColumn(
-                            "Total Amount",
-                            width="medium",
-                            help="Total amount of the trade (price × quantity)"
-                        ),
-                    },
-                    hide_index=True,
-                    use_container_width=True
-                )
-            else:
-                st.info("No trades recorded yet in this contest.")
+            if st.session_state.get('payout_id'):
+                payout_status(st.session_state.payout_id)
+
+            # Show one page of trade history
+            trade_history_section(selected_contest)
         else:
             st.info("No trades recorded yet in this contest.")
 
+def rankings_table(leaderboard, starting_balance):
+    data = []
+    for rank, player in enumerate(leaderboard, 1):
+        data.append({
+            "Rank": rank,
+            "Player": player["name"],
+            "Portfolio Value": f"${player['portfolio_value']:,.2f}",
+            "Cash Balance": f"${player['cash_balance']:,.2f}",
+            "Total Profit/Loss": f"${player['total_profit']:,.2f}",
+            "Return": f"{(player['total_profit'] / starting_balance * 100):.1f}%"
+        })
+
+    st.dataframe(
+        data,
+        column_config={
+            "Rank": st.column_config.NumberColumn(format="%d"),
+            "Player": st.column_config.TextColumn(),
+            "Portfolio Value": st.column_config.TextColumn(),
+            "Cash Balance": st.column_config.TextColumn(),
+            "Total Profit/Loss": st.column_config.TextColumn(),
+            "Return": st.column_config.TextColumn(),
+        },
+        hide_index=True
+    )
+
+@st.fragment(run_every=2)
+def live_rankings(contest_id, starting_balance):
+    """Rankings kept current from the change feed; only this fragment reruns.
+
+    Each rerun applies just the standings rows changed since the last one,
+    and reloads the leaderboard only when it fell out of the feed's history.
+    """
+    # A fragment rerun skips main(), so release the session it opens here
+    owns_session = not Session.registry.has()
+    try:
+        feed = get_change_feed()
+        live = st.session_state.get('live_rankings')
+        events = None
+        if live is not None and live["contest_id"] == contest_id:
+            events = feed.since(contest_id, live["seq"])
+        if events is None:
+            seq = feed.latest(contest_id)
+            leaderboard = st.session_state.contest_manager.get_leaderboard(contest_id)
+            live = {"contest_id": contest_id, "seq": seq, "rows": {row["player_id"]: row for row in leaderboard}}
+            st.session_state.live_rankings = live
+        completed = False
+        for event in events or ():
+            if event.kind == "standings":
+                live["rows"].update((row["player_id"], row) for row in event.data)
+            elif event.kind == "contest":
+                completed = True
+            live["seq"] = event.seq
+        if completed:
+            # Winner, status and payout sections live outside the fragment
+            st.rerun()
+
+        ranked = sorted(live["rows"].values(), key=lambda row: (-row["total_profit"], row["player_id"]))
+        rankings_table(ranked, starting_balance)
+    finally:
+        if owns_session:
+            Session.remove()
+
+@st.fragment(run_every=2)
+def payout_status(payout_id):
+    """Poll a queued payout; only this fragment reruns while the worker sends it."""
+    # A fragment rerun skips main(), so release the session it opens here
+    owns_session = not Session.registry.has()
+    try:
+        payout = st.session_state.contest_manager.get_payout(payout_id)
+    finally:
+        if owns_session:
+            Session.remove()
+    if payout is None:
+        return
+    if payout["status"] == "succeeded":
+        st.success(f"🎉 Payment sent! Reference: {payout['reference']}")
+    elif payout["status"] == "failed":
+        st.error(f"Payment failed after {payout['attempts']} attempt(s): {payout['last_error']}. "
+                 "Send it again to retry.")
+    elif payout["attempts"]:
+        st.warning(f"Payment is being retried (attempt {payout['attempts']}): {payout['last_error']}")
+    else:
+        st.info("⏳ Payment queued...")
+
+def metrics_page():
+    st.header("Metrics")
+    snapshot = METRICS.snapshot()
+    if not snapshot["operations"]:
+        st.info("No operations recorded yet in this process.")
+    else:
+        st.dataframe(
+            [{
+                "Operation": name,
+                "Calls": stats["count"],
+                "Mean (ms)": round(stats["mean_ms"], 2),
+                "p50 (ms)": round(stats["p50_ms"], 2),
+                "p95 (ms)": round(stats["p95_ms"], 2),
+                "p99 (ms)": round(stats["p99_ms"], 2),
+                "Max (ms)": round(stats["max_ms"], 2),
+                "SQL / call": round(stats["statements"]["mean"], 1) if "statements" in stats else None,
+                "Max SQL": stats["statements"]["max"] if "statements" in stats else None,
+            } for name, stats in snapshot["operations"].items()],
+            hide_index=True,
+            use_container_width=True
+        )
+
+    if snapshot["n_plus_one"]:
+        st.subheader("Possible N+1 queries")
+        st.dataframe(
+            [{"Operation": name, **flagged} for name, flagged in snapshot["n_plus_one"].items()],
+            hide_index=True,
+            use_container_width=True
+        )
+
+    st.subheader("Read cache")
+    st.json(get_read_cache().stats())
+
+    st.subheader("Scheduled jobs")
+    scheduler = get_scheduler()
+    st.dataframe(scheduler.status(), hide_index=True, use_container_width=True)
+    job = st.selectbox("Job", list(scheduler.jobs))
+    if st.button("Run now"):
+        scheduler.trigger(job)
+        st.toast(f"{job} scheduled")
+
+    if st.button("Reset metrics"):
+        METRICS.reset()
+        st.rerun()
+
 def main():
     st.title("Trading Contest Platform")
     
-    # Navigation
-    page = st.sidebar.selectbox(
-        "Navigation",
-        ["Create Contest", "Join Contest", "Upload Trade", "Leaderboard"]
-    )
+    # Navigation; ADMIN_PAGE=1 adds the metrics page
+    pages = ["Create Contest", "Join Contest", "Upload Trade", "Leaderboard"]
+    if os.getenv('ADMIN_PAGE') == '1':
+        pages.append("Metrics")
+    page = st.sidebar.selectbox("Navigation", pages)
     
-    if page == "Create Contest":
-        create_contest_page()
-    elif page == "Join Contest":
-        join_contest_page()
-    elif page == "Upload Trade":
-        upload_trade_page()
-    elif page == "Leaderboard":
-        view_leaderboard_page()
+    try:
+        if page == "Create Contest":
+            create_contest_page()
+        elif page == "Join Contest":
+            join_contest_page()
+        elif page == "Upload Trade":
+            upload_trade_page()
+        elif page == "Leaderboard":
+            view_leaderboard_page()
+        elif page == "Metrics":
+            metrics_page()
+    finally:
+        # Release this run's session and return its connection to the pool
+        Session.remove()
+
+    cache_stats = get_read_cache().stats()
+    st.sidebar.caption(
+        f"Read cache: {cache_stats['hit_rate']:.0%} hits "
+        f"({cache_stats['hits']:,} of {cache_stats['hits'] + cache_stats['misses']:,} reads)"
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+import functools
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Version scope for reads that span contests (e.g. the active contest list)
+ALL_CONTESTS = "contests"
+
+
+class ReadCache:
+    """In-process cache of ContestManager reads with per-contest versions.
+
+    Each cached read belongs to a scope (a contest id, or ALL_CONTESTS) and is
+    stored with that scope's version when it was loaded. Writes bump the
+    versions of the scopes they touch after committing, so a read is served
+    from memory until a write changes its contest, and then reloaded once.
+    The version is taken before loading, so a read that races a write is
+    never stored as current. Holds at most `max_entries` results (LRU).
+
+    Cached values are shared between Streamlit sessions and must be treated
+    as read-only. Versions only see writes made through this process.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._versions: Dict[Hashable, int] = defaultdict(int)
+        self._entries: "OrderedDict[tuple, Tuple[int, Any]]" = OrderedDict()  # key -> (version, value)
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    def version(self, scope: Hashable) -> int:
+        with self._lock:
+            return self._versions[scope]
+
+    def bump(self, *scopes: Hashable):
+        """Mark everything cached for these scopes as stale."""
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] += 1
+
+    def get_or_load(self, name: str, scope: Hashable, args: tuple, loader: Callable[[], Any]) -> Any:
+        """Return the cached result of `name(*args)` for scope, calling loader if stale."""
+        key = (name, scope, args)
+        with self._lock:
+            version = self._versions[scope]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits[name] += 1
+                return entry[1]
+            self.misses[name] += 1
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counts overall and per read."""
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "entries": len(self._entries),
+                "reads": {
+                    name: {"hits": self.hits[name], "misses": self.misses[name]}
+                    for name in sorted(set(self.hits) | set(self.misses))
+                },
+            }
+
+
+def cached_read(scope: Callable[..., Hashable], detach: bool = False):
+    """Serve a ContestManager read from its ReadCache, if it has one.
+
+    `scope` maps the read's arguments to the version scope it belongs to.
+    A miss first ends the session's open read transaction, so it loads
+    from a snapshot at least as new as the version it is stored under.
+    With `detach`, returned ORM objects are expunged from the loading
+    session so they can be shared across sessions; only their loaded
+    column attributes are usable.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return method(self, *args, **kwargs)
+
+            def load():
+                self._end_read_transaction()
+                value = method(self, *args, **kwargs)
+                if detach:
+                    for obj in value:
+                        self.db.expunge(obj)
+                return value
+
+            key = args + tuple(sorted(kwargs.items()))
+            return self.cache.get_or_load(method.__name__, scope(*args, **kwargs), key, load)
+        return wrapper
+    return decorator
+
+
+def contest_scope(contest_id, *args, **kwargs) -> Hashable:
+    """Scope of reads whose first argument is a contest id."""
+    return contest_id
@@ -1,71 +1,161 @@
+from contextlib import contextmanager
 from datetime import datetime
+import json
+import logging
 import random
 import string
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import Contest, Player, Trade, Position, ContestStatus
+from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy.orm import Session, scoped_session
+from sqlalchemy import func, update, bindparam, select, tuple_
+from database import (
+    Contest, Player, Trade, Position, ContestStanding, ContestStatus, EquityPoint, Payout, PayoutStatus
+)
+from equity import backfill_equity_curve, load_equity_curves, record_equity_point
+from feed import ChangeFeed
+from metrics import timed
+from money import average_price, dollars, shares, sql_value, to_cents, to_micros, value
+from cache import ALL_CONTESTS, ReadCache, cached_read, contest_scope
+from ledger import Ledger, LedgerError, PlayerState, replay, TRADE_COLUMNS as LEDGER_COLUMNS
+from payouts import PAYOUT_AMOUNT, payout_key
+from rules import Threshold, TopAtEnd, compile_rule, rule_for
+
+logger = logging.getLogger(__name__)
 
 def generate_join_code(length: int = 6) -> str:
     """Generate a random alphanumeric join code."""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
+class TradeRejected(Exception):
+    """A trade failed validation; the message says why."""
+
+
 class ContestManager:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, cache: Optional[ReadCache] = None,
+                 feed: Optional[ChangeFeed] = None):
+        # A Session, or the app's scoped_session registry, which stands in for the current thread's session
         self.db = db_session
+        # Optional cache of contest reads, invalidated by the writes below
+        self.cache = cache
+        # Optional change feed the writes below publish changed standings to
+        self.feed = feed
+
+    def _changed(self, *scopes):
+        """Invalidate cached reads for contest ids (or ALL_CONTESTS) after a commit."""
+        if self.cache is not None:
+            self.cache.bump(*scopes)
+
+    def _in_transaction(self) -> bool:
+        # scoped_session does not proxy in_transaction()
+        session = self.db() if isinstance(self.db, scoped_session) else self.db
+        return session.in_transaction()
+
+    def _end_read_transaction(self):
+        """End any read transaction still open and expire loaded objects, so reads see the latest commit."""
+        if self._in_transaction():
+            self.db.commit()
+        self.db.expire_all()
+
+    def _publish(self, contest_id: int, player_ids: Optional[List[int]] = None, completed: bool = False):
+        """Publish a committed write's changes to the change feed.
+
+        Sends the standings rows of `player_ids` (None: every player, for
+        writes that revalue the whole contest) and, if the write completed
+        the contest, its outcome. Rows are read after the commit under the
+        feed's publish lock, so events reach viewers in commit order.
+        """
+        if self.feed is None:
+            return
+        try:
+            with self.feed.publishing(contest_id) as publish:
+                if player_ids is None or player_ids:
+                    query = self._standings_query(contest_id)
+                    if player_ids is not None:
+                        query = query.filter(ContestStanding.player_id.in_(player_ids))
+                    publish("standings", [self._standing_dict(row) for row in query])
+                if completed:
+                    contest = self.db.get(Contest, contest_id, populate_existing=True)
+                    publish("contest", {"status": contest.status.value, "winner_id": contest.winner_id,
+                                        "winner_ids": contest.winners,
+                                        "completed_at": contest.completed_at})
+        except Exception:
+            # The write is committed; live views miss this update until they reload
+            logger.exception("publish failed", extra={"contest_id": contest_id})
 
+    @timed()
     def create_contest(self, name: str, win_condition: str, starting_balance: float = 10000.0) -> Contest:
-        """Create a new contest with a unique join code."""
-        join_code = generate_join_code()
-        while self.db.query(Contest).filter_by(join_code=join_code).first():
+        """Create a new contest with a unique join code and a starting balance in dollars.
+
+        The win condition is compiled up front (see rules.compile_rule);
+        raises RuleError if it is not a valid rule.
+        """
+        rule = compile_rule(win_condition)
+        with self._write_transaction():
             join_code = generate_join_code()
+            while self.db.query(Contest).filter_by(join_code=join_code).first():
+                join_code = generate_join_code()
 
-        contest = Contest(
-            name=name,
-            join_code=join_code,
-            win_condition=win_condition,
-            starting_balance=starting_balance,
-            status=ContestStatus.ACTIVE
-        )
-        self.db.add(contest)
-        self.db.commit()
+            contest = Contest(
+                name=name,
+                join_code=join_code,
+                win_condition=win_condition,
+                starting_balance=to_cents(starting_balance),
+                status=ContestStatus.ACTIVE,
+                ends_at=rule.ends_at
+            )
+            self.db.add(contest)
+        self._changed(ALL_CONTESTS)
         return contest
 
+    @timed()
     def join_contest(self, join_code: str, player_name: str) -> Optional[Player]:
         """Add a player to a contest using the join code."""
-        contest = self.db.query(Contest).filter_by(
-            join_code=join_code,
-            status=ContestStatus.ACTIVE
-        ).first()
-        
-        if not contest:
-            return None
+        with self._write_transaction():
+            contest = self.db.query(Contest).filter_by(
+                join_code=join_code,
+                status=ContestStatus.ACTIVE
+            ).first()
+            
+            if not contest:
+                return None
 
-        player = Player(
-            name=player_name,
-            contest_id=contest.id,
-            starting_balance=contest.starting_balance,
-            cash_balance=contest.starting_balance
-        )
-        self.db.add(player)
-        self.db.commit()
+            player = Player(
+                name=player_name,
+                contest_id=contest.id,
+                starting_balance=contest.starting_balance,
+                cash_balance=contest.starting_balance
+            )
+            self.db.add(player)
+            self.db.flush()
+            self.db.add(ContestStanding(
+                contest_id=contest.id,
+                player_id=player.id,
+                starting_balance=player.starting_balance,
+                cash_balance=player.cash_balance,
+                market_value=0,
+                cost_basis=0,
+                total_profit=0
+            ))
+        self._changed(player.contest_id)
+        self._publish(player.contest_id, [player.id])
         return player
 
+    @timed()
     def get_player_positions(self, player_id: int) -> List[Dict]:
-        """Get current positions for a player."""
+        """Get current positions for a player, in shares and dollars."""
         positions = self.db.query(Position).filter_by(player_id=player_id).all()
         return [
             {
                 "ticker": pos.ticker,
-                "quantity": pos.quantity,
-                "avg_price": pos.average_price,
-                "current_price": pos.current_price,
-                "market_value": pos.quantity * pos.current_price,
-                "unrealized_pl": (pos.current_price - pos.average_price) * pos.quantity
+                "quantity": shares(pos.quantity),
+                "avg_price": dollars(pos.average_price),
+                "current_price": dollars(pos.current_price),
+                "market_value": dollars(value(pos.quantity, pos.current_price)),
+                "unrealized_pl": dollars(value(pos.quantity, pos.current_price) - value(pos.quantity, pos.average_price))
             }
             for pos in positions
         ]
 
+    @timed()
     def get_player_trades(self, player_id: int) -> List[Dict]:
         """Get trade history for a player."""
         trades = self.db.query(Trade).filter_by(player_id=player_id).order_by(Trade.trade_date.desc()).all()
@@ -74,256 +164,808 @@ class ContestManager:
                 "date": trade.trade_date,
                 "type": trade.type,
                 "ticker": trade.ticker,
-                "quantity": trade.quantity,
-                "price": trade.price,
-                "total": trade.total_amount
+                "quantity": shares(trade.quantity),
+                "price": dollars(trade.price),
+                "total": dollars(trade.total_amount)
             }
             for trade in trades
         ]
 
-    def get_leaderboard(self, contest_id: int) -> List[dict]:
-        """Get the current leaderboard for a contest."""
-        players = self.db.query(Player).filter_by(contest_id=contest_id).all()
-        leaderboard = []
-        
-        for player in players:
-            positions = self.get_player_positions(player.id)
-            trades = self.get_player_trades(player.id)
-            
-            # Calculate total portfolio value
-            portfolio_value = player.cash_balance + sum(pos["market_value"] for pos in positions)
-            unrealized_pl = sum(pos["unrealized_pl"] for pos in positions)
-            
-            leaderboard.append({
-                "name": player.name,
-                "cash_balance": player.cash_balance,
-                "portfolio_value": portfolio_value,
-                "total_profit": portfolio_value - player.starting_balance,
-                "unrealized_pl": unrealized_pl,
-                "positions": positions,
-                "trades": trades
-            })
-        
-        return sorted(leaderboard, key=lambda x: x["total_profit"], reverse=True)
+    @timed()
+    @cached_read(contest_scope)
+    def get_leaderboard(self, contest_id: int, limit: Optional[int] = None) -> List[dict]:
+        """Get the current leaderboard for a contest, optionally only the top `limit`.
 
+        Reads the materialized contest_standings rows in ranked index order;
+        amounts are summed in cents and returned in dollars. Per-player detail is not included; use get_player_positions /
+        get_player_trades with the returned player_id.
+        """
+        query = (
+            self._standings_query(contest_id)
+            .order_by(ContestStanding.total_profit.desc(), ContestStanding.player_id)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return [self._standing_dict(row) for row in query.all()]
+
+    def _standings_query(self, contest_id: int):
+        return (
+            self.db.query(
+                ContestStanding.player_id,
+                Player.name,
+                ContestStanding.cash_balance,
+                ContestStanding.market_value,
+                ContestStanding.cost_basis,
+                ContestStanding.total_profit,
+            )
+            .join(Player, Player.id == ContestStanding.player_id)
+            .filter(ContestStanding.contest_id == contest_id)
+        )
+
+    @staticmethod
+    def _standing_dict(row) -> Dict[str, Any]:
+        """A leaderboard row in dollars."""
+        return {
+            "player_id": row.player_id,
+            "name": row.name,
+            "cash_balance": dollars(row.cash_balance),
+            "market_value": dollars(row.market_value),
+            "portfolio_value": dollars(row.cash_balance + row.market_value),
+            "total_profit": dollars(row.total_profit),
+            "unrealized_pl": dollars(row.market_value - row.cost_basis),
+        }
+
+    @timed()
+    def get_valuation(self, contest_id: int, prices: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """Value every portfolio in a contest from its positions with vectorized integer sums.
+
+        Positions are marked at `prices` (dollars) where given (e.g. fresh quotes or a
+        what-if scenario), otherwise at their stored current price. Returns
+        rows ranked by total profit, including return_pct.
+        """
+        from valuation import load_contest_positions, value_portfolios
+
+        prices = {ticker: to_cents(price) for ticker, price in prices.items()} if prices else None
+        return value_portfolios(load_contest_positions(self.db, contest_id), prices).to_dict("records")
+
+    @timed()
+    def rebuild_standings(self, contest_id: int) -> int:
+        """Recompute a contest's standings by replaying its trades.
+
+        Trades are applied in (trade_date, id) order, as the ledger and live
+        trades (see _apply_backdated) apply them. Open positions are
+        marked at their stored current price (the last trade price, or a newer
+        quote from update_prices). Returns the number of standings rows that
+        were missing or had drifted.
+        """
+        with self._write_transaction():
+            players = self.db.query(Player).filter_by(contest_id=contest_id).all()
+            states = {player.id: PlayerState(player.starting_balance) for player in players}
+            replay(states, self.db.execute(
+                select(*LEDGER_COLUMNS)
+                .join(Player, Player.id == Trade.player_id)
+                .where(Player.contest_id == contest_id)
+                .order_by(Trade.trade_date, Trade.id)
+            ))
+
+            current_prices = {
+                (player_id, ticker): price
+                for player_id, ticker, price in (
+                    self.db.query(Position.player_id, Position.ticker, Position.current_price)
+                    .join(Player)
+                    .filter(Player.contest_id == contest_id)
+                )
+            }
+            for player_id, state in states.items():
+                for ticker, position in state.positions.items():
+                    position[2] = current_prices.get((player_id, ticker), position[2])
+
+            existing = {
+                standing.player_id: standing
+                for standing in self.db.query(ContestStanding).filter_by(contest_id=contest_id)
+            }
+            drifted = 0
+            for player in players:
+                state = states[player.id]
+                market_value = state.market_value()
+                values = {
+                    "starting_balance": player.starting_balance,
+                    "cash_balance": state.cash,
+                    "market_value": market_value,
+                    "cost_basis": state.cost_basis(),
+                    "total_profit": state.cash + market_value - player.starting_balance,
+                }
+                standing = existing.get(player.id)
+                if standing is None:
+                    standing = ContestStanding(contest_id=contest_id, player_id=player.id)
+                    self.db.add(standing)
+                    drifted += 1
+                elif any(getattr(standing, key) != amount for key, amount in values.items()):
+                    drifted += 1
+                for key, amount in values.items():
+                    setattr(standing, key, amount)
+        self._changed(contest_id)
+        self._publish(contest_id)
+        return drifted
+
+    @timed()
+    def get_standings_at(self, contest_id: int, as_of: datetime) -> List[Dict[str, Any]]:
+        """Contest standings as they were at `as_of`, replayed from the trade ledger."""
+        return Ledger(self.db).standings_at(contest_id, as_of)
+
+    @timed()
+    @cached_read(contest_scope)
+    def get_equity_curve(self, contest_id: int, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Daily portfolio value points for every player in a contest."""
+        return load_equity_curves(self.db, contest_id, start, end)
+
+    @timed()
+    def backfill_equity_curve(self, contest_id: int) -> int:
+        """Recompute a contest's equity curves from its trades; returns points written."""
+        with self._write_transaction():
+            points = backfill_equity_curve(self.db, contest_id)
+        self._changed(contest_id)
+        return points
+
+    def _record_equity(self, player: Player, trade_date: datetime):
+        """Update the player's equity point for the trade's day (no commit).
+
+        A trade dated before the player's latest point changes every later
+        point too, so those are replayed from the ledger instead.
+        """
+        day = trade_date.date()
+        latest = self.db.query(func.max(EquityPoint.day)).filter(EquityPoint.player_id == player.id).scalar()
+        if latest is not None and latest > day:
+            backfill_equity_curve(self.db, player.contest_id, player.id, since=day)
+            return
+        standing = self.db.get(ContestStanding, (player.contest_id, player.id))
+        record_equity_point(self.db, player.contest_id, player.id, day,
+                            standing.cash_balance, standing.market_value)
+
+    @timed()
+    def snapshot_ledger(self, contest_id: int, as_of: Optional[datetime] = None):
+        """Store a ledger snapshot so later replays start from `as_of` (default: now)."""
+        with self._write_transaction():
+            return Ledger(self.db).take_snapshot(contest_id, as_of)
+
+    @timed()
+    def snapshot_active_ledgers(self) -> List[int]:
+        """Snapshot each active contest with trades since its latest snapshot; returns their ids."""
+        ledger = Ledger(self.db)
+        contest_ids = [
+            contest_id for contest_id, in self.db.query(Contest.id).filter_by(status=ContestStatus.ACTIVE)
+        ]
+        stale = [contest_id for contest_id in contest_ids if ledger.needs_snapshot(contest_id)]
+        for contest_id in stale:
+            self.snapshot_ledger(contest_id)
+        return stale
+
+    def _sync_standing(self, player: Player, market_value_delta: int = 0,
+                       cost_basis_delta: int = 0) -> ContestStanding:
+        """Apply a trade's effect (in cents) to the player's standings row (no commit)."""
+        standing = self.db.get(ContestStanding, (player.contest_id, player.id))
+        if standing is None:
+            # Players created before standings existed: seed from current positions
+            market_value, cost_basis = self.db.query(
+                func.coalesce(func.sum(sql_value(Position.quantity, Position.current_price)), 0),
+                func.coalesce(func.sum(sql_value(Position.quantity, Position.average_price)), 0)
+            ).filter(Position.player_id == player.id).one()
+            standing = ContestStanding(
+                contest_id=player.contest_id,
+                player_id=player.id,
+                starting_balance=player.starting_balance,
+                market_value=market_value,
+                cost_basis=cost_basis
+            )
+            self.db.add(standing)
+        else:
+            standing.market_value += market_value_delta
+            standing.cost_basis += cost_basis_delta
+
+        standing.cash_balance = player.cash_balance
+        standing.total_profit = standing.cash_balance + standing.market_value - standing.starting_balance
+        return standing
+
+    def refresh_standings(self, contest_ids: List[int]):
+        """Revalue standings from the stored positions in one set-based UPDATE (no commit).
+
+        Used after current prices change outside of a trade.
+        """
+        market_value = (
+            select(func.coalesce(func.sum(sql_value(Position.quantity, Position.current_price)), 0))
+            .where(Position.player_id == ContestStanding.player_id)
+            .scalar_subquery()
+        )
+        cost_basis = (
+            select(func.coalesce(func.sum(sql_value(Position.quantity, Position.average_price)), 0))
+            .where(Position.player_id == ContestStanding.player_id)
+            .scalar_subquery()
+        )
+        self.db.execute(
+            update(ContestStanding)
+            .where(ContestStanding.contest_id.in_(contest_ids))
+            .values(
+                market_value=market_value,
+                cost_basis=cost_basis,
+                total_profit=ContestStanding.cash_balance + market_value - ContestStanding.starting_balance,
+                updated_at=datetime.utcnow()
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @timed()
+    def get_active_tickers(self) -> List[str]:
+        """Get every ticker held by a player in an active contest, deduplicated."""
+        rows = (
+            self.db.query(Position.ticker)
+            .join(Player, Player.id == Position.player_id)
+            .join(Contest, Contest.id == Player.contest_id)
+            .filter(Contest.status == ContestStatus.ACTIVE)
+            .distinct()
+            .order_by(Position.ticker)
+            .all()
+        )
+        return [ticker for ticker, in rows]
+
+    @timed()
+    def update_prices(self, prices: Dict[str, float]) -> int:
+        """Set current_price (given in dollars) on active-contest positions and revalue their standings.
+
+        Issues one UPDATE per ticker (as a single executemany), not per row.
+        Returns the number of positions updated.
+        """
+        if not prices:
+            return 0
+        active_players = (
+            select(Player.id)
+            .join(Contest, Contest.id == Player.contest_id)
+            .where(Contest.status == ContestStatus.ACTIVE)
+        )
+        statement = (
+            update(Position.__table__)
+            .where(Position.ticker == bindparam("quote_ticker"))
+            .where(Position.player_id.in_(active_players))
+            .values(current_price=bindparam("quote_price"), last_updated=datetime.utcnow())
+        )
+        with self._write_transaction():
+            result = self.db.connection().execute(
+                statement, [{"quote_ticker": ticker, "quote_price": to_cents(price)} for ticker, price in prices.items()]
+            )
+            contests = self.db.query(Contest).filter_by(status=ContestStatus.ACTIVE).all()
+            contest_ids = [contest.id for contest in contests]
+            self.refresh_standings(contest_ids)
+            # Loaded positions and standings no longer match the rows
+            self.db.expire_all()
+            # New prices can carry a player over a threshold
+            now = datetime.utcnow()
+            completed = [contest.id for contest in contests if self._check_contest(contest, now)]
+        self._changed(*contest_ids, *([ALL_CONTESTS] if completed else []))
+        for contest_id in contest_ids:
+            self._publish(contest_id, completed=contest_id in completed)
+        return result.rowcount
+
+    @timed()
+    @cached_read(lambda: ALL_CONTESTS, detach=True)
     def get_active_contests(self) -> List[Contest]:
         """Get all active contests."""
         return self.db.query(Contest).filter_by(status=ContestStatus.ACTIVE).all()
 
+    @timed()
+    @cached_read(lambda *statuses: ALL_CONTESTS, detach=True)
+    def get_contests(self, *statuses: ContestStatus) -> List[Contest]:
+        """Get contests in any of the given statuses, newest last."""
+        return self.db.query(Contest).filter(Contest.status.in_(statuses)).order_by(Contest.id).all()
+
+    @timed()
+    @cached_read(contest_scope, detach=True)
     def get_contest_players(self, contest_id: int) -> List[Player]:
         """Get all players in a contest."""
         return self.db.query(Player).filter_by(contest_id=contest_id).all()
 
-    def get_contest_trades(self, contest_id: int) -> List[Dict[str, Any]]:
-        """Get all trades for a contest, ordered by date."""
-        trades = (
-            self.db.query(Trade, Player.name.label("player_name"))
-            .join(Player)
-            .filter(Player.contest_id == contest_id)
-            .order_by(Trade.trade_date.desc())
-            .all()
+    @timed()
+    @cached_read(contest_scope)
+    def get_contest_trades(self, contest_id: int, limit: Optional[int] = 50,
+                           before: Optional[Tuple[datetime, int]] = None, player_id: Optional[int] = None,
+                           ticker: Optional[str] = None, trade_type: Optional[str] = None) -> Dict[str, Any]:
+        """Get one page of a contest's trades, newest first.
+
+        Pages are keyed on (trade_date, id): pass the previous page's
+        "next_cursor" as `before` to get the next one, so every page is an
+        index range scan however deep it is. Optionally filtered by player,
+        ticker and trade type. Returns {"trades": [...], "next_cursor"},
+        where next_cursor is None on the last page.
+        """
+        query = (
+            self.db.query(Trade.id, Trade.ticker, Trade.type, Trade.quantity, Trade.price,
+                          Trade.total_amount, Trade.trade_date, Trade.player_id, Player.name)
+            .join(Player, Player.id == Trade.player_id)
+            .filter(Trade.contest_id == contest_id)
+            .order_by(Trade.trade_date.desc(), Trade.id.desc())
         )
-        
-        return [{
-            "player": trade.player_name,
-            "ticker": trade.Trade.ticker,
-            "type": trade.Trade.type,
-            "quantity": abs(trade.Trade.quantity),  # Show absolute value
-            "price": trade.Trade.price,
-            "total": trade.Trade.total_amount,
-            "date": trade.Trade.trade_date
-        } for trade in trades]
-
-    def update_position(self, player_id: int, ticker: str, trade_type: str, 
-                       quantity: float, price: float) -> Optional[Position]:
-        """Update a player's position after a trade."""
-        position = self.db.query(Position).filter_by(
-            player_id=player_id,
-            ticker=ticker
-        ).first()
+        if player_id is not None:
+            query = query.filter(Trade.player_id == player_id)
+        if ticker:
+            query = query.filter(Trade.ticker == ticker.upper())
+        if trade_type:
+            query = query.filter(Trade.type == trade_type)
+        if before is not None:
+            query = query.filter(tuple_(Trade.trade_date, Trade.id) < tuple_(*before))
+        if limit is not None:
+            query = query.limit(limit + 1)
+
+        rows = query.all()
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit] if has_more else rows
+        return {
+            "trades": [{
+                "id": row.id,
+                "player_id": row.player_id,
+                "player": row.name,
+                "ticker": row.ticker,
+                "type": row.type,
+                "quantity": shares(abs(row.quantity)),  # Show absolute value
+                "price": dollars(row.price),
+                "total": dollars(row.total_amount),
+                "date": row.trade_date
+            } for row in rows],
+            "next_cursor": (rows[-1].trade_date, rows[-1].id) if has_more else None,
+        }
+
+    def _apply_position(self, player: Player, ticker: str, trade_type: str, quantity: int,
+                        price: int, positions: Optional[Dict[str, Position]] = None) -> Position:
+        """Apply a trade of `quantity` micro-shares at `price` cents to the player's position and standing (no commit).
+
+        With `positions` (the player's positions preloaded by ticker) no query
+        is issued; new positions are added to it, and positions sold down to
+        zero stay in it with quantity 0 for the caller to delete.
+        """
+        if positions is None:
+            position = self.db.query(Position).filter_by(
+                player_id=player.id,
+                ticker=ticker
+            ).first()
+        else:
+            position = positions.get(ticker)
+        # Value of this holding before the trade, for the standings delta
+        old_market_value = value(position.quantity, position.current_price) if position else 0
+        old_cost_basis = value(position.quantity, position.average_price) if position else 0
 
         if trade_type == "BUY":
             if position:
                 # Update existing position
-                new_quantity = position.quantity + quantity
-                position.average_price = (
-                    (position.quantity * position.average_price) + (quantity * price)
-                ) / new_quantity
-                position.quantity = new_quantity
+                position.average_price = average_price(position.quantity, position.average_price, quantity, price)
+                position.quantity += quantity
                 position.current_price = price
             else:
                 # Create new position
                 position = Position(
-                    player_id=player_id,
+                    player_id=player.id,
                     ticker=ticker,
                     quantity=quantity,
                     average_price=price,
                     current_price=price
                 )
                 self.db.add(position)
+                if positions is not None:
+                    positions[ticker] = position
         else:  # SELL
             if not position or position.quantity < quantity:
-                return None
+                raise TradeRejected(f"Insufficient shares of {ticker} to sell")
             
             position.quantity -= quantity
             position.current_price = price
             
-            if position.quantity == 0:
+            if position.quantity == 0 and positions is None:
                 self.db.delete(position)
 
-        self.db.commit()
+        self._sync_standing(
+            player,
+            market_value_delta=value(position.quantity, position.current_price) - old_market_value,
+            cost_basis_delta=value(position.quantity, position.average_price) - old_cost_basis
+        )
         return position
 
-    def record_trade(self, player_id: int, trade_data: dict) -> Optional[Trade]:
-        """Record a new trade for a player and update their position."""
-        player = self.db.query(Player).filter_by(id=player_id).first()
-        if not player:
-            return None
+    def _apply_trade(self, player: Player, ticker: str, trade_type: str, quantity: int,
+                     price: int, trade_date: datetime,
+                     positions: Optional[Dict[str, Position]] = None, backdated: bool = False) -> Trade:
+        """Validate a trade (micro-shares at cents) and apply it to cash, position and standing (no commit).
+
+        `backdated` trades are dated before the player's latest trade and go
+        through _apply_backdated. Raises TradeRejected if the trade cannot be
+        made; the caller rolls back.
+        """
+        if trade_type not in ("BUY", "SELL"):
+            raise TradeRejected(f"Unknown trade type {trade_type!r}")
+        if not ticker or quantity <= 0 or price <= 0:
+            raise TradeRejected("Ticker, quantity and price are required")
+
+        # Calculate total cost/proceeds
+        total_amount = value(quantity, price)
+
+        if backdated:
+            self._apply_backdated(player, (player.id, ticker, trade_type, quantity, price, total_amount),
+                                  trade_date, positions)
+        else:
+            # Check if player has enough cash for buy
+            if trade_type == "BUY" and total_amount > player.cash_balance:
+                raise TradeRejected(
+                    f"Insufficient funds. Required: ${dollars(total_amount):,.2f}, "
+                    f"Available: ${dollars(player.cash_balance):,.2f}"
+                )
+
+            self._apply_position(player, ticker, trade_type, quantity, price, positions)
+
+            # Update player's cash balance once the position change is known to be valid
+            if trade_type == "BUY":
+                player.cash_balance -= total_amount
+            else:
+                player.cash_balance += total_amount
+            self._sync_standing(player)
 
-        total_amount = trade_data["quantity"] * trade_data["price"]
-        
-        # Validate trade
-        if trade_data["trade_type"] == "BUY" and total_amount > player.cash_balance:
-            return None  # Insufficient funds
-        
-        # Create trade record
         trade = Trade(
-            player_id=player_id,
-            ticker=trade_data["ticker"],
-            quantity=trade_data["quantity"],
-            price=trade_data["price"],
-            type=trade_data["trade_type"],
+            player_id=player.id,
+            contest_id=player.contest_id,
+            ticker=ticker,
+            quantity=-quantity if trade_type == "SELL" else quantity,  # Sells are stored negative
+            price=price,
             total_amount=total_amount,
-            trade_date=trade_data.get("date", datetime.utcnow())
+            type=trade_type,
+            trade_date=trade_date,
+            created_at=datetime.utcnow()
         )
-        
-        # Update player's cash balance
-        if trade_data["trade_type"] == "BUY":
-            player.cash_balance -= total_amount
-        else:
-            player.cash_balance += total_amount
-        
-        # Update position
-        position = self.update_position(
+        self.db.add(trade)
+        return trade
+
+    def _apply_backdated(self, player: Player, row: Tuple, trade_date: datetime,
+                         positions: Optional[Dict[str, Position]] = None):
+        """Apply a trade row (see LEDGER_COLUMNS) dated before the player's latest trade (no commit).
+
+        The ledger replays trades in (trade_date, id) order, so the trade is
+        checked in that order: it is rejected if it, or any trade after it,
+        would then sell shares or spend cash the player did not have. Cash,
+        positions and standing are set from the replayed state; open
+        positions keep their stored current price. `positions` is handled as
+        in _apply_position.
+        """
+        self.db.flush()
+        history = self.db.execute(
+            select(Trade.trade_date, *LEDGER_COLUMNS)
+            .where(Trade.player_id == player.id)
+            .order_by(Trade.trade_date, Trade.id)
+        ).all()
+        at = next((i for i, trade in enumerate(history) if trade[0] > trade_date), len(history))
+        state = PlayerState(player.starting_balance)
+        replay({player.id: state}, (trade[1:] for trade in history[:at]))
+        try:
+            replay({player.id: state}, [row, *(trade[1:] for trade in history[at:])], strict=True)
+        except LedgerError as e:
+            raise TradeRejected(f"{e} as of {trade_date:%Y-%m-%d}") from None
+
+        held = positions
+        if held is None:
+            held = {position.ticker: position for position in self.db.query(Position).filter_by(player_id=player.id)}
+        old_market_value = sum(value(p.quantity, p.current_price) for p in held.values())
+        old_cost_basis = sum(value(p.quantity, p.average_price) for p in held.values())
+        for ticker, (quantity, average, last_price) in state.positions.items():
+            position = held.get(ticker)
+            if position is None:
+                position = Position(player_id=player.id, ticker=ticker, current_price=last_price)
+                self.db.add(position)
+                held[ticker] = position
+            position.quantity = quantity
+            position.average_price = average
+        for ticker, position in held.items():
+            if ticker not in state.positions:
+                position.quantity = 0
+
+        player.cash_balance = state.cash
+        self._sync_standing(
+            player,
+            market_value_delta=sum(value(p.quantity, p.current_price) for p in held.values()) - old_market_value,
+            cost_basis_delta=sum(value(p.quantity, p.average_price) for p in held.values()) - old_cost_basis
+        )
+        if positions is None:
+            for position in held.values():
+                if position.quantity == 0:
+                    self.db.delete(position)
+
+    def _latest_trade_date(self, player_id: int) -> Optional[datetime]:
+        return self.db.scalar(select(func.max(Trade.trade_date)).where(Trade.player_id == player_id))
+
+    def _lock_player(self, player_id: int) -> Optional[Player]:
+        """Load a player row for update inside a write transaction."""
+        return (
+            self.db.query(Player)
+            .filter_by(id=player_id)
+            .with_for_update()
+            .first()
+        )
+
+    @contextmanager
+    def _write_transaction(self):
+        """Run the block as one write transaction that commits exactly once.
+
+        Any read transaction the session still has open is ended first and
+        loaded objects are expired, so rows are re-read under the lock. On
+        SQLite the transaction starts with BEGIN IMMEDIATE, which takes the
+        write lock up front so concurrent writers queue behind each other
+        instead of acting on stale reads; other databases rely on the
+        SELECT ... FOR UPDATE in _lock_player.
+        """
+        self._end_read_transaction()
+        self.db.connection(execution_options={"sqlite_immediate": True})
+        try:
+            yield
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    @timed()
+    def record_trade(self, player_id: int, trade_data: dict) -> Optional[Trade]:
+        """Record a new trade for a player and update their position."""
+        return self.process_trade(
             player_id,
             trade_data["ticker"],
             trade_data["trade_type"],
             trade_data["quantity"],
-            trade_data["price"]
+            trade_data["price"],
+            trade_data.get("date", datetime.utcnow())
         )
-        
-        if position is not None:
-            self.db.add(trade)
-            self.db.commit()
-            return trade
-        
-        return None
 
+    @timed()
     def process_trade(self, player_id: int, ticker: str, trade_type: str, quantity: float, price: float, trade_date: datetime) -> Optional[Trade]:
-        """Process a new trade for a player."""
+        """Process a new trade for a player.
+
+        Validation, cash, position, standings and the trade row are applied in
+        a single transaction with the player row locked, and committed once.
+        Raises TradeRejected, with the reason, if the trade is not allowed;
+        returns None if it failed for any other reason (logged).
+        """
         try:
-            print(f"Processing trade - Player: {player_id}, Ticker: {ticker}, Type: {trade_type}, Qty: {quantity}, Price: {price}, Date: {trade_date}")
-            
-            player = self.db.query(Player).filter_by(id=player_id).first()
-            if not player:
-                print(f"Error: Player {player_id} not found")
-                return None
-                
-            # Calculate total cost/proceeds
-            total_amount = quantity * price
-            print(f"Total amount: ${total_amount:,.2f}")
-            
-            # For sells, make quantity negative
-            if trade_type == "SELL":
-                quantity = -quantity
-                
-            # Check if player has enough cash for buy
-            if trade_type == "BUY" and total_amount > player.cash_balance:
-                print(f"Error: Insufficient funds. Required: ${total_amount:,.2f}, Available: ${player.cash_balance:,.2f}")
-                return None
-                
-            # Create and record the trade
-            now = datetime.utcnow()
-            trade = Trade(
-                player_id=player_id,
-                ticker=ticker.upper(),
-                quantity=quantity,
-                price=price,
-                total_amount=total_amount,
-                type=trade_type,
-                trade_date=trade_date,  # Use provided trade_date
-                created_at=now  # Keep created_at as current time
-            )
-            
-            print(f"Current cash balance: ${player.cash_balance:,.2f}")
-            # Update player's cash balance
-            if trade_type == "BUY":
-                player.cash_balance -= total_amount
-            else:
-                player.cash_balance += total_amount
-            print(f"New cash balance: ${player.cash_balance:,.2f}")
-                
-            # Update or create position
-            position = self.update_position(player_id, ticker, trade_type, abs(quantity), price)
-            if position:
-                print(f"Updated position - Ticker: {position.ticker}, Quantity: {position.quantity}, Avg Price: ${position.average_price:,.2f}")
-            
-            # Save changes
-            self.db.add(trade)
-            self.db.commit()
-            print("Trade processed successfully")
-            
+            logger.debug("processing trade", extra={
+                "player_id": player_id, "ticker": ticker, "trade_type": trade_type,
+                "quantity": quantity, "price": price, "trade_date": trade_date,
+            })
+
+            with self._write_transaction():
+                player = self._lock_player(player_id)
+                if not player:
+                    raise TradeRejected(f"Player {player_id} not found")
+                contest = self._active_contest(player)
+
+                latest = self._latest_trade_date(player_id)
+                trade = self._apply_trade(player, ticker.upper(), trade_type,
+                                          to_micros(quantity), to_cents(price), trade_date,
+                                          backdated=latest is not None and trade_date < latest)
+                Ledger(self.db).invalidate_from(player.contest_id, trade_date)
+                self._record_equity(player, trade_date)
+                completed = self._check_trade(contest, player, datetime.utcnow())
+
+            self._changed(player.contest_id, *([ALL_CONTESTS] if completed else []))
+            self._publish(player.contest_id, [player_id], completed)
+            logger.info("trade processed", extra={
+                "player_id": player_id, "trade_id": trade.id, "cash_balance": dollars(player.cash_balance),
+            })
             return trade
-            
-        except Exception as e:
-            print(f"Error processing trade: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-            self.db.rollback()
+
+        except TradeRejected as e:
+            logger.info("trade rejected", extra={"player_id": player_id, "reason": str(e)})
+            raise
+
+        except Exception:
+            logger.exception("trade failed", extra={"player_id": player_id})
             return None
 
-    def check_contest_completion(self, contest_id: int) -> bool:
-        """Check if contest should be completed based on win condition."""
-        # For now, we'll leave this as a manual process
-        # In the future, we can add logic to parse and evaluate win conditions
+    @timed()
+    def import_trades(self, player_id: int, rows) -> Dict[str, Any]:
+        """Import many trades for a player in one transaction.
+
+        `rows` is a DataFrame (see trade_import.read_trades_csv) or an iterable
+        of dicts with ticker, trade_type, quantity, price and date. Rows are
+        validated column-wise, applied in trade date order against positions
+        loaded once, and committed together. Rows that fail validation or
+        cannot be applied (insufficient funds or shares) are skipped and
+        reported as {"row", "error"} in "rejected".
+        """
+        from trade_import import prepare_trades
+
+        valid, rejected = prepare_trades(rows, default_date=datetime.utcnow())
+        imported = 0
+
+        with self._write_transaction():
+            player = self._lock_player(player_id)
+            if not player:
+                raise TradeRejected(f"Player {player_id} not found")
+            contest = self._active_contest(player)
+            completed = False
+            now = datetime.utcnow()
+            # Rows are in date order, so only rows dated before the existing trades are backdated
+            latest = self._latest_trade_date(player_id)
+            positions = {
+                position.ticker: position
+                for position in self.db.query(Position).filter_by(player_id=player_id)
+            }
+
+            with self.db.no_autoflush:
+                for row, date, ticker, trade_type, quantity, price in zip(
+                    valid["row"].tolist(), valid["date"].dt.to_pydatetime().tolist(),
+                    valid["ticker"].tolist(), valid["trade_type"].tolist(),
+                    valid["quantity"].tolist(), valid["price"].tolist()
+                ):
+                    if completed:
+                        rejected.append({"row": row, "error": "Contest is completed"})
+                        continue
+                    try:
+                        self._apply_trade(player, ticker, trade_type, to_micros(quantity), to_cents(price),
+                                          date, positions, backdated=latest is not None and date < latest)
+                    except TradeRejected as e:
+                        rejected.append({"row": row, "error": str(e)})
+                    else:
+                        imported += 1
+                        completed = self._check_trade(contest, player, now)
+
+            if imported:
+                first_date = valid["date"].min().to_pydatetime()
+                Ledger(self.db).invalidate_from(player.contest_id, first_date)
+                backfill_equity_curve(self.db, player.contest_id, player.id, since=first_date.date())
+
+            for position in positions.values():
+                if position.quantity == 0:
+                    if position in self.db.new:
+                        self.db.expunge(position)
+                    else:
+                        self.db.delete(position)
+
+        if imported:
+            self._changed(player.contest_id, *([ALL_CONTESTS] if completed else []))
+            self._publish(player.contest_id, [player_id], completed)
+        rejected.sort(key=lambda r: r["row"])
+        return {"imported": imported, "rejected": rejected}
+
+    def _active_contest(self, player: Player) -> Contest:
+        contest = self.db.get(Contest, player.contest_id)
+        if contest.status != ContestStatus.ACTIVE:
+            raise TradeRejected(f"Contest is {contest.status.value}")
+        return contest
+
+    def _complete(self, contest: Contest, winner_ids: List[int], at: datetime):
+        """Mark a contest COMPLETED with its winners, best first (no commit)."""
+        contest.status = ContestStatus.COMPLETED
+        contest.winner_id = winner_ids[0] if winner_ids else None
+        contest.winner_ids = json.dumps(winner_ids)
+        contest.completed_at = at
+        logger.info("contest completed", extra={"contest_id": contest.id, "winner_ids": winner_ids})
+
+    def _check_trade(self, contest: Contest, player: Player, now: datetime) -> bool:
+        """Complete the contest if the trading player's standing now meets its rule (no commit).
+
+        `now` is the server's time, not the trade's: a backdated trade entered
+        after a rule's deadline must not win. Constant time: the standing is
+        the row _sync_standing just updated.
+        """
+        rule = rule_for(contest.win_condition)
+        if rule is None or contest.status != ContestStatus.ACTIVE:
+            return False
+        standing = self.db.get(ContestStanding, (player.contest_id, player.id))
+        if not rule.met_by(standing, now):
+            return False
+        self._complete(contest, [player.id], now)
+        return True
+
+    def _check_contest(self, contest: Contest, now: datetime) -> bool:
+        """Complete the contest if its leading standing meets its rule or it has ended (no commit)."""
+        rule = rule_for(contest.win_condition)
+        if rule is None or contest.status != ContestStatus.ACTIVE:
+            return False
+        if isinstance(rule, Threshold):
+            order = ContestStanding.total_profit.desc() if rule.best_first else ContestStanding.total_profit
+            leader = (
+                self.db.query(ContestStanding)
+                .filter_by(contest_id=contest.id)
+                .order_by(order, ContestStanding.player_id)
+                .first()
+            )
+            if leader is not None and rule.met_by(leader, now):
+                self._complete(contest, [leader.player_id], now)
+                return True
+        if rule.ends_at is not None and now >= rule.ends_at:
+            winner_ids = []
+            if isinstance(rule, TopAtEnd):
+                winner_ids = list(self.db.scalars(
+                    select(ContestStanding.player_id)
+                    .where(ContestStanding.contest_id == contest.id)
+                    .order_by(ContestStanding.total_profit.desc(), ContestStanding.player_id)
+                    .limit(rule.top)
+                ))
+            self._complete(contest, winner_ids, now)
+            return True
         return False
 
+    @timed()
+    def check_contest_completion(self, contest_id: int, now: Optional[datetime] = None) -> bool:
+        """Complete the contest if its win condition is met or its end date has passed.
+
+        Trades are checked as they are processed; this covers what happens
+        without a trade: price moves, and dated rules reaching their end (a
+        threshold rule then ends with no winner, "top N" with the top N
+        standings as winners). Returns whether the contest is completed.
+        Contests with a free-text condition are left to be completed by hand.
+        """
+        now = now or datetime.utcnow()
+        with self._write_transaction():
+            contest = self.db.get(Contest, contest_id)
+            if contest is None:
+                return False
+            completed = self._check_contest(contest, now)
+            status = contest.status
+        if completed:
+            self._changed(contest_id, ALL_CONTESTS)
+            self._publish(contest_id, [], completed)
+        return status == ContestStatus.COMPLETED
+
+    @timed()
+    def expire_contests(self, now: Optional[datetime] = None) -> List[int]:
+        """Complete active contests whose end date has passed; returns their ids."""
+        now = now or datetime.utcnow()
+        due = [
+            contest_id for contest_id, in self.db.query(Contest.id)
+            .filter(Contest.status == ContestStatus.ACTIVE, Contest.ends_at <= now)
+        ]
+        return [contest_id for contest_id in due if self.check_contest_completion(contest_id, now)]
+
     def end_contest(self, contest_id: int, winner_id: int) -> bool:
         """End a contest and set the winner."""
         # Removed since contests should persist after payout
         return True
         
-    def payout_winner(self, contest_id: int, winner_id: int) -> bool:
-        """Process payout to contest winner using Payman."""
-        try:
-            print(f"Starting payout process for contest {contest_id}, winner {winner_id}")
-            from app import payman
-            
-            print("Creating agent payee...")
-            # Create agent payee
-            winner_agent_payee = payman.payments.create_payee(
-                type='PAYMAN_AGENT',
-                payman_agent='agt-1efec0ba-aca9-66db-9c15-ed3e511002ed',
-                name='Contest Winner',
-                contact_details={
-                    'email': 'marc@a16z.com'
-                }
-            )
-            print(f"Agent payee created: {winner_agent_payee}")
-            
-            print("Sending payment...")
-            # Send payment
-            payment = payman.payments.send_payment(
-                amount_decimal=50.00,
-                payment_destination_id=winner_agent_payee.id,
-                memo='Investing contest winnings payment 🥳'
-            )
-            
-            print('Payment sent:', payment.reference)
-            return True
-            
-        except Exception as e:
-            print(f"Payman error: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-            return False
+    @timed()
+    def payout_winner(self, contest_id: int, winner_id: int, amount: float = PAYOUT_AMOUNT) -> Optional[Dict[str, Any]]:
+        """Queue a payout of `amount` dollars to the contest winner; payouts.PayoutWorker sends it.
+
+        Idempotent per (contest, winner): asking again returns the existing
+        job instead of paying twice, and a FAILED job is queued again.
+        Returns the job as get_payout does, or None if the winner is not in
+        the contest.
+        """
+        key = payout_key(contest_id, winner_id)
+        with self._write_transaction():
+            payout = self.db.query(Payout).filter_by(idempotency_key=key).first()
+            if payout is None:
+                winner = self.db.get(Player, winner_id)
+                if winner is None or winner.contest_id != contest_id:
+                    return None
+                payout = Payout(contest_id=contest_id, player_id=winner_id, idempotency_key=key,
+                                amount=to_cents(amount))
+                self.db.add(payout)
+            elif payout.status == PayoutStatus.FAILED:
+                payout.status = PayoutStatus.PENDING
+                payout.attempts = 0
+                payout.next_attempt_at = datetime.utcnow()
+            self.db.flush()
+            result = self._payout_dict(payout)
+        logger.info("payout queued", extra={"contest_id": contest_id, "winner_id": winner_id,
+                                            "payout_id": result["id"], "status": result["status"]})
+        return result
+
+    def get_payout(self, payout_id: int) -> Optional[Dict[str, Any]]:
+        """Current state of a payout job, for polling."""
+        # End any read transaction still open so the worker's updates are visible
+        if self._in_transaction():
+            self.db.commit()
+        payout = self.db.get(Payout, payout_id, populate_existing=True)
+        return self._payout_dict(payout) if payout else None
+
+    @staticmethod
+    def _payout_dict(payout: Payout) -> Dict[str, Any]:
+        return {
+            "id": payout.id,
+            "contest_id": payout.contest_id,
+            "player_id": payout.player_id,
+            "amount": dollars(payout.amount),
+            "status": payout.status.value,
+            "attempts": payout.attempts,
+            "reference": payout.reference,
+            "last_error": payout.last_error,
+        }
@@ -1,8 +1,30 @@
+import json
+import logging
+import os
+import threading
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, Date, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, scoped_session, sessionmaker
 import enum
+from metrics import METRICS
+from money import MONEY_SCALE, QUANTITY_SCALE, ScaledInteger
+
+logger = logging.getLogger(__name__)
+
+# Connection pool and SQLite tuning for the shared engine
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 20))
+POOL_TIMEOUT = 30  # seconds to wait for a free connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_SYNCHRONOUS = 'NORMAL'  # durable in WAL mode, one fsync per checkpoint instead of per commit
+
+# PRAGMA user_version of the current schema; 1: money in cents, quantities in micro-shares
+SCHEMA_VERSION = 1
+
+# Fixed-point amounts: integer cents and micro-shares (see money.py)
+Cents = ScaledInteger(MONEY_SCALE)
+Micros = ScaledInteger(QUANTITY_SCALE)
 
 Base = declarative_base()
 
@@ -11,6 +33,12 @@ class ContestStatus(enum.Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+class PayoutStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 class Contest(Base):
     __tablename__ = 'contests'
     
@@ -18,52 +46,397 @@ class Contest(Base):
     name = Column(String, nullable=False)
     join_code = Column(String, unique=True, nullable=False)
     win_condition = Column(String, nullable=False)
-    starting_balance = Column(Float, nullable=False, default=10000.0)  # Default $10k starting balance
+    starting_balance = Column(Cents, nullable=False, default=1_000_000)  # Default $10k starting balance
     status = Column(Enum(ContestStatus), default=ContestStatus.ACTIVE)
     created_at = Column(DateTime, default=datetime.utcnow)
+    ends_at = Column(DateTime)         # set by dated win conditions (see rules.compile_rule)
+    completed_at = Column(DateTime)
+    winner_id = Column(Integer)        # players.id of the winner (the first, with several), once completed
+    winner_ids = Column(Text)          # JSON list of every winner's players.id, best first
     players = relationship("Player", back_populates="contest")
 
+    __table_args__ = (
+        Index('ix_contests_status', 'status'),
+    )
+
+    @property
+    def winners(self) -> list:
+        """players.id of every winner, best first ("top N" rules have up to N)."""
+        if self.winner_ids:
+            return json.loads(self.winner_ids)
+        return [self.winner_id] if self.winner_id is not None else []
+
 class Player(Base):
     __tablename__ = 'players'
     
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     contest_id = Column(Integer, ForeignKey('contests.id'))
-    starting_balance = Column(Float, nullable=False)  # Set when joining contest
-    cash_balance = Column(Float, nullable=False)     # Available cash
+    starting_balance = Column(Cents, nullable=False)  # Set when joining contest
+    cash_balance = Column(Cents, nullable=False)      # Available cash
     created_at = Column(DateTime, default=datetime.utcnow)
     contest = relationship("Contest", back_populates="players")
     trades = relationship("Trade", back_populates="player")
     positions = relationship("Position", back_populates="player")
 
+    __table_args__ = (
+        Index('ix_players_contest_id', 'contest_id'),
+    )
+
 class Position(Base):
     __tablename__ = 'positions'
     
     id = Column(Integer, primary_key=True)
     player_id = Column(Integer, ForeignKey('players.id'))
     ticker = Column(String, nullable=False)
-    quantity = Column(Float, nullable=False)
-    average_price = Column(Float, nullable=False)
-    current_price = Column(Float, nullable=False)  # Updated when viewing leaderboard
+    quantity = Column(Micros, nullable=False)
+    average_price = Column(Cents, nullable=False)
+    current_price = Column(Cents, nullable=False)  # Updated when viewing leaderboard
     last_updated = Column(DateTime, default=datetime.utcnow)
     player = relationship("Player", back_populates="positions")
 
+    # One position per ticker per player; also serves the per-trade lookup
+    __table_args__ = (
+        Index('uq_positions_player_ticker', 'player_id', 'ticker', unique=True),
+    )
+
 class Trade(Base):
     __tablename__ = 'trades'
     
     id = Column(Integer, primary_key=True)
     player_id = Column(Integer, ForeignKey('players.id'))
+    contest_id = Column(Integer, ForeignKey('contests.id'))  # copy of the player's, for contest-wide history
     ticker = Column(String, nullable=False)
-    quantity = Column(Float, nullable=False)
-    price = Column(Float, nullable=False)
+    quantity = Column(Micros, nullable=False)
+    price = Column(Cents, nullable=False)
     type = Column(String, nullable=False)  # 'BUY' or 'SELL'
-    total_amount = Column(Float, nullable=False)  # quantity * price
+    total_amount = Column(Cents, nullable=False)  # money.value(quantity, price)
     trade_date = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     player = relationship("Player", back_populates="trades")
 
+    # Trade history is filtered by player or contest and paged by (trade_date, id)
+    __table_args__ = (
+        Index('ix_trades_player_id_trade_date', 'player_id', 'trade_date'),
+        Index('ix_trades_contest_id_trade_date_id', 'contest_id', 'trade_date', 'id'),
+    )
+
+@event.listens_for(Trade, 'before_update')
+@event.listens_for(Trade, 'before_delete')
+def _trades_are_append_only(mapper, connection, target):
+    """Trades are the ledger that positions and snapshots are replayed from."""
+    raise ValueError(f"Trade {target.id} is part of the append-only ledger and cannot be changed")
+
+class ContestStanding(Base):
+    """Materialized leaderboard row, kept in step with every trade."""
+    __tablename__ = 'contest_standings'
+
+    contest_id = Column(Integer, ForeignKey('contests.id'), primary_key=True)
+    player_id = Column(Integer, ForeignKey('players.id'), primary_key=True)
+    starting_balance = Column(Cents, nullable=False)
+    cash_balance = Column(Cents, nullable=False)
+    market_value = Column(Cents, nullable=False, default=0)  # sum(value(quantity, current_price))
+    cost_basis = Column(Cents, nullable=False, default=0)    # sum(value(quantity, average_price))
+    total_profit = Column(Cents, nullable=False, default=0)  # cash + market value - starting balance
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    player = relationship("Player")
+
+    # Ranked order: the top-K of a contest is a forward range scan of this index
+    __table_args__ = (
+        Index('ix_contest_standings_rank', 'contest_id', total_profit.desc(), 'player_id'),
+    )
+
+class LedgerSnapshot(Base):
+    """Every player's cash and positions in a contest as of a trade date.
+
+    holdings is JSON: {player_id: {"starting_balance", "cash", "positions":
+    {ticker: [quantity, average_price, last_price]}}}. See ledger.Ledger.
+    """
+    __tablename__ = 'ledger_snapshots'
+
+    id = Column(Integer, primary_key=True)
+    contest_id = Column(Integer, ForeignKey('contests.id'), nullable=False)
+    as_of = Column(DateTime, nullable=False)  # includes every trade with trade_date <= as_of
+    holdings = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Replay looks up the latest snapshot at or before a timestamp
+    __table_args__ = (
+        Index('ix_ledger_snapshots_contest_id_as_of', 'contest_id', 'as_of'),
+    )
+
+class EquityPoint(Base):
+    """A player's portfolio value at the end of a trading day (equity curve)."""
+    __tablename__ = 'equity_points'
+
+    player_id = Column(Integer, ForeignKey('players.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    contest_id = Column(Integer, ForeignKey('contests.id'), nullable=False)
+    cash_balance = Column(Cents, nullable=False)
+    market_value = Column(Cents, nullable=False)
+
+    # The leaderboard chart reads a contest's points for a date range
+    __table_args__ = (
+        Index('ix_equity_points_contest_id_day', 'contest_id', 'day'),
+    )
+
+class Payout(Base):
+    """A payout job: one per (contest, winner), processed by payouts.PayoutWorker."""
+    __tablename__ = 'payouts'
+
+    id = Column(Integer, primary_key=True)
+    contest_id = Column(Integer, ForeignKey('contests.id'), nullable=False)
+    player_id = Column(Integer, ForeignKey('players.id'), nullable=False)
+    idempotency_key = Column(String, nullable=False, unique=True)  # also sent to the payment provider
+    amount = Column(Cents, nullable=False)
+    status = Column(Enum(PayoutStatus), nullable=False, default=PayoutStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = Column(DateTime)   # when a worker took the job; stale claims are retried
+    sending_at = Column(DateTime)   # set while a non-idempotent gateway sends; outcome unknown if the lease expires
+    payee_id = Column(String)       # kept so retries do not create the payee again
+    reference = Column(String)      # provider's payment reference once sent
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # The worker polls for due jobs by status and time
+    __table_args__ = (
+        Index('ix_payouts_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+class JobRun(Base):
+    """Schedule and last outcome of a scheduled job (see scheduler.Scheduler)."""
+    __tablename__ = 'job_runs'
+
+    name = Column(String, primary_key=True)
+    next_run_at = Column(DateTime, nullable=False)
+    running_until = Column(DateTime)  # lease held by the process running the job
+    runs = Column(Integer, nullable=False, default=0)
+    last_started_at = Column(DateTime)
+    last_finished_at = Column(DateTime)
+    last_status = Column(String)      # "ok" or "error"
+    last_result = Column(Text)        # JSON of what the job returned
+    last_error = Column(Text)
+
+def add_missing_columns(conn):
+    """Add columns declared on the models to tables created before they existed.
+
+    New columns are added as nullable; backfill_columns fills in their values.
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+def backfill_columns(conn):
+    """Fill columns that add_missing_columns left empty on existing rows."""
+    conn.exec_driver_sql(
+        "UPDATE trades SET contest_id = "
+        "(SELECT players.contest_id FROM players WHERE players.id = trades.player_id) "
+        "WHERE contest_id IS NULL"
+    )
+
+def scale_float_columns(conn):
+    """Convert a database from float dollars and shares to integer cents and micro-shares.
+
+    Run once, on databases created before SCHEMA_VERSION 1. Columns keep
+    their REAL affinity, so SQLite stores the integers as whole floats;
+    they are read back as ints and are exact well beyond any balance here.
+    Ledger snapshots hold float JSON and are dropped (they are rebuilt).
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        for column in table.columns:
+            if isinstance(column.type, ScaledInteger) and column.name in existing:
+                conn.exec_driver_sql(
+                    f"UPDATE {table.name} SET {column.name} = "
+                    f"CAST(ROUND({column.name} * {column.type.scale}) AS INTEGER)"
+                )
+    conn.exec_driver_sql("DELETE FROM ledger_snapshots")
+
+def merge_duplicate_positions(conn) -> int:
+    """Merge positions held in more than one row for the same player and ticker.
+
+    Older versions could race to insert a second row for a ticker, which
+    keeps the unique (player_id, ticker) index from being created. The
+    oldest row is kept with the summed quantity, the quantity-weighted
+    average price and the newest current price. Returns rows removed.
+    """
+    group = "p.player_id = positions.player_id AND p.ticker = positions.ticker"
+    conn.exec_driver_sql(
+        f"UPDATE positions SET "
+        f"quantity = (SELECT SUM(p.quantity) FROM positions p WHERE {group}), "
+        f"average_price = COALESCE((SELECT CAST(ROUND(SUM(p.quantity * p.average_price) "
+        f"/ NULLIF(SUM(p.quantity), 0)) AS INTEGER) FROM positions p WHERE {group}), average_price), "
+        f"current_price = (SELECT p.current_price FROM positions p WHERE {group} ORDER BY p.id DESC LIMIT 1) "
+        f"WHERE id IN (SELECT MIN(id) FROM positions WHERE player_id IS NOT NULL "
+        f"GROUP BY player_id, ticker HAVING COUNT(*) > 1)"
+    )
+    removed = conn.exec_driver_sql(
+        "DELETE FROM positions WHERE player_id IS NOT NULL AND id NOT IN "
+        "(SELECT MIN(id) FROM positions WHERE player_id IS NOT NULL GROUP BY player_id, ticker)"
+    ).rowcount
+    if removed:
+        logger.warning("merged duplicate positions", extra={"rows_removed": removed})
+    return removed
+
+def create_missing_indexes(conn):
+    """Add indexes declared on the models to tables created before they existed.
+
+    create_all only emits CREATE INDEX alongside CREATE TABLE, so databases
+    from older versions would otherwise never get them. Duplicate positions
+    are merged first so the unique index on them can be built.
+    """
+    position_indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(positions)")}
+    if 'uq_positions_player_ticker' not in position_indexes:
+        merge_duplicate_positions(conn)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def migrate(engine):
+    """Bring the schema and data up to SCHEMA_VERSION.
+
+    Everything runs in one BEGIN IMMEDIATE transaction and the version is
+    read after the write lock is taken: a process starting at the same time
+    waits and then finds the work done, and a crash rolls back the scaling
+    together with the version bump, so money is never scaled twice.
+    """
+    with engine.connect() as conn:
+        conn.execution_options(sqlite_immediate=True)
+        with conn.begin():
+            version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+            existing = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'players'"
+            ).first() is not None
+            Base.metadata.create_all(conn)
+            add_missing_columns(conn)
+            backfill_columns(conn)
+            if existing and version < 1:
+                scale_float_columns(conn)
+            create_missing_indexes(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def backfill_standings(engine):
+    """Build contest_standings rows for players that have none.
+
+    Databases from before the table existed only get rows for players who
+    join after the upgrade, so rebuild every contest with a player missing one.
+    """
+    from contest import ContestManager  # contest imports this module
+
+    with engine.connect() as conn:
+        contest_ids = [row[0] for row in conn.exec_driver_sql(
+            "SELECT DISTINCT players.contest_id FROM players "
+            "LEFT JOIN contest_standings ON contest_standings.player_id = players.id "
+            "WHERE contest_standings.player_id IS NULL AND players.contest_id IS NOT NULL"
+        )]
+    if not contest_ids:
+        return
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    try:
+        manager = ContestManager(session)
+        for contest_id in contest_ids:
+            manager.rebuild_standings(contest_id)
+    finally:
+        session.close()
+
+def backfill_equity_curves(engine):
+    """Build equity curves for players whose curve starts after their first trade.
+
+    Points are only recorded as trades come in, so databases from before
+    equity_points existed have none for earlier trades; replay each contest
+    with such a player once. Afterwards every curve starts on its first
+    trade day, so later starts find nothing to do.
+    """
+    from contest import ContestManager  # contest imports this module
+
+    with engine.connect() as conn:
+        contest_ids = [row[0] for row in conn.exec_driver_sql(
+            "SELECT DISTINCT players.contest_id FROM players "
+            "JOIN (SELECT player_id, MIN(trade_date) AS first_trade FROM trades GROUP BY player_id) t "
+            "ON t.player_id = players.id "
+            "LEFT JOIN (SELECT player_id, MIN(day) AS first_day FROM equity_points GROUP BY player_id) e "
+            "ON e.player_id = players.id "
+            "WHERE players.contest_id IS NOT NULL "
+            "AND (e.first_day IS NULL OR date(t.first_trade) < e.first_day)"
+        )]
+    if not contest_ids:
+        return
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    try:
+        manager = ContestManager(session)
+        for contest_id in contest_ids:
+            points = manager.backfill_equity_curve(contest_id)
+            logger.info("backfilled equity curve", extra={"contest_id": contest_id, "points": points})
+    finally:
+        session.close()
+
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.Lock()
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Put every new pooled connection in WAL mode with a busy timeout."""
+    # Stop pysqlite from issuing its own deferred BEGIN; _begin_sqlite_transaction does it
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def _begin_sqlite_transaction(conn):
+    """Start a transaction, taking the write lock immediately if requested.
+
+    Write paths pass execution_options(sqlite_immediate=True) so they acquire
+    the lock before reading the rows they are about to modify.
+    """
+    if conn.get_execution_options().get('sqlite_immediate'):
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+    else:
+        conn.exec_driver_sql('BEGIN')
+
+def get_engine(db_path='trading_contest.db'):
+    """Return the process-wide engine for db_path, creating the schema on first use."""
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = create_engine(
+                f'sqlite:///{db_path}',
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                connect_args={'check_same_thread': False}
+            )
+            event.listen(engine, 'connect', _configure_sqlite_connection)
+            event.listen(engine, 'begin', _begin_sqlite_transaction)
+            METRICS.instrument_engine(engine)
+            migrate(engine)
+            backfill_standings(engine)
+            backfill_equity_curves(engine)
+            _engines[db_path] = engine
+        return engine
+
+def get_scoped_session(db_path='trading_contest.db'):
+    """Return the thread-local session registry bound to the shared engine.
+
+    Call the registry to get the current thread's session and .remove() it
+    when the request is done so its connection goes back to the pool.
+    """
+    engine = get_engine(db_path)
+    with _engines_lock:
+        factory = _session_factories.get(db_path)
+        if factory is None:
+            # Sessions are short-lived, so keep loaded attributes usable
+            # after commit instead of re-querying them
+            factory = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+            _session_factories[db_path] = factory
+        return factory
+
 def init_db(db_path='trading_contest.db'):
-    engine = create_engine(f'sqlite:///{db_path}')
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session()
+    """Return a new standalone session on the shared engine for db_path."""
+    return get_scoped_session(db_path).session_factory()
@@ -0,0 +1,92 @@
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, delete, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from database import EquityPoint, Player, Trade
+from ledger import Ledger, TRADE_COLUMNS, replay
+from money import dollars
+
+
+def record_equity_point(db: Session, contest_id: int, player_id: int, day: date,
+                        cash_balance: int, market_value: int) -> None:
+    """Insert or overwrite a player's point (in cents) for `day`. Does not commit."""
+    statement = sqlite_insert(EquityPoint).values(
+        player_id=player_id, day=day, contest_id=contest_id,
+        cash_balance=cash_balance, market_value=market_value
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[EquityPoint.player_id, EquityPoint.day],
+        set_={"cash_balance": statement.excluded.cash_balance, "market_value": statement.excluded.market_value}
+    ))
+
+
+def backfill_equity_curve(db: Session, contest_id: int, player_id: Optional[int] = None,
+                          since: Optional[date] = None) -> int:
+    """Rebuild equity points from the trade ledger in one pass over the trades.
+
+    Points on or after `since` (default: all) are replaced, for one player or
+    the whole contest. State before `since` comes from Ledger.state_at, so a
+    snapshot shortens the replay. Each trading day's point marks positions
+    at their last trade price. Returns the number of points written. Does
+    not commit.
+    """
+    start = datetime.combine(since or date.min, time.min)
+    # Trades strictly before `start`; datetime.min itself cannot be stepped back
+    states = Ledger(db).state_at(contest_id, start - timedelta(microseconds=1) if since else start, player_id)
+
+    player_ids = select(Player.id).where(Player.contest_id == contest_id)
+    if player_id is not None:
+        player_ids = player_ids.where(Player.id == player_id)
+    trades = (
+        select(Trade.trade_date, *TRADE_COLUMNS)
+        .where(Trade.player_id.in_(player_ids), Trade.trade_date >= start)
+        .order_by(Trade.player_id, Trade.trade_date, Trade.id)
+    )
+    points = []
+    for (pid, day), rows in groupby(db.execute(trades), key=lambda row: (row[1], row[0].date())):
+        replay(states, (row[1:] for row in rows))
+        state = states[pid]
+        points.append({
+            "player_id": pid,
+            "day": day,
+            "contest_id": contest_id,
+            "cash_balance": state.cash,
+            "market_value": state.market_value(),
+        })
+
+    stale = delete(EquityPoint).where(EquityPoint.contest_id == contest_id, EquityPoint.day >= start.date())
+    if player_id is not None:
+        stale = stale.where(EquityPoint.player_id == player_id)
+    db.execute(stale.execution_options(synchronize_session=False))
+    if points:
+        db.execute(insert(EquityPoint), points)
+    return len(points)
+
+
+def load_equity_curves(db: Session, contest_id: int, start: Optional[date] = None,
+                       end: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Read a contest's equity points (in dollars) for a date range in one query, ordered by day."""
+    query = (
+        select(EquityPoint.day, EquityPoint.player_id, Player.name,
+               EquityPoint.cash_balance, EquityPoint.market_value)
+        .join(Player, Player.id == EquityPoint.player_id)
+        .where(EquityPoint.contest_id == contest_id)
+        .order_by(EquityPoint.day, EquityPoint.player_id)
+    )
+    if start is not None:
+        query = query.where(EquityPoint.day >= start)
+    if end is not None:
+        query = query.where(EquityPoint.day <= end)
+    return [
+        {
+            "day": row.day,
+            "player_id": row.player_id,
+            "name": row.name,
+            "cash_balance": dollars(row.cash_balance),
+            "market_value": dollars(row.market_value),
+            "portfolio_value": dollars(row.cash_balance + row.market_value),
+        }
+        for row in db.execute(query)
+    ]
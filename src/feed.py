@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set
+
+
+class Event(NamedTuple):
+    """One change to a contest: seq numbers a contest's events from 1.
+
+    kind is "standings" (data: the changed leaderboard rows, as
+    get_leaderboard returns them) or "contest" (data: status, winner_id,
+    winner_ids and completed_at after the contest completed).
+    """
+
+    seq: int
+    kind: str
+    data: Any
+
+
+class Subscription:
+    """A subscriber's queue of events for one contest, read from an asyncio event loop."""
+
+    def __init__(self, feed: "ChangeFeed", contest_id: int, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.feed = feed
+        self.contest_id = contest_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(max_queue)
+        # Set when events were dropped because the subscriber fell behind
+        self.overflowed = False
+
+    def _put(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def put(self, event: Event):
+        """Queue an event; safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """The next event, or None after `timeout` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """In-process publish/subscribe of contest changes, for live views.
+
+    ContestManager publishes the standings rows a write changed once it has
+    committed, so a viewer applies only those rows instead of reloading the
+    leaderboard. The last `history` events of each contest are kept: a
+    viewer that polls (since) or reconnects with the last seq it saw gets
+    just the events it missed, or None if they were dropped and it must
+    reload. Subscribers are asyncio queues woken from the publishing
+    thread, so an idle subscriber costs a queue and no thread; one that
+    falls `max_queue` events behind is marked overflowed.
+
+    Like ReadCache, it only sees writes made through this process.
+    """
+
+    def __init__(self, history: int = 256, max_queue: int = 1000):
+        self.history = history
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._seq: Dict[int, int] = defaultdict(int)
+        self._events: Dict[int, Deque[Event]] = defaultdict(lambda: deque(maxlen=self.history))
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._publish_locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+
+    @contextmanager
+    def publishing(self, contest_id: int):
+        """Hold the contest's publish lock; yields publish(kind, data) for it.
+
+        Publishers read what changed and publish it inside this block, so a
+        later event never carries older rows than an earlier one.
+        """
+        with self._lock:
+            lock = self._publish_locks[contest_id]
+        with lock:
+            yield lambda kind, data: self.publish(contest_id, kind, data)
+
+    def publish(self, contest_id: int, kind: str, data: Any) -> Event:
+        with self._lock:
+            self._seq[contest_id] += 1
+            event = Event(self._seq[contest_id], kind, data)
+            self._events[contest_id].append(event)
+            subscribers = list(self._subscribers.get(contest_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put(event)
+            except RuntimeError:  # its event loop is closed
+                self.unsubscribe(subscription)
+        return event
+
+    def latest(self, contest_id: int) -> int:
+        """Seq of the contest's last event (0 if none)."""
+        with self._lock:
+            return self._seq.get(contest_id, 0)
+
+    def since(self, contest_id: int, seq: int) -> Optional[List[Event]]:
+        """Events after `seq`, oldest first; None if some were dropped from the history.
+
+        A seq ahead of the feed (e.g. seen before a restart) also gives None.
+        """
+        with self._lock:
+            latest = self._seq.get(contest_id, 0)
+            if seq == latest:
+                return []
+            if seq > latest:
+                return None
+            events = self._events.get(contest_id, ())
+            if not events or events[0].seq > seq + 1:
+                return None
+            return [event for event in events if event.seq > seq]
+
+    def subscribe(self, contest_id: int, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        """Subscribe to a contest's events; call from the event loop that will read them."""
+        subscription = Subscription(self, contest_id, loop or asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers[contest_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.contest_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.contest_id]
+
+    def subscribers(self, contest_id: Optional[int] = None) -> int:
+        """Number of subscribers, to one contest or overall."""
+        with self._lock:
+            if contest_id is not None:
+                return len(self._subscribers.get(contest_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
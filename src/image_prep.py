@@ -0,0 +1,119 @@
+import io
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from PIL import Image, ImageChops, ImageOps
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+# Other names Pillow's format names go by
+FORMAT_ALIASES = {"JPG": "JPEG", "MPO": "JPEG"}
+
+# Fractions of a phone screenshot (left, top, right, bottom) that hold the
+# order details: drops the status bar and the bottom tab bar / home indicator
+PHONE_CROP_BOX = (0.0, 0.06, 1.0, 0.92)
+PHONE_ASPECT_RATIO = 1.6  # height / width at or above which PHONE_CROP_BOX applies
+
+
+class ImagePreprocessor:
+    """Shrink screenshots before they are sent for OCR.
+
+    Detects the real image format, trims uniform margins, crops phone
+    screenshots to the trade-details region, downscales so the longest side
+    is at most `max_dimension`, and re-encodes as `output_format`. Keeps
+    running totals of bytes saved and time spent.
+    """
+
+    def __init__(self, max_dimension: int = 1536, output_format: str = "JPEG", quality: int = 85,
+                 crop_box: Optional[Tuple[float, float, float, float]] = PHONE_CROP_BOX):
+        self.max_dimension = max_dimension
+        self.output_format = FORMAT_ALIASES.get(output_format.upper(), output_format.upper())
+        if self.output_format not in MIME_TYPES:
+            raise ValueError(f"Unsupported output format {output_format!r}; use one of {', '.join(MIME_TYPES)}")
+        self.quality = quality
+        self.crop_box = crop_box
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.elapsed_ms = 0.0
+        self._lock = threading.Lock()
+
+    def _crop(self, image: Image.Image) -> Image.Image:
+        # Trim borders that match the top-left pixel (solid app background)
+        background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+        bbox = ImageChops.difference(image, background).getbbox()
+        if bbox:
+            image = image.crop(bbox)
+
+        width, height = image.size
+        if self.crop_box and height >= width * PHONE_ASPECT_RATIO:
+            left, top, right, bottom = self.crop_box
+            image = image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+        return image
+
+    def process(self, image_bytes: bytes) -> Dict[str, Any]:
+        """Return the shrunk image and what it cost.
+
+        The result always has "data", "mime_type", "source_format", "size"
+        (of the image in "data"), "original_bytes", "bytes", "bytes_saved"
+        and "elapsed_ms". If the re-encoded image would not be smaller, the
+        original bytes are kept.
+        """
+        start = time.perf_counter()
+        image = Image.open(io.BytesIO(image_bytes))
+        source_format = FORMAT_ALIASES.get(image.format, image.format)
+        original_size = image.size
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            image = image.convert("RGBA")
+            flattened = Image.new("RGB", image.size, (255, 255, 255))
+            flattened.paste(image, mask=image.getchannel("A"))
+            image = flattened
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        image = self._crop(image)
+        image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.output_format, quality=self.quality, optimize=True)
+        data = buffer.getvalue()
+        mime_type = MIME_TYPES[self.output_format]
+        size = image.size
+        if len(data) >= len(image_bytes) and source_format in MIME_TYPES:
+            data, mime_type, size = image_bytes, MIME_TYPES[source_format], original_size
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.images += 1
+            self.bytes_in += len(image_bytes)
+            self.bytes_out += len(data)
+            self.elapsed_ms += elapsed_ms
+
+        return {
+            "data": data,
+            "mime_type": mime_type,
+            "source_format": source_format,
+            "size": size,
+            "original_bytes": len(image_bytes),
+            "bytes": len(data),
+            "bytes_saved": len(image_bytes) - len(data),
+            "elapsed_ms": elapsed_ms,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Running totals across every processed image."""
+        with self._lock:
+            return {
+                "images": self.images,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "elapsed_ms": self.elapsed_ms,
+            }
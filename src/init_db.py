@@ -1,8 +1,8 @@
-from database import Base, engine
+from database import get_engine
 
 def init_db():
-    # Create all tables
-    Base.metadata.create_all(engine)
+    # Creating the engine creates all tables and indexes
+    get_engine()
 
 if __name__ == "__main__":
     init_db()
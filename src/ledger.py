@@ -0,0 +1,186 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from database import LedgerSnapshot, Player, Trade
+from money import average_price, dollars, value
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerState:
+    """Cash and open positions of one player at a point in the ledger.
+
+    positions maps ticker -> [quantity, average_price, last_price], in
+    micro-shares and cents; cash is in cents.
+    """
+
+    __slots__ = ("starting_balance", "cash", "positions")
+
+    def __init__(self, starting_balance: int, cash: Optional[int] = None,
+                 positions: Optional[Dict[str, List[int]]] = None):
+        self.starting_balance = starting_balance
+        self.cash = starting_balance if cash is None else cash
+        self.positions = positions if positions is not None else {}
+
+    def market_value(self) -> int:
+        return sum(value(quantity, price) for quantity, _, price in self.positions.values())
+
+    def cost_basis(self) -> int:
+        return sum(value(quantity, average) for quantity, average, _ in self.positions.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"starting_balance": self.starting_balance, "cash": self.cash, "positions": self.positions}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PlayerState":
+        return cls(data["starting_balance"], data["cash"], {t: list(p) for t, p in data["positions"].items()})
+
+
+# Columns replay() expects, in order
+TRADE_COLUMNS = (Trade.player_id, Trade.ticker, Trade.type, Trade.quantity, Trade.price, Trade.total_amount)
+
+
+class LedgerError(ValueError):
+    """A trade the ledger cannot apply: selling shares not held, or buying without the cash."""
+
+
+def replay(states: Dict[int, PlayerState], trades: Iterable[Tuple], strict: bool = False) -> int:
+    """Apply trade rows (see TRADE_COLUMNS) to player states in the given order.
+
+    Mirrors ContestManager's position rules: buys average in, sells reduce
+    the quantity and close the position at zero, and every trade marks the
+    position at its price. A sell of more shares than are held is never
+    applied: with `strict` it raises LedgerError, as does a buy costing more
+    than the cash; otherwise it is skipped and logged (histories recorded
+    before trades were checked in date order can hold one). Returns the
+    number of trades applied.
+    """
+    applied = 0
+    for player_id, ticker, trade_type, quantity, price, total_amount in trades:
+        state = states.get(player_id)
+        if state is None:
+            continue
+        quantity = abs(quantity)
+        positions = state.positions
+        position = positions.get(ticker)
+        if trade_type == "SELL" and (not position or position[0] < quantity):
+            if strict:
+                raise LedgerError(f"Insufficient shares of {ticker} to sell")
+            logger.warning("skipped sell of shares not held", extra={"player_id": player_id, "ticker": ticker})
+            continue
+        if strict and trade_type == "BUY" and total_amount > state.cash:
+            raise LedgerError(
+                f"Insufficient funds. Required: ${dollars(total_amount):,.2f}, "
+                f"Available: ${dollars(state.cash):,.2f}"
+            )
+        applied += 1
+        if trade_type == "BUY":
+            state.cash -= total_amount
+            if position:
+                position[1] = average_price(position[0], position[1], quantity, price)
+                position[0] += quantity
+                position[2] = price
+            else:
+                positions[ticker] = [quantity, price, price]
+        else:
+            state.cash += total_amount
+            position[0] -= quantity
+            position[2] = price
+            if position[0] == 0:
+                del positions[ticker]
+    return applied
+
+
+class Ledger:
+    """Point-in-time contest state rebuilt from the append-only trades table.
+
+    Periodic snapshots store every player's cash and positions as of a
+    trade date; state_at loads the nearest earlier snapshot and replays only
+    the trades dated after it, in (trade_date, id) order per player. A trade dated on
+    or before a snapshot invalidates that snapshot (invalidate_from).
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _nearest_snapshot(self, contest_id: int, as_of: datetime) -> Optional[LedgerSnapshot]:
+        return self.db.execute(
+            select(LedgerSnapshot)
+            .where(LedgerSnapshot.contest_id == contest_id, LedgerSnapshot.as_of <= as_of)
+            .order_by(LedgerSnapshot.as_of.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+
+    def state_at(self, contest_id: int, as_of: Optional[datetime] = None,
+                 player_id: Optional[int] = None) -> Dict[int, PlayerState]:
+        """Rebuild player states as of `as_of` (default: now), optionally for one player."""
+        as_of = as_of or datetime.utcnow()
+        snapshot = self._nearest_snapshot(contest_id, as_of)
+
+        players = select(Player.id, Player.starting_balance).where(Player.contest_id == contest_id)
+        if player_id is not None:
+            players = players.where(Player.id == player_id)
+        states = {pid: PlayerState(starting_balance) for pid, starting_balance in self.db.execute(players)}
+        player_ids = select(players.subquery().c.id)
+
+        # Players' states are independent, so trades only need ordering per
+        # player; (player_id, trade_date, id) is the order of
+        # ix_trades_player_id_trade_date, so no sort is needed
+        trades = (
+            select(*TRADE_COLUMNS)
+            .where(Trade.player_id.in_(player_ids), Trade.trade_date <= as_of)
+            .order_by(Trade.player_id, Trade.trade_date, Trade.id)
+        )
+        if snapshot is not None:
+            for pid, data in json.loads(snapshot.holdings).items():
+                if int(pid) in states:
+                    states[int(pid)] = PlayerState.from_dict(data)
+            trades = trades.where(Trade.trade_date > snapshot.as_of)
+
+        replay(states, self.db.execute(trades))
+        return states
+
+    def standings_at(self, contest_id: int, as_of: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Contest standings in dollars as of a date, positions marked at their last trade price."""
+        rows = []
+        for pid, state in self.state_at(contest_id, as_of).items():
+            market_value = state.market_value()
+            rows.append({
+                "player_id": pid,
+                "cash_balance": dollars(state.cash),
+                "market_value": dollars(market_value),
+                "portfolio_value": dollars(state.cash + market_value),
+                "total_profit": dollars(state.cash + market_value - state.starting_balance),
+            })
+        return sorted(rows, key=lambda row: (-row["total_profit"], row["player_id"]))
+
+    def take_snapshot(self, contest_id: int, as_of: Optional[datetime] = None) -> LedgerSnapshot:
+        """Store every player's state as of `as_of` (default: now). Does not commit."""
+        as_of = as_of or datetime.utcnow()
+        states = self.state_at(contest_id, as_of)
+        snapshot = LedgerSnapshot(
+            contest_id=contest_id,
+            as_of=as_of,
+            holdings=json.dumps({pid: state.to_dict() for pid, state in states.items()}, separators=(",", ":"))
+        )
+        self.db.add(snapshot)
+        return snapshot
+
+    def needs_snapshot(self, contest_id: int) -> bool:
+        """Whether the contest has trades dated after its latest snapshot."""
+        latest = self.db.scalar(
+            select(func.max(LedgerSnapshot.as_of)).where(LedgerSnapshot.contest_id == contest_id)
+        )
+        last_trade = self.db.scalar(select(func.max(Trade.trade_date)).where(Trade.contest_id == contest_id))
+        return last_trade is not None and (latest is None or last_trade > latest)
+
+    def invalidate_from(self, contest_id: int, trade_date: datetime) -> None:
+        """Drop snapshots that a trade dated `trade_date` would change. Does not commit."""
+        self.db.execute(
+            delete(LedgerSnapshot)
+            .where(LedgerSnapshot.contest_id == contest_id, LedgerSnapshot.as_of >= trade_date)
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Plain log lines with `extra` fields appended as key=value."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        return f"{line} {fields}" if fields else line
+
+
+_configured = False
+
+
+def configure_logging(level: Optional[str] = None, json_format: Optional[bool] = None):
+    """Send log records to stderr at LOG_LEVEL (default WARNING), as JSON if LOG_FORMAT=json.
+
+    Safe to call on every Streamlit rerun; only the first call configures.
+    Below the configured level, logger calls return before formatting.
+    """
+    global _configured
+    if _configured:
+        return
+    level = level or os.getenv('LOG_LEVEL', 'WARNING')
+    if json_format is None:
+        json_format = os.getenv('LOG_FORMAT', 'text') == 'json'
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter() if json_format else
+                         KeyValueFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    _configured = True
@@ -0,0 +1,186 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: constant memory, O(log buckets) per observation."""
+
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of observations."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+        }
+
+
+class _Operation:
+    __slots__ = ("name", "statements", "executions")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.statements = 0
+        self.executions: Counter = Counter()
+
+
+class Metrics:
+    """Latency histograms and SQL statement counts per named operation.
+
+    Wrap an operation in timer(name) (or decorate it with timed) and call
+    instrument_engine once per engine; every statement executed on the same
+    thread while an operation is open is counted against it (and against
+    any operation it is nested in). An operation that runs the same SQL more
+    than `n_plus_one_threshold` times is recorded as a likely N+1 query.
+    Disabled (METRICS_ENABLED=0), timers and the engine hook do nothing.
+    """
+
+    def __init__(self, enabled: bool = True, n_plus_one_threshold: int = 10):
+        self.enabled = enabled
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latency: Dict[str, Histogram] = defaultdict(Histogram)
+            self._statements: Dict[str, List[int]] = defaultdict(lambda: [0, 0])  # [total, max]
+            self._n_plus_one: Dict[str, Dict[str, Any]] = {}
+
+    def _stack(self) -> List[_Operation]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time the block and count the SQL it runs as one call of `name`."""
+        if not self.enabled:
+            yield
+            return
+        operation = _Operation(name)
+        stack = self._stack()
+        stack.append(operation)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stack.pop()
+            self._record(operation, elapsed_ms)
+
+    def _record(self, operation: _Operation, elapsed_ms: float):
+        repeated = operation.executions.most_common(1)
+        with self._lock:
+            self._latency[operation.name].observe(elapsed_ms)
+            statements = self._statements[operation.name]
+            statements[0] += operation.statements
+            statements[1] = max(statements[1], operation.statements)
+            if repeated and repeated[0][1] > self.n_plus_one_threshold:
+                statement, executions = repeated[0]
+                flagged = self._n_plus_one.setdefault(operation.name, {"occurrences": 0, "max_executions": 0})
+                flagged["occurrences"] += 1
+                flagged["max_executions"] = max(flagged["max_executions"], executions)
+                flagged["statement"] = " ".join(statement.split())[:300]
+
+    def observe(self, name: str, elapsed_ms: float):
+        """Record a latency measured elsewhere."""
+        if self.enabled:
+            with self._lock:
+                self._latency[name].observe(elapsed_ms)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = getattr(self._local, "stack", None)
+        # Transaction control (our explicit BEGIN) is not a query
+        if stack and not statement.startswith("BEGIN"):
+            for operation in stack:
+                operation.statements += 1
+                operation.executions[statement] += 1
+
+    def instrument_engine(self, engine):
+        """Count statements run on `engine` against the open operations."""
+        from sqlalchemy import event
+
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-operation latency and SQL statistics, plus flagged N+1 operations."""
+        with self._lock:
+            operations = {}
+            for name, histogram in sorted(self._latency.items()):
+                summary = histogram.summary()
+                if name in self._statements:
+                    total, most = self._statements[name]
+                    summary["statements"] = {
+                        "total": total,
+                        "mean": total / histogram.count if histogram.count else 0.0,
+                        "max": most,
+                    }
+                operations[name] = summary
+            return {
+                "operations": operations,
+                "n_plus_one": {name: dict(flagged) for name, flagged in self._n_plus_one.items()},
+            }
+
+
+# Process-wide metrics used by ContestManager, TradeParser and the engine
+METRICS = Metrics(enabled=os.getenv('METRICS_ENABLED', '1') != '0')
+
+
+def timed(name: Optional[str] = None, metrics: Optional[Metrics] = None):
+    """Decorate a function or method so each call is recorded by metrics.timer.
+
+    The default name is the function's __qualname__, e.g.
+    "ContestManager.process_trade".
+    """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorder = metrics or METRICS
+            if not recorder.enabled:
+                return fn(*args, **kwargs)
+            with recorder.timer(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
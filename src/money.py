@@ -0,0 +1,96 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import NewType, Union
+from sqlalchemy import BigInteger, cast
+from sqlalchemy.types import TypeDecorator
+
+# Money is stored and computed as integer cents and share quantities as
+# integer micro-shares, so sums and comparisons are exact. Convert to and
+# from float dollars / shares only at the edges (user input, display).
+MONEY_SCALE = 100            # cents per dollar
+QUANTITY_SCALE = 1_000_000   # micro-shares per share
+
+Cents = NewType("Cents", int)
+Micros = NewType("Micros", int)
+
+Number = Union[int, float, str, Decimal]
+
+
+def _scale(value: Number, scale: int) -> int:
+    # Via the decimal repr so 1.005 dollars is 100.5 cents (rounded to even), not 100.4999...
+    if isinstance(value, int):
+        return value * scale
+    exact = Decimal(value) if isinstance(value, (str, Decimal)) else Decimal(repr(float(value)))
+    return int((exact * scale).to_integral_value(ROUND_HALF_EVEN))
+
+
+def to_cents(dollars: Number) -> Cents:
+    """Dollars to cents, rounded half to even."""
+    return Cents(_scale(dollars, MONEY_SCALE))
+
+
+def to_micros(shares: Number) -> Micros:
+    """Shares to micro-shares, rounded half to even."""
+    return Micros(_scale(shares, QUANTITY_SCALE))
+
+
+def dollars(cents: int) -> float:
+    return cents / MONEY_SCALE
+
+
+def shares(micros: int) -> float:
+    return micros / QUANTITY_SCALE
+
+
+def divide(numerator: int, denominator: int) -> int:
+    """Integer division rounded half to even."""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def value(quantity: Micros, price: Cents) -> Cents:
+    """Cents worth of `quantity` micro-shares at `price` cents per share, rounded half up.
+
+    Quantities and prices are never negative, so this is the same floor
+    division SQL and NumPy do (see sql_value); totals built from it agree
+    to the cent wherever they are computed.
+    """
+    return Cents((quantity * price + QUANTITY_SCALE // 2) // QUANTITY_SCALE)
+
+
+def sql_value(quantity, price):
+    """value() as a SQL expression."""
+    return cast((quantity * price + QUANTITY_SCALE // 2) // QUANTITY_SCALE, BigInteger)
+
+
+def average_price(quantity: Micros, cost: int, added: Micros, price: Cents) -> Cents:
+    """Average price per share after buying `added` at `price` on top of `quantity` at `cost` per share."""
+    return Cents(divide(quantity * cost + added * price, quantity + added))
+
+
+class ScaledInteger(TypeDecorator):
+    """An integer column of a fixed-point amount, e.g. ScaledInteger(MONEY_SCALE) for cents.
+
+    Binding a non-integral float raises TypeError, so unscaled dollars
+    cannot be written by mistake. Values read back are ints, also from
+    REAL columns of databases migrated from float storage.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def __init__(self, scale: int):
+        super().__init__()
+        self.scale = scale
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        raise TypeError(f"{value!r} is not a scaled integer (1/{self.scale} units)")
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else int(value)
@@ -1,32 +1,20 @@
 import os
 import json
-import base64
-from openai import OpenAI
+import hashlib
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from ocr_cache import ParseCache
+from image_prep import ImagePreprocessor
+from ocr_backends import OCRBackend, backend_from_env
+from metrics import METRICS, timed
 
-class TradeParser:
-    def __init__(self, api_key: Optional[str] = None):
-        self.client = OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'))
+logger = logging.getLogger(__name__)
 
-    def parse_screenshot(self, image_bytes: bytes) -> Dict[str, Any]:
-        """
-        Extract trade information from a Robinhood screenshot using OpenAI's gpt-4o-mini.
-        Returns a dictionary with trade details or error message.
-        """
-        try:
-            # Convert image to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            
-            # Ask GPT-4V to extract the information
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": """You are a JSON extractor. Your task is to extract trade details from a Robinhood screenshot and output ONLY a JSON object with this structure:
+EXTRACTION_PROMPT = """You are a JSON extractor. Your task is to extract trade details from a Robinhood screenshot and output ONLY a JSON object with this structure:
 {
     "trade_type": "buy" or "sell",
     "ticker": "stock symbol",
@@ -35,21 +23,76 @@ class TradeParser:
     "date": "YYYY-MM-DD"
 }
 Use null for any missing values. Output ONLY the JSON object, no other text or explanation."""
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }],
-                max_tokens=300
-            )
-            
-            # Get the response text and parse JSON
-            raw_result = response.choices[0].message.content.strip()
-            print(f"Raw GPT response: {raw_result}")  # Debug output
+
+class TradeParser:
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ParseCache] = None,
+                 preprocessor: Optional[ImagePreprocessor] = None, backend: Optional[OCRBackend] = None,
+                 max_concurrency: int = 8, request_timeout: float = 30.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        # Model that reads the screenshot; OpenAI unless OCR_BACKEND says otherwise
+        self.backend = backend or backend_from_env(api_key)
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Shrinks uploads before they are sent to the model
+        self.preprocessor = preprocessor or ImagePreprocessor()
+        # Parsed results keyed by image hash, so reruns with the same upload skip the API
+        self.cache = cache if cache is not None else ParseCache(os.getenv('OCR_CACHE_PATH', 'ocr_cache.db'))
+
+    def _with_retries(self, call, *args, **kwargs):
+        """Call the backend, retrying transient failures with full-jitter exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call(*args, **kwargs)
+            except self.backend.retryable_errors:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+    def parse_screenshots(self, images: List[bytes], max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Parse several screenshots concurrently on a bounded thread pool.
+        Returns one result per image, in input order; identical images are parsed once.
+        """
+        unique = list(dict.fromkeys(images))
+        workers = max(1, min(max_concurrency or self.max_concurrency, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = dict(zip(unique, pool.map(self.parse_screenshot, unique)))
+        return [dict(results[image]) for image in images]
+
+    @timed()
+    def parse_screenshot(self, image_bytes: bytes) -> Dict[str, Any]:
+        """
+        Extract trade information from a Robinhood screenshot using the configured backend
+        (OpenAI's gpt-4o-mini by default).
+        Returns a dictionary with trade details or error message.
+        Successful results are cached by the SHA-256 of the image bytes.
+        """
+        try:
+            cache_key = hashlib.sha256(image_bytes).hexdigest()
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            # Crop, downscale and re-encode before sending
+            image = self.preprocessor.process(image_bytes)
+            image["digest"] = cache_key
+            METRICS.observe("ImagePreprocessor.process", image["elapsed_ms"])
+            logger.debug("preprocessed image", extra={
+                "original_bytes": image["original_bytes"], "bytes": image["bytes"], "elapsed_ms": image["elapsed_ms"],
+            })
+
+            # Ask the model to extract the information
+            with METRICS.timer(f"{type(self.backend).__name__}.complete"):
+                raw_result = self._with_retries(
+                    self.backend.complete, EXTRACTION_PROMPT, image, timeout=self.request_timeout
+                )
+
+            # Parse the response text as JSON
+            raw_result = raw_result.strip()
+            logger.debug("model response", extra={"digest": cache_key, "response": raw_result})
             
             try:
                 # Try to clean the response if it contains markdown code blocks
@@ -59,7 +102,7 @@ Use null for any missing values. Output ONLY the JSON object, no other text or e
                     raw_result = raw_result.split("```")[1].strip()
                 
                 parsed_data = json.loads(raw_result)
-                return {
+                result = {
                     "success": True,
                     "trade_type": parsed_data.get("trade_type"),
                     "ticker": parsed_data.get("ticker"),
@@ -67,6 +110,8 @@ Use null for any missing values. Output ONLY the JSON object, no other text or e
                     "price": parsed_data.get("price"),
                     "date": parsed_data.get("date")
                 }
+                self.cache.put(cache_key, result)
+                return result
             except json.JSONDecodeError as e:
                 return {
                     "success": False,
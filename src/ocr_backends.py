@@ -0,0 +1,122 @@
+import base64
+import glob
+import hashlib
+import os
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+class OCRBackend:
+    """Turns a preprocessed screenshot into the model's raw text reply.
+
+    `image` is the dict from ImagePreprocessor.process plus "digest", the
+    SHA-256 of the original upload. Exceptions listed in `retryable_errors`
+    are retried by TradeParser with backoff.
+    """
+
+    retryable_errors: Tuple[type, ...] = ()
+
+    def complete(self, prompt: str, image: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        raise NotImplementedError
+
+
+class OpenAIBackend(OCRBackend):
+    """Sends the screenshot to an OpenAI vision model."""
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-mini", max_tokens: int = 300):
+        import openai
+
+        # Retries are done by TradeParser with jittered backoff rather than by the SDK
+        self.client = openai.OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'), max_retries=0)
+        self.model = model
+        self.max_tokens = max_tokens
+        # Rate limits, timeouts, dropped connections and 5xx
+        self.retryable_errors = (
+            openai.RateLimitError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        )
+
+    def complete(self, prompt: str, image: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        base64_image = base64.b64encode(image["data"]).decode("utf-8")
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": f"data:{image['mime_type']};base64,{base64_image}"}
+                    }
+                ]
+            }],
+            max_tokens=self.max_tokens,
+            timeout=timeout
+        )
+        return response.choices[0].message.content
+
+
+class FixtureBackend(OCRBackend):
+    """Serves canned replies for known screenshots, offline and deterministic.
+
+    Replies are looked up by the SHA-256 of the original upload. A fixture
+    directory may hold image files with a reply file of the same name
+    (trade.png + trade.json), or reply files named <sha256>.json. `latency`
+    seconds (plus up to `jitter` more) are slept per call to simulate the
+    network, so the upload pipeline can be load-tested without an API key.
+    """
+
+    retryable_errors = (TimeoutError,)
+
+    def __init__(self, fixture_dir: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.replies: Dict[str, str] = {}
+        self.calls = 0
+        if fixture_dir:
+            self.load(fixture_dir)
+
+    def load(self, fixture_dir: str):
+        for reply_path in glob.glob(os.path.join(fixture_dir, "*.json")):
+            stem = os.path.splitext(reply_path)[0]
+            with open(reply_path) as f:
+                reply = f.read()
+            images = [stem + ext for ext in IMAGE_EXTENSIONS if os.path.exists(stem + ext)]
+            if images:
+                with open(images[0], "rb") as f:
+                    self.add(f.read(), reply)
+            else:
+                self.replies[os.path.basename(stem)] = reply
+
+    def add(self, image_bytes: bytes, reply: str):
+        """Register the reply to serve for an image."""
+        self.replies[hashlib.sha256(image_bytes).hexdigest()] = reply
+
+    def complete(self, prompt: str, image: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        self.calls += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Fixture reply took longer than {timeout}s")
+        time.sleep(delay)
+        reply = self.replies.get(image["digest"])
+        if reply is None:
+            raise LookupError(f"No fixture reply for image {image['digest']}")
+        return reply
+
+
+def backend_from_env(api_key: Optional[str] = None) -> OCRBackend:
+    """Pick the backend from OCR_BACKEND ("openai", the default, or "fixtures").
+
+    The fixtures backend reads OCR_FIXTURE_DIR and OCR_FIXTURE_LATENCY_MS.
+    """
+    if os.getenv('OCR_BACKEND', 'openai') == 'fixtures':
+        return FixtureBackend(
+            os.getenv('OCR_FIXTURE_DIR', 'tests/fixtures'),
+            latency=float(os.getenv('OCR_FIXTURE_LATENCY_MS', 0)) / 1000
+        )
+    return OpenAIBackend(api_key)
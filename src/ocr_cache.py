@@ -0,0 +1,118 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class ParseCache:
+    """Cache of parsed screenshot results keyed by the SHA-256 of the image bytes.
+
+    A bounded in-memory LRU sits in front of an optional SQLite file so results
+    survive restarts. Entries expire after `ttl_seconds`; the disk store keeps
+    at most `max_disk_entries`, dropping the least recently used.
+    """
+
+    def __init__(self, path: Optional[str] = "ocr_cache.db", max_memory_entries: int = 256,
+                 max_disk_entries: int = 10000, ttl_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite store on first use."""
+        if self.path is None:
+            return None
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_parse_cache_accessed_at ON parse_cache (accessed_at)"
+            )
+        return self._conn
+
+    def _remember(self, key: str, stored_at: float, result: Dict[str, Any]):
+        self._memory[key] = (stored_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return dict(entry[1])
+                del self._memory[key]
+
+            conn = self._disk()
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT result, stored_at FROM parse_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if now - row[1] <= self.ttl_seconds:
+                        conn.execute("UPDATE parse_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        result = json.loads(row[0])
+                        self._remember(key, row[1], result)
+                        self.disk_hits += 1
+                        return dict(result)
+                    conn.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a result in memory and on disk, evicting the oldest entries over the limits."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, dict(result))
+            conn = self._disk()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (key, result, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now)
+            )
+            conn.execute("DELETE FROM parse_cache WHERE stored_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM parse_cache WHERE key IN ("
+                "SELECT key FROM parse_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._disk()
+            if conn is not None:
+                conn.execute("DELETE FROM parse_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
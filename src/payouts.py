@@ -0,0 +1,321 @@
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from database import Payout, PayoutStatus
+from metrics import METRICS
+from money import dollars
+
+logger = logging.getLogger(__name__)
+
+# Who contest payouts go to and what they say
+PAYMAN_AGENT = 'agt-1efec0ba-aca9-66db-9c15-ed3e511002ed'
+PAYEE_NAME = 'Contest Winner'
+PAYEE_EMAIL = 'marc@a16z.com'
+PAYOUT_MEMO = 'Investing contest winnings payment 🥳'
+PAYOUT_AMOUNT = float(os.getenv('PAYOUT_AMOUNT', 50.0))
+
+
+def payout_key(contest_id: int, winner_id: int) -> str:
+    """Idempotency key of the payout for a contest winner."""
+    return f"contest-{contest_id}-winner-{winner_id}"
+
+
+@functools.lru_cache(maxsize=None)
+def get_payman():
+    """Return the process-wide Payman client, importing the SDK on first use."""
+    from paymanai import Paymanai
+
+    return Paymanai(
+        x_payman_api_secret=os.getenv('PAYMAN_API_KEY'),
+        environment='sandbox'
+    )
+
+
+class PaymentError(Exception):
+    """A payment call failed; `retryable` says whether trying again may succeed."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class PaymentGateway:
+    """Creates payees and sends payments for payout jobs.
+
+    Raise PaymentError(retryable=False) for failures that will not go away
+    (bad request, rejected payee); any other exception is retried.
+
+    `idempotent` says the provider dedupes payments by the payout's
+    idempotency key, so one whose outcome was lost can be sent again.
+    """
+
+    idempotent = False
+
+    def create_payee(self, payout: Payout) -> str:
+        raise NotImplementedError
+
+    def send_payment(self, payout: Payout, payee_id: str) -> str:
+        """Send the payout and return the provider's payment reference."""
+        raise NotImplementedError
+
+
+class PaymanGateway(PaymentGateway):
+    """Pays through the Payman SDK.
+
+    The idempotency key goes along as an Idempotency-Key header, but
+    Payman is not known to honour it, so the gateway is not idempotent.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or get_payman()
+
+    def create_payee(self, payout: Payout) -> str:
+        payee = self.client.payments.create_payee(
+            type='PAYMAN_AGENT',
+            payman_agent=PAYMAN_AGENT,
+            name=PAYEE_NAME,
+            contact_details={'email': PAYEE_EMAIL},
+            extra_headers={'Idempotency-Key': f"{payout.idempotency_key}-payee"}
+        )
+        return payee.id
+
+    def send_payment(self, payout: Payout, payee_id: str) -> str:
+        payment = self.client.payments.send_payment(
+            amount_decimal=dollars(payout.amount),
+            payment_destination_id=payee_id,
+            memo=PAYOUT_MEMO,
+            extra_headers={'Idempotency-Key': payout.idempotency_key}
+        )
+        return payment.reference
+
+
+class HTTPPaymentGateway(PaymentGateway):
+    """Pays through a JSON API: POST {url}/payees -> {"id"}, POST {url}/payments -> {"reference"}.
+
+    Both requests carry the payout's idempotency key in an Idempotency-Key
+    header, so a retry after a lost response cannot pay twice. 429 and 5xx
+    responses and connection errors are retryable; other 4xx are not.
+    """
+
+    idempotent = True
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path: str, body: Dict[str, Any], idempotency_key: str) -> Dict[str, Any]:
+        request = urllib.request.Request(
+            f"{self.url}{path}",
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json", "Idempotency-Key": idempotency_key},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            retryable = e.code == 429 or e.code >= 500
+            raise PaymentError(f"{path} returned HTTP {e.code}", retryable=retryable) from e
+        except (urllib.error.URLError, TimeoutError) as e:
+            raise PaymentError(f"{path} failed: {e}") from e
+
+    def create_payee(self, payout: Payout) -> str:
+        body = {"type": "PAYMAN_AGENT", "payman_agent": PAYMAN_AGENT, "name": PAYEE_NAME, "email": PAYEE_EMAIL}
+        return self._post("/payees", body, f"{payout.idempotency_key}-payee")["id"]
+
+    def send_payment(self, payout: Payout, payee_id: str) -> str:
+        body = {"amount": dollars(payout.amount), "payee_id": payee_id, "memo": PAYOUT_MEMO}
+        return self._post("/payments", body, payout.idempotency_key)["reference"]
+
+
+def gateway_from_env() -> PaymentGateway:
+    """PAYMENTS_URL selects HTTPPaymentGateway; otherwise Payman."""
+    if os.getenv('PAYMENTS_URL'):
+        return HTTPPaymentGateway(os.getenv('PAYMENTS_URL'))
+    return PaymanGateway()
+
+
+class PayoutWorker:
+    """Sends queued payouts in the background, with retries and backoff.
+
+    Jobs are claimed (PENDING -> PROCESSING) in one write transaction, so a
+    job is only ever worked on by one worker; payment I/O happens outside
+    any transaction. Failures are retried after full-jitter exponential
+    backoff until `max_attempts`, then marked FAILED. A job left PROCESSING
+    for longer than `lease_seconds` (the worker died mid-payment) is
+    claimed again, which is safe with an idempotent gateway. With any other
+    gateway the job is marked as sending just before the payment goes out;
+    if its lease expires in that state, or the send itself raises, the
+    payment may have been made, so it is marked FAILED for someone to check
+    instead of being resent. Only failures before the send (such as
+    creating the payee) are retried.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], gateway: Optional[PaymentGateway] = None,
+                 max_attempts: int = 5, backoff_base: float = 2.0, backoff_max: float = 300.0,
+                 lease_seconds: float = 300.0, poll_interval: float = 5.0, batch_size: int = 10):
+        self.session_factory = session_factory
+        self._gateway = gateway
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def gateway(self) -> PaymentGateway:
+        # Built on the first job so starting the worker does not import the SDK
+        if self._gateway is None:
+            self._gateway = gateway_from_env()
+        return self._gateway
+
+    def _begin(self, session: Session):
+        """Start a write transaction (BEGIN IMMEDIATE on SQLite), as ContestManager does."""
+        if session.in_transaction():
+            session.commit()
+        session.connection(execution_options={"sqlite_immediate": True})
+
+    def _claim(self, session: Session, now: datetime) -> List[int]:
+        self._begin(session)
+        stale = (Payout.status == PayoutStatus.PROCESSING,
+                 Payout.claimed_at < now - timedelta(seconds=self.lease_seconds))
+        unknown = session.execute(
+            update(Payout)
+            .where(*stale, Payout.sending_at.is_not(None))
+            .values(status=PayoutStatus.FAILED, claimed_at=None, sending_at=None,
+                    last_error="Worker stopped while sending; check with the provider before sending again")
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if unknown:
+            logger.error("payouts with unknown outcome marked failed", extra={"payouts": unknown})
+        session.execute(
+            update(Payout)
+            .where(*stale)
+            .values(status=PayoutStatus.PENDING, claimed_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        ids = list(session.scalars(
+            select(Payout.id)
+            .where(Payout.status == PayoutStatus.PENDING, Payout.next_attempt_at <= now)
+            .order_by(Payout.next_attempt_at)
+            .limit(self.batch_size)
+        ))
+        if ids:
+            session.execute(
+                update(Payout)
+                .where(Payout.id.in_(ids))
+                .values(status=PayoutStatus.PROCESSING, claimed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        session.commit()
+        return ids
+
+    def _process(self, session: Session, payout_id: int):
+        # Detached so no transaction is held (or started) during payment I/O
+        job = session.get(Payout, payout_id, populate_existing=True)
+        session.expunge(job)
+        session.commit()
+        payee_id, reference, error = job.payee_id, None, None
+        sending = False
+        try:
+            with METRICS.timer("PayoutWorker.send"):
+                if payee_id is None:
+                    payee_id = self.gateway.create_payee(job)
+                if not self.gateway.idempotent:
+                    self._mark_sending(session, payout_id, payee_id)
+                sending = True
+                reference = self.gateway.send_payment(job, payee_id)
+        except Exception as e:
+            error = e
+
+        self._begin(session)
+        payout = session.get(Payout, payout_id, populate_existing=True)
+        payout.payee_id = payee_id
+        payout.attempts += 1
+        payout.claimed_at = None
+        payout.sending_at = None
+        if error is None:
+            payout.status = PayoutStatus.SUCCEEDED
+            payout.reference = reference
+            payout.last_error = None
+            logger.info("payout sent", extra={"payout_id": payout.id, "reference": reference})
+        elif sending and not self.gateway.idempotent:
+            # The provider may have taken the payment before failing, and would not dedupe a resend
+            payout.status = PayoutStatus.FAILED
+            payout.last_error = f"Outcome unknown, check with the provider before sending again: {error}"
+            logger.error("payout outcome unknown", extra={"payout_id": payout.id, "error": str(error)})
+        elif getattr(error, "retryable", True) and payout.attempts < self.max_attempts:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (payout.attempts - 1)))
+            payout.status = PayoutStatus.PENDING
+            payout.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            payout.last_error = str(error)
+            logger.warning("payout failed, will retry", extra={
+                "payout_id": payout.id, "attempts": payout.attempts, "retry_in_s": delay, "error": str(error),
+            })
+        else:
+            payout.status = PayoutStatus.FAILED
+            payout.last_error = str(error)
+            logger.error("payout failed", extra={
+                "payout_id": payout.id, "attempts": payout.attempts, "error": str(error),
+            })
+        session.commit()
+
+    def _mark_sending(self, session: Session, payout_id: int, payee_id: str):
+        self._begin(session)
+        session.execute(
+            update(Payout)
+            .where(Payout.id == payout_id)
+            .values(payee_id=payee_id, sending_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+    def run_once(self) -> int:
+        """Process every due job once; returns how many were attempted."""
+        session = self.session_factory()
+        try:
+            ids = self._claim(session, datetime.utcnow())
+            for payout_id in ids:
+                self._process(session, payout_id)
+            return len(ids)
+        finally:
+            session.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("payout worker iteration failed")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Run the worker on a daemon thread until stop()."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="payout-worker", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Check for jobs now instead of at the next poll."""
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class QuoteSource:
+    """Returns the latest price for each requested ticker in one call."""
+
+    def get_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        raise NotImplementedError
+
+
+class FileQuoteSource(QuoteSource):
+    """Reads quotes from a JSON file of {"TICKER": price}; re-read whenever it changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._quotes: Dict[str, float] = {}
+
+    def get_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        mtime = os.path.getmtime(self.path)
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._quotes = {ticker.upper(): float(price) for ticker, price in json.load(f).items()}
+            self._mtime = mtime
+        return {ticker: self._quotes[ticker] for ticker in tickers if ticker in self._quotes}
+
+
+class HTTPQuoteSource(QuoteSource):
+    """Fetches quotes with one GET {url}?symbols=A,B,C returning {"A": price, ...}."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def get_quotes(self, tickers: List[str]) -> Dict[str, float]:
+        if not tickers:
+            return {}
+        query = urllib.parse.urlencode({"symbols": ",".join(tickers)})
+        separator = "&" if "?" in self.url else "?"
+        with urllib.request.urlopen(f"{self.url}{separator}{query}", timeout=self.timeout) as response:
+            quotes = json.load(response)
+        return {ticker.upper(): float(price) for ticker, price in quotes.items() if price is not None}
+
+
+class PriceService:
+    """Keeps positions.current_price fresh for every active contest.
+
+    Tickers are deduplicated across contests and fetched from the quote
+    source in one batched call; quotes are cached in memory for
+    `ttl_seconds`. Writing the prices (one UPDATE per ticker) and revaluing
+    standings is left to ContestManager.update_prices, so page renders never
+    do network I/O themselves.
+    """
+
+    def __init__(self, source: QuoteSource, ttl_seconds: float = 60.0):
+        self.source = source
+        self.ttl_seconds = ttl_seconds
+        self._cache: Dict[str, tuple] = {}  # ticker -> (fetched_at, price)
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def get_prices(self, tickers: Iterable[str]) -> Dict[str, float]:
+        """Return prices for tickers, fetching only those missing or stale in the cache."""
+        tickers = sorted({ticker.upper() for ticker in tickers})
+        now = time.monotonic()
+        with self._lock:
+            prices = {}
+            stale = []
+            for ticker in tickers:
+                entry = self._cache.get(ticker)
+                if entry and now - entry[0] <= self.ttl_seconds:
+                    prices[ticker] = entry[1]
+                else:
+                    stale.append(ticker)
+
+            if stale:
+                self.fetches += 1
+                for ticker, price in self.source.get_quotes(stale).items():
+                    self._cache[ticker] = (now, price)
+                    prices[ticker] = price
+        return prices
+
+    def refresh(self, contest_manager) -> Dict[str, Any]:
+        """Fetch prices for every ticker held in an active contest and store them."""
+        tickers = contest_manager.get_active_tickers()
+        prices = self.get_prices(tickers)
+        updated = contest_manager.update_prices(prices)
+        return {
+            "tickers": len(tickers),
+            "priced": len(prices),
+            "missing": sorted(set(tickers) - set(prices)),
+            "positions_updated": updated,
+        }
+
+
+def quote_source_from_env() -> Optional[QuoteSource]:
+    """QUOTES_URL selects HTTPQuoteSource, QUOTES_FILE selects FileQuoteSource."""
+    if os.getenv('QUOTES_URL'):
+        return HTTPQuoteSource(os.getenv('QUOTES_URL'))
+    if os.getenv('QUOTES_FILE'):
+        return FileQuoteSource(os.getenv('QUOTES_FILE'))
+    return None
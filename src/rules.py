@@ -0,0 +1,121 @@
+import functools
+import operator
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+from money import to_cents
+
+OPERATORS = {">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt}
+
+# metric -> value of a ContestStanding row; profit and value are in cents
+METRICS = {
+    "profit": lambda s: s.total_profit,
+    "return": lambda s: s.total_profit / s.starting_balance * 100 if s.starting_balance else 0.0,
+    "value": lambda s: s.cash_balance + s.market_value,
+}
+
+_DATE = r"(?P<date>\d{4}-\d{2}-\d{2})"
+_THRESHOLD = re.compile(
+    r"^(?P<metric>profit|return|value)\s*(?P<op>>=|<=|>|<)\s*\$?(?P<value>-?[\d,]*\.?\d+)\s*(?P<percent>%)?"
+    r"(?:\s+by\s+" + _DATE + r")?$"
+)
+_TOP = re.compile(r"^top\s+(?P<n>\d+)\s+at\s+" + _DATE + r"$")
+
+
+class RuleError(ValueError):
+    """A win condition that is not in the rule language."""
+
+
+def _end_of_day(text: str) -> datetime:
+    try:
+        return datetime.strptime(text, "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        raise RuleError(f"Invalid date {text!r}, expected YYYY-MM-DD") from None
+
+
+class Rule:
+    """A compiled win condition.
+
+    ends_at is when the contest ends regardless of trades (None: it runs
+    until the condition is met).
+    """
+
+    ends_at: Optional[datetime] = None
+
+    def met_by(self, standing, at: datetime) -> bool:
+        """Whether a player's standing at time `at` wins the contest."""
+        return False
+
+
+class Threshold(Rule):
+    """metric op value [by date]: the first player to satisfy it wins.
+
+    value is in the metric's unit: cents for profit and value, percent for return.
+    """
+
+    def __init__(self, metric: str, op: str, value: float, ends_at: Optional[datetime] = None):
+        self.metric = metric
+        self.op = op
+        self.value = value
+        self.ends_at = ends_at
+        self._measure = METRICS[metric]
+        self._compare = OPERATORS[op]
+
+    @property
+    def best_first(self) -> bool:
+        """True if a higher total profit is closer to winning (all metrics rise with profit)."""
+        return self.op in (">=", ">")
+
+    def met_by(self, standing, at: datetime) -> bool:
+        if self.ends_at is not None and at >= self.ends_at:
+            return False
+        return self._compare(self._measure(standing), self.value)
+
+
+class TopAtEnd(Rule):
+    """top N at date: when the contest ends, the top N standings win."""
+
+    def __init__(self, top: int, ends_at: datetime):
+        self.top = top
+        self.ends_at = ends_at
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_rule(text: str) -> Rule:
+    """Parse a win condition; raises RuleError if it is not a valid rule.
+
+    A win condition is one rule, case-insensitive:
+
+        profit >= 1000                  a player's profit reaches $1,000
+        return >= 10% by 2025-06-30     a player's return reaches 10% on or before June 30
+        value > 25,000                  a player's cash plus holdings passes $25,000
+        top 3 at 2025-12-31             the contest ends after Dec 31; the top 3 standings win
+
+    Thresholds take >=, >, <= or <. Dates end the contest at the end of that day (UTC).
+    """
+    normalized = " ".join(text.strip().lower().split())
+    match = _THRESHOLD.match(normalized)
+    if match:
+        if match["percent"] and match["metric"] != "return":
+            raise RuleError(f"Only return can be a percentage: {text!r}")
+        value = match["value"].replace(",", "")
+        value = float(value) if match["metric"] == "return" else to_cents(value)
+        ends_at = _end_of_day(match["date"]) if match["date"] else None
+        return Threshold(match["metric"], match["op"], value, ends_at)
+    match = _TOP.match(normalized)
+    if match:
+        if int(match["n"]) < 1:
+            raise RuleError(f"top needs at least 1 winner: {text!r}")
+        return TopAtEnd(int(match["n"]), _end_of_day(match["date"]))
+    raise RuleError(
+        f"Unrecognized win condition {text!r}; use e.g. 'profit >= 1000', "
+        "'return >= 10% by 2025-06-30' or 'top 3 at 2025-12-31'"
+    )
+
+
+def rule_for(text: str) -> Optional[Rule]:
+    """The compiled rule, or None for free-text conditions (contests created before rules)."""
+    try:
+        return compile_rule(text)
+    except RuleError:
+        return None
@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from cache import ReadCache
+from contest import ContestManager
+from database import JobRun
+from feed import ChangeFeed
+from metrics import METRICS
+from prices import PriceService, quote_source_from_env
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A function of a ContestManager run every `interval` seconds.
+
+    Each run is scheduled up to `jitter` (a fraction of the interval) early
+    or late, so jobs do not fire in lockstep. A run holds the job for at
+    most `lease` seconds; after that another process may start it again.
+    """
+
+    def __init__(self, name: str, fn: Callable[[ContestManager], Any], interval: float,
+                 jitter: float = 0.1, lease: Optional[float] = None):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = jitter
+        self.lease = lease if lease is not None else max(interval, 300.0)
+
+    def next_run(self, now: datetime, first: bool = False) -> datetime:
+        if first:
+            # Spread out jobs registered at the same moment
+            return now + timedelta(seconds=random.uniform(0, self.jitter * self.interval))
+        spread = random.uniform(-self.jitter, self.jitter) * self.interval
+        return now + timedelta(seconds=self.interval + spread)
+
+
+class Scheduler:
+    """Runs registered jobs on a background thread; schedule and outcomes live in job_runs.
+
+    A job is claimed with a conditional UPDATE of its job_runs row (due, and
+    not leased by a run in progress), so the same job never runs twice at
+    once, whether in this process or in another scheduler on the same
+    database. A failing job is logged and retried at its next interval.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], jobs=(), cache: Optional[ReadCache] = None,
+                 max_sleep: float = 30.0, feed: Optional[ChangeFeed] = None):
+        self.session_factory = session_factory
+        self.cache = cache
+        self.feed = feed
+        self.max_sleep = max_sleep
+        self.jobs: Dict[str, Job] = {}
+        for job in jobs:
+            self.add(job)
+        self._running = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, job: Job) -> Job:
+        if job.name in self.jobs:
+            raise ValueError(f"Job {job.name!r} is already registered")
+        self.jobs[job.name] = job
+        return job
+
+    def register(self, name: str, interval: float, jitter: float = 0.1, lease: Optional[float] = None):
+        """Decorator form of add(): @scheduler.register("name", interval=60)."""
+        def decorator(fn):
+            self.add(Job(name, fn, interval, jitter, lease))
+            return fn
+        return decorator
+
+    def _begin(self, session: Session):
+        if session.in_transaction():
+            session.commit()
+        session.connection(execution_options={"sqlite_immediate": True})
+
+    def _ensure_rows(self, session: Session, now: datetime):
+        if not self.jobs:
+            return
+        self._begin(session)
+        session.execute(
+            insert(JobRun).on_conflict_do_nothing(index_elements=["name"]),
+            [{"name": job.name, "next_run_at": job.next_run(now, first=True)} for job in self.jobs.values()]
+        )
+        session.commit()
+
+    def _claim(self, session: Session, job: Job, now: datetime) -> bool:
+        self._begin(session)
+        claimed = session.execute(
+            update(JobRun)
+            .where(JobRun.name == job.name, JobRun.next_run_at <= now,
+                   or_(JobRun.running_until.is_(None), JobRun.running_until < now))
+            .values(running_until=now + timedelta(seconds=job.lease), last_started_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        session.commit()
+        return claimed
+
+    def _finish(self, session: Session, job: Job, now: datetime, result: Any, error: Optional[Exception]):
+        self._begin(session)
+        session.execute(
+            update(JobRun)
+            .where(JobRun.name == job.name)
+            .values(
+                running_until=None,
+                runs=JobRun.runs + 1,
+                next_run_at=job.next_run(now),
+                last_finished_at=datetime.utcnow(),
+                last_status="error" if error else "ok",
+                last_result=None if error else json.dumps(result, default=str),
+                last_error=str(error) if error else None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+    def _run_job(self, session: Session, job: Job, now: datetime):
+        result, error = None, None
+        try:
+            with METRICS.timer(f"job.{job.name}"):
+                result = job.fn(ContestManager(session, cache=self.cache, feed=self.feed))
+        except Exception as e:
+            error = e
+            session.rollback()
+            logger.exception("job failed", extra={"job": job.name})
+        else:
+            logger.info("job finished", extra={"job": job.name, "result": result})
+        self._finish(session, job, now, result, error)
+        return result
+
+    def run_pending(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Run every due job once; returns {job name: result} for the jobs that ran."""
+        if not self._running.acquire(blocking=False):
+            return {}  # another thread of this process is already running jobs
+        session = self.session_factory()
+        try:
+            now = now or datetime.utcnow()
+            self._ensure_rows(session, now)
+            results = {}
+            for job in self.jobs.values():
+                if self._claim(session, job, now):
+                    results[job.name] = self._run_job(session, job, now)
+            return results
+        finally:
+            session.close()
+            self._running.release()
+
+    def trigger(self, name: str):
+        """Make a job due now and wake the scheduler thread."""
+        session = self.session_factory()
+        try:
+            self._ensure_rows(session, datetime.utcnow())
+            self._begin(session)
+            session.execute(
+                update(JobRun).where(JobRun.name == name).values(next_run_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+        finally:
+            session.close()
+        self.wake()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Schedule and last outcome of each registered job."""
+        session = self.session_factory()
+        try:
+            rows = {row.name: row for row in session.scalars(select(JobRun).where(JobRun.name.in_(self.jobs)))}
+            now = datetime.utcnow()
+            status = []
+            for name, job in self.jobs.items():
+                row = rows.get(name) or JobRun(name=name, runs=0)
+                status.append({
+                    "name": name,
+                    "interval_s": job.interval,
+                    "runs": row.runs,
+                    "running": row.running_until is not None and row.running_until > now,
+                    "next_run_at": row.next_run_at,
+                    "last_finished_at": row.last_finished_at,
+                    "last_status": row.last_status,
+                    "last_error": row.last_error,
+                })
+            return status
+        finally:
+            session.close()
+
+    def _seconds_until_due(self) -> float:
+        session = self.session_factory()
+        try:
+            next_run = session.scalar(
+                select(JobRun.next_run_at).where(JobRun.name.in_(self.jobs)).order_by(JobRun.next_run_at).limit(1)
+            )
+        finally:
+            session.close()
+        if next_run is None:
+            return self.max_sleep
+        return min(self.max_sleep, max(0.0, (next_run - datetime.utcnow()).total_seconds()))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+                delay = self._seconds_until_due()
+            except Exception:
+                logger.exception("scheduler iteration failed")
+                delay = self.max_sleep
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def start(self):
+        """Run due jobs on a daemon thread until stop()."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def default_jobs() -> List[Job]:
+    """Contest expiry, ledger snapshots and, when a quote source is configured, price refreshes.
+
+    Intervals (seconds) come from EXPIRE_CONTESTS_SECONDS (60),
+    SNAPSHOT_LEDGERS_SECONDS (3600) and REFRESH_PRICES_SECONDS (300).
+    """
+    jobs = [
+        Job("expire_contests", lambda manager: manager.expire_contests(),
+            float(os.getenv('EXPIRE_CONTESTS_SECONDS', 60))),
+        Job("snapshot_ledgers", lambda manager: manager.snapshot_active_ledgers(),
+            float(os.getenv('SNAPSHOT_LEDGERS_SECONDS', 3600))),
+    ]
+    source = quote_source_from_env()
+    if source is not None:
+        interval = float(os.getenv('REFRESH_PRICES_SECONDS', 300))
+        jobs.append(Job("refresh_prices", PriceService(source, ttl_seconds=interval / 2).refresh, interval))
+    return jobs
+
@@ -0,0 +1,104 @@
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+# Normalized columns every import row is converted to
+TRADE_COLUMNS = ["date", "ticker", "trade_type", "quantity", "price"]
+
+# Robinhood "Account activity" CSV export
+ROBINHOOD_COLUMNS = {
+    "Activity Date": "date",
+    "Instrument": "ticker",
+    "Trans Code": "trade_type",
+    "Quantity": "quantity",
+    "Price": "price",
+}
+
+# Other spellings accepted in a plain trades CSV
+COLUMN_ALIASES = {
+    "symbol": "ticker",
+    "type": "trade_type",
+    "side": "trade_type",
+    "action": "trade_type",
+    "trade_date": "date",
+    "shares": "quantity",
+    "qty": "quantity",
+}
+
+
+def _to_number(column: pd.Series) -> pd.Series:
+    """Parse numbers that may be formatted like "$1,234.50" or "(12.00)"."""
+    if not pd.api.types.is_numeric_dtype(column):
+        column = (
+            column.astype(str)
+            .str.replace(r"[$,\s]", "", regex=True)
+            .str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+        )
+    return pd.to_numeric(column, errors="coerce")
+
+
+def read_trades_csv(source) -> pd.DataFrame:
+    """Read a trades CSV (Robinhood activity export or plain columns) into normalized rows.
+
+    Robinhood activity rows that are not buys or sells (dividends, transfers,
+    fees) are dropped. The original CSV row number is kept in a "row" column.
+    """
+    frame = pd.read_csv(source, dtype=str, skip_blank_lines=True, on_bad_lines="skip")
+    frame["row"] = frame.index + 2  # header is line 1
+
+    if set(ROBINHOOD_COLUMNS).issubset(frame.columns):
+        frame = frame.rename(columns=ROBINHOOD_COLUMNS)
+        frame = frame[frame["trade_type"].str.strip().str.upper().isin(["BUY", "SELL"])]
+    else:
+        frame.columns = [str(c).strip().lower().replace(" ", "_") for c in frame.columns]
+        frame = frame.rename(columns=COLUMN_ALIASES)
+
+    missing = [c for c in TRADE_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+
+    return frame[TRADE_COLUMNS + ["row"]].reset_index(drop=True)
+
+
+def prepare_trades(rows: Union[pd.DataFrame, Iterable[Dict[str, Any]]],
+                   default_date=None) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """Validate trade rows column-wise and sort the valid ones by trade date.
+
+    Returns (valid rows, rejections). Each rejection is {"row", "error"} where
+    "row" is the "row" column if present, otherwise the input position.
+    Rows without a date get default_date.
+    """
+    frame = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    frame = frame.reset_index(drop=True)
+    for column in TRADE_COLUMNS:
+        if column not in frame.columns:
+            frame[column] = None
+    if "row" not in frame.columns:
+        frame["row"] = frame.index
+
+    frame["ticker"] = frame["ticker"].fillna("").astype(str).str.strip().str.upper()
+    frame["trade_type"] = frame["trade_type"].fillna("").astype(str).str.strip().str.upper()
+    frame["quantity"] = _to_number(frame["quantity"]).abs()
+    frame["price"] = _to_number(frame["price"])
+    missing_date = frame["date"].isna() | (frame["date"].astype(str).str.strip() == "")
+    frame["date"] = pd.to_datetime(frame["date"].where(~missing_date), errors="coerce", format="mixed")
+    if default_date is not None:
+        frame.loc[missing_date, "date"] = pd.Timestamp(default_date)
+
+    checks = [
+        (frame["ticker"] == "", "Missing ticker"),
+        (~frame["trade_type"].isin(["BUY", "SELL"]), "Trade type must be BUY or SELL"),
+        (~(frame["quantity"] > 0), "Quantity must be a positive number"),
+        (~(frame["price"] > 0), "Price must be a positive number"),
+        (frame["date"].isna(), "Missing or invalid date"),
+    ]
+    error = pd.Series(None, index=frame.index, dtype=object)
+    for failed, message in reversed(checks):  # first failing check wins
+        error = error.mask(failed, message)
+
+    rejected = frame[error.notna()]
+    rejections = [
+        {"row": row, "error": message}
+        for row, message in zip(rejected["row"].tolist(), error[error.notna()].tolist())
+    ]
+    valid = frame[error.isna()].sort_values("date", kind="stable").reset_index(drop=True)
+    return valid, rejections
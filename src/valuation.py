@@ -0,0 +1,94 @@
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import Player, Position
+from money import MONEY_SCALE, QUANTITY_SCALE
+
+
+class ContestPositions:
+    """A contest's players and positions as columnar NumPy arrays.
+
+    Per player: player_ids, cash_balance, starting_balance.
+    Per position: player_index and ticker_index (into player_ids / tickers),
+    quantity, average_price, current_price. Amounts are int64 cents and
+    quantities int64 micro-shares, as stored.
+    """
+
+    def __init__(self, player_ids, cash_balance, starting_balance,
+                 position_player_ids, position_tickers, quantity, average_price, current_price):
+        order = np.argsort(player_ids)
+        self.player_ids = np.asarray(player_ids, dtype=np.int64)[order]
+        self.cash_balance = np.asarray(cash_balance, dtype=np.int64)[order]
+        self.starting_balance = np.asarray(starting_balance, dtype=np.int64)[order]
+        self.player_index = np.searchsorted(self.player_ids, np.asarray(position_player_ids, dtype=np.int64))
+        self.ticker_index, self.tickers = pd.factorize(pd.Series(position_tickers, dtype=object))
+        self.quantity = np.asarray(quantity, dtype=np.int64)
+        self.average_price = np.asarray(average_price, dtype=np.int64)
+        self.current_price = np.asarray(current_price, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def price_vector(self, prices: Dict[str, int]) -> np.ndarray:
+        """Price in cents per ticker from `prices`, -1 where a ticker has no quote."""
+        return np.array([prices.get(ticker, -1) for ticker in self.tickers], dtype=np.int64)
+
+
+def load_contest_positions(db: Session, contest_id: int) -> ContestPositions:
+    """Load a contest's players and positions in two queries."""
+    players = db.execute(
+        select(Player.id, Player.cash_balance, Player.starting_balance)
+        .where(Player.contest_id == contest_id)
+    ).all()
+    positions = db.execute(
+        select(Position.player_id, Position.ticker, Position.quantity,
+               Position.average_price, Position.current_price)
+        .join(Player, Player.id == Position.player_id)
+        .where(Player.contest_id == contest_id)
+    ).all()
+    player_columns = list(zip(*players)) or [(), (), ()]
+    position_columns = list(zip(*positions)) or [(), (), (), (), ()]
+    return ContestPositions(*player_columns, *position_columns)
+
+
+def _per_player(positions: ContestPositions, quantity: np.ndarray, price: np.ndarray) -> np.ndarray:
+    # money.value() per position, summed per player; float64 sums of whole
+    # cents are exact below 2**53 cents, so the result converts back exactly
+    cents = (quantity * price + QUANTITY_SCALE // 2) // QUANTITY_SCALE
+    return np.bincount(positions.player_index, weights=cents,
+                       minlength=len(positions.player_ids)).astype(np.int64)
+
+
+def value_portfolios(positions: ContestPositions, prices: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """Value every player's portfolio with vectorized group-by sums in integer cents.
+
+    Positions are marked at `prices` (cents) where a ticker has a quote,
+    otherwise at their stored current price. Returns one row per player,
+    ranked by total profit, with cash_balance, market_value, unrealized_pl,
+    portfolio_value and total_profit in dollars, and return_pct.
+    """
+    mark = positions.current_price
+    if prices:
+        quoted = positions.price_vector(prices)[positions.ticker_index]
+        mark = np.where(quoted < 0, mark, quoted)
+
+    players = len(positions.player_ids)
+    market_value = _per_player(positions, positions.quantity, mark)
+    cost_basis = _per_player(positions, positions.quantity, positions.average_price)
+    portfolio_value = positions.cash_balance + market_value
+    total_profit = portfolio_value - positions.starting_balance
+
+    frame = pd.DataFrame({
+        "player_id": positions.player_ids,
+        "cash_balance": positions.cash_balance / MONEY_SCALE,
+        "market_value": market_value / MONEY_SCALE,
+        "unrealized_pl": (market_value - cost_basis) / MONEY_SCALE,
+        "portfolio_value": portfolio_value / MONEY_SCALE,
+        "total_profit": total_profit / MONEY_SCALE,
+        "return_pct": np.divide(total_profit, positions.starting_balance,
+                                out=np.zeros(players), where=positions.starting_balance != 0) * 100,
+    })
+    return frame.sort_values(["total_profit", "player_id"], ascending=[False, True], kind="stable",
+                             ignore_index=True)
@@ -0,0 +1,36 @@
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw
+
+# The app modules import each other as top-level modules (`from database import ...`).
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from database import init_db  # noqa: E402
+from contest import ContestManager  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    session = init_db(str(tmp_path / "test.db"))
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def manager(db):
+    return ContestManager(db)
+
+
+def make_screenshot(text="Market Buy AAPL", size=(1179, 2556), fmt="PNG"):
+    """Render a phone-sized screenshot-like image and return its encoded bytes."""
+    image = Image.new("RGBA", size, (255, 255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, size[0], size[1] // 20), fill=(20, 20, 20, 255))  # status bar
+    for i, line in enumerate([text, "Shares 3", "Average price $190.50", "Filled Jan 2, 2024"]):
+        draw.text((60, size[1] // 5 + i * 120), line, fill=(0, 0, 0, 255))
+    buffer = io.BytesIO()
+    image.convert("RGB" if fmt == "JPEG" else "RGBA").save(buffer, format=fmt)
+    return buffer.getvalue()
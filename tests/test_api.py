@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+from api import create_app
+from cache import ReadCache
+from contest import ContestManager
+from test_contest import count_queries
+
+
+@pytest.fixture
+def contest(db):
+    cache = ReadCache()
+    manager = ContestManager(db, cache=cache)
+    contest = manager.create_contest("API", "profit >= 100000", starting_balance=10000.0)
+    alice = manager.join_contest(contest.join_code, "alice")
+    bob = manager.join_contest(contest.join_code, "bob")
+    for day in range(1, 6):
+        manager.process_trade(alice.id, "AAPL", "BUY", 1, 100.0 + day, datetime(2024, 1, day))
+    manager.process_trade(bob.id, "MSFT", "BUY", 2, 300.0, datetime(2024, 1, 3))
+    client = TestClient(create_app(sessionmaker(bind=db.get_bind(), expire_on_commit=False), cache))
+    return client, manager, contest.id, alice.id, bob.id
+
+
+def test_contests_and_standings(contest):
+    client, _, contest_id, alice_id, _ = contest
+
+    contests = client.get("/api/contests").json()["contests"]
+    assert [(c["id"], c["status"], c["starting_balance"]) for c in contests] == [(contest_id, "active", 10000.0)]
+    assert "join_code" not in contests[0]
+    assert client.get(f"/api/contests/{contest_id}").json()["name"] == "API"
+    assert client.get(f"/api/contests/{contest_id + 1}").status_code == 404
+
+    standings = client.get(f"/api/contests/{contest_id}/standings").json()["standings"]
+    assert [row["name"] for row in standings] == ["alice", "bob"]
+    assert standings[0]["player_id"] == alice_id and standings[0]["cash_balance"] == 10000.0 - 515.0
+    assert len(client.get(f"/api/contests/{contest_id}/standings?limit=1").json()["standings"]) == 1
+    assert client.get(f"/api/contests/{contest_id}/standings?limit=0").status_code == 400
+
+
+def test_trades_are_paginated(contest):
+    client, _, contest_id, alice_id, _ = contest
+
+    first = client.get(f"/api/contests/{contest_id}/trades?limit=4").json()
+    assert [t["date"][:10] for t in first["trades"]] == ["2024-01-05", "2024-01-04", "2024-01-03", "2024-01-03"]
+    rest = client.get(f"/api/contests/{contest_id}/trades", params={"limit": 4, "before": first["next_cursor"]})
+    assert [t["price"] for t in rest.json()["trades"]] == [102.0, 101.0]
+    assert rest.json()["next_cursor"] is None
+
+    only_bob = client.get(f"/api/contests/{contest_id}/trades?ticker=msft&type=buy").json()["trades"]
+    assert [(t["player"], t["quantity"], t["total"]) for t in only_bob] == [("bob", 2.0, 600.0)]
+    assert len(client.get(f"/api/contests/{contest_id}/trades?player_id={alice_id}").json()["trades"]) == 5
+    assert client.get(f"/api/contests/{contest_id}/trades?before=yesterday").status_code == 400
+
+
+def test_unchanged_contests_are_not_modified_until_a_trade(contest, db):
+    client, manager, contest_id, alice_id, _ = contest
+    url = f"/api/contests/{contest_id}/standings"
+
+    response = client.get(url)
+    etag = response.headers["etag"]
+    statements, stop = count_queries(db)
+    try:
+        again = client.get(url, headers={"If-None-Match": etag})
+    finally:
+        stop()
+    assert again.status_code == 304 and again.headers["etag"] == etag and not again.content
+    assert statements == []
+
+    manager.process_trade(alice_id, "AAPL", "SELL", 1, 200.0, datetime(2024, 1, 6))
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    # A trade does not change the contest list
+    contests = client.get("/api/contests")
+    assert client.get("/api/contests", headers={"If-None-Match": contests.headers["etag"]}).status_code == 304
+
+    # Tags from another process (e.g. before a restart) never match
+    other = TestClient(create_app(lambda: db, ReadCache()))
+    assert other.get(url, headers={"If-None-Match": changed.headers["etag"]}).status_code == 200
+
+
+def test_responses_are_gzipped(contest):
+    client, manager, contest_id, alice_id, _ = contest
+    for day in range(7, 28):
+        manager.process_trade(alice_id, "NVDA", "BUY", 1, 10.0, datetime(2024, 1, day))
+
+    response = client.get(f"/api/contests/{contest_id}/trades?limit=100", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["trades"]) == 27
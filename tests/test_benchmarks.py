@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from run import compare_results, run_scale  # noqa: E402
+from synthetic import generate_contest  # noqa: E402
+
+
+def test_synthetic_contest_is_consistent(manager):
+    contest = generate_contest(manager, players=5, tickers=3, trades=200, seed=1)
+
+    assert len(contest["player_ids"]) == 5
+    assert manager.rebuild_standings(contest["contest_id"]) == 0
+    page = manager.get_contest_trades(contest["contest_id"], limit=None)
+    assert len(page["trades"]) == 200
+    assert page["trades"][0]["date"] == contest["last_trade_date"]
+
+
+def test_run_scale_and_compare_flag_regressions():
+    result = run_scale("tiny", players=3, tickers=2, trades=20, repeat=2)
+    assert set(result["operations"]) >= {"process_trade", "get_leaderboard", "get_contest_trades",
+                                         "join_contest", "create_contest"}
+
+    before = {"scales": {"tiny": result}}
+    slower = {"scales": {"tiny": {"operations": {
+        name: dict(stats, median_ms=stats["median_ms"] * 2 + 1) for name, stats in result["operations"].items()
+    }}}}
+    assert not any(row["regression"] for row in compare_results(before, before))
+    assert all(row["regression"] for row in compare_results(before, slower))
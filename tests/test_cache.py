@@ -0,0 +1,95 @@
+from datetime import datetime
+
+from cache import ALL_CONTESTS, ReadCache
+from contest import ContestManager
+from test_contest import count_queries
+
+
+def selects(statements):
+    return len([s for s in statements if s.lstrip().upper().startswith("SELECT")])
+
+
+def test_reads_are_cached_until_a_write_touches_the_contest(db):
+    cache = ReadCache()
+    manager = ContestManager(db, cache=cache)
+    first = manager.create_contest("First", "profit >= 1000")
+    second = manager.create_contest("Second", "profit >= 1000")
+    first_id, second_id = first.id, second.id
+    alice = manager.join_contest(first.join_code, "alice")
+    manager.join_contest(second.join_code, "bob")
+
+    statements, stop = count_queries(db)
+    try:
+        for _ in range(3):
+            manager.get_active_contests()
+            manager.get_contest_players(first_id)
+            manager.get_leaderboard(first_id)
+            manager.get_leaderboard(second_id)
+            manager.get_contest_trades(first_id)
+        assert selects(statements) == 5
+
+        manager.process_trade(alice.id, "AAPL", "BUY", 1, 100.0, datetime(2024, 1, 1))
+        statements.clear()
+        assert manager.get_leaderboard(first_id)[0]["market_value"] == 100.0
+        assert len(manager.get_contest_trades(first_id)["trades"]) == 1
+        manager.get_leaderboard(second_id)
+        manager.get_active_contests()
+        assert selects(statements) == 2
+    finally:
+        stop()
+
+    stats = cache.stats()
+    assert stats["reads"]["get_leaderboard"] == {"hits": 5, "misses": 3}
+    assert stats["hits"] == 12 and stats["misses"] == 7
+    assert stats["hit_rate"] == 12 / 19
+
+
+def test_create_and_join_invalidate_cached_lists(db):
+    manager = ContestManager(db, cache=ReadCache())
+    contest = manager.create_contest("First", "profit >= 1000")
+    assert [c.name for c in manager.get_active_contests()] == ["First"]
+    assert manager.get_contest_players(contest.id) == []
+
+    manager.create_contest("Second", "profit >= 1000")
+    manager.join_contest(contest.join_code, "alice")
+    assert [c.name for c in manager.get_active_contests()] == ["First", "Second"]
+    players = manager.get_contest_players(contest.id)
+    db.close()
+    # Detached from the session that loaded them, but still readable
+    assert [p.name for p in players] == ["alice"]
+
+
+def test_a_read_racing_a_write_is_not_stored_as_current():
+    cache = ReadCache()
+    value = cache.get_or_load("read", 1, (), lambda: cache.bump(1) or "old")
+    assert value == "old"
+    assert cache.get_or_load("read", 1, (), lambda: "new") == "new"
+    assert cache.version(ALL_CONTESTS) == 0
+
+
+def test_cache_is_bounded():
+    cache = ReadCache(max_entries=2)
+    for i in range(3):
+        cache.get_or_load("read", i, (), lambda: i)
+    assert cache.stats()["entries"] == 2
+    cache.get_or_load("read", 0, (), lambda: "reloaded")
+    assert cache.stats()["misses"] == 4
+
+
+def test_a_miss_does_not_load_from_an_old_read_transaction(db):
+    from sqlalchemy.orm import sessionmaker
+
+    cache = ReadCache()
+    reader = ContestManager(db, cache=cache)
+    writer_session = sessionmaker(bind=db.get_bind(), expire_on_commit=False)()
+    writer = ContestManager(writer_session, cache=cache)
+    contest = writer.create_contest("Snapshot", "profit >= 1000")
+    alice = writer.join_contest(contest.join_code, "alice")
+
+    # The reader's session holds a read transaction (and its snapshot) open
+    reader.get_player_positions(alice.id)
+    assert db.in_transaction()
+    writer.process_trade(alice.id, "AAPL", "BUY", 1, 100.0, datetime(2024, 1, 1))
+
+    assert reader.get_leaderboard(contest.id)[0]["cash_balance"] == 9900.0
+    writer_session.close()
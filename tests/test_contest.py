@@ -0,0 +1,131 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from contest import TradeRejected
+
+
+def count_queries(session):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_leaderboard_aggregates_cash_and_positions(manager):
+    contest = manager.create_contest("Test", "profit >= 1000", starting_balance=10000.0)
+    alice = manager.join_contest(contest.join_code, "alice")
+    bob = manager.join_contest(contest.join_code, "bob")
+    manager.join_contest(contest.join_code, "carol")
+
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 120.0, datetime(2024, 1, 2))
+    manager.process_trade(bob.id, "MSFT", "BUY", 5, 300.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "MSFT", "SELL", 5, 280.0, datetime(2024, 1, 3))
+
+    leaderboard = manager.get_leaderboard(contest.id)
+
+    assert [row["name"] for row in leaderboard] == ["alice", "carol", "bob"]
+    top = leaderboard[0]
+    assert top["player_id"] == alice.id
+    assert top["cash_balance"] == 10000.0 - 1000.0 - 1200.0
+    assert top["market_value"] == 20 * 120.0
+    assert top["unrealized_pl"] == 20 * (120.0 - 110.0)
+    assert top["portfolio_value"] == 10200.0
+    assert top["total_profit"] == 200.0
+    assert leaderboard[1]["market_value"] == 0.0
+    assert leaderboard[2]["total_profit"] == -100.0
+
+
+def test_leaderboard_is_a_single_query(manager):
+    contest = manager.create_contest("Test", "profit >= 1000")
+    contest_id, join_code = contest.id, contest.join_code
+    for i in range(20):
+        player = manager.join_contest(join_code, f"player{i}")
+        manager.process_trade(player.id, "AAPL", "BUY", 1, 100.0 + i, datetime(2024, 1, 1))
+
+    statements, stop = count_queries(manager.db)
+    try:
+        leaderboard = manager.get_leaderboard(contest_id)
+    finally:
+        stop()
+
+    assert len(leaderboard) == 20
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+
+def test_standings_track_trades_and_match_rebuild(manager):
+    contest = manager.create_contest("Test", "profit >= 1000")
+    contest_id, join_code = contest.id, contest.join_code
+    alice = manager.join_contest(join_code, "alice")
+    bob = manager.join_contest(join_code, "bob")
+
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(alice.id, "aapl", "SELL", 4, 150.0, datetime(2024, 1, 2))
+    manager.process_trade(bob.id, "TSLA", "BUY", 3, 200.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "TSLA", "SELL", 3, 190.0, datetime(2024, 1, 4))
+    manager.record_trade(bob.id, {"ticker": "NVDA", "quantity": 2, "price": 50.0, "trade_type": "BUY"})
+
+    with pytest.raises(TradeRejected):
+
+        manager.process_trade(bob.id, "AAPL", "SELL", 1, 100.0, datetime(2024, 1, 5))
+    with pytest.raises(TradeRejected):
+        manager.process_trade(bob.id, "AAPL", "BUY", 1000, 100.0, datetime(2024, 1, 5))
+
+    before = manager.get_leaderboard(contest_id)
+    assert [row["name"] for row in before] == ["alice", "bob"]
+    assert before[0]["total_profit"] == pytest.approx(500.0)
+    assert before[0]["unrealized_pl"] == pytest.approx(6 * 50.0)
+    assert before[1]["total_profit"] == pytest.approx(-30.0)
+    assert manager.get_leaderboard(contest_id, limit=1) == before[:1]
+
+    assert manager.rebuild_standings(contest_id) == 0
+    assert manager.get_leaderboard(contest_id) == pytest.approx(before)
+
+
+def test_rebuild_standings_repairs_drift(manager, db):
+    from database import ContestStanding
+
+    contest = manager.create_contest("Test", "profit >= 1000")
+    contest_id, join_code = contest.id, contest.join_code
+    alice = manager.join_contest(join_code, "alice")
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    expected = manager.get_leaderboard(contest_id)
+
+    db.query(ContestStanding).delete()
+    db.commit()
+    assert manager.get_leaderboard(contest_id) == []
+
+    assert manager.rebuild_standings(contest_id) == 1
+    assert manager.get_leaderboard(contest_id) == expected
+
+
+def test_contest_trades_are_keyset_paginated_and_filtered(manager):
+    contest = manager.create_contest("Test", "profit >= 1000")
+    contest_id, join_code = contest.id, contest.join_code
+    alice = manager.join_contest(join_code, "alice").id
+    bob = manager.join_contest(join_code, "bob").id
+    for day in range(1, 11):
+        manager.process_trade(alice, "AAPL", "BUY", 1, 10.0, datetime(2024, 1, day))
+        manager.process_trade(bob, "MSFT", "BUY", 1, 10.0, datetime(2024, 1, day))
+    manager.process_trade(bob, "MSFT", "SELL", 2, 12.0, datetime(2024, 1, 10))
+
+    seen, cursor = [], None
+    while True:
+        page = manager.get_contest_trades(contest_id, limit=6, before=cursor)
+        seen.extend(page["trades"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 21 and len({t["id"] for t in seen}) == 21
+    assert [(t["date"], t["id"]) for t in seen] == sorted(((t["date"], t["id"]) for t in seen), reverse=True)
+
+    sells = manager.get_contest_trades(contest_id, trade_type="SELL")
+    assert [(t["player"], t["quantity"]) for t in sells["trades"]] == [("bob", 2)]
+    assert len(manager.get_contest_trades(contest_id, player_id=alice, ticker="aapl", limit=None)["trades"]) == 10
+    assert manager.get_contest_trades(contest_id, ticker="TSLA") == {"trades": [], "next_cursor": None}
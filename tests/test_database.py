@@ -0,0 +1,193 @@
+import threading
+
+import database
+from database import SCHEMA_VERSION, get_engine, get_scoped_session, init_db
+
+
+def test_engine_is_shared_and_uses_wal(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    engine = get_engine(db_path)
+    assert get_engine(db_path) is engine
+    assert init_db(db_path).get_bind() is engine
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() > 0
+
+
+def test_scoped_sessions_are_per_thread(tmp_path):
+    Session = get_scoped_session(str(tmp_path / "scoped.db"))
+    sessions = []
+
+    def worker():
+        sessions.append(Session())
+        Session.remove()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert Session() is Session()
+    assert sessions[0] is not Session()
+    Session.remove()
+
+
+def test_contest_manager_writes_through_the_scoped_registry(tmp_path):
+    from datetime import datetime
+    from contest import ContestManager
+
+    # The app hands ContestManager the registry, not a session
+    Session = get_scoped_session(str(tmp_path / "registry.db"))
+    manager = ContestManager(Session)
+    contest = manager.create_contest("Test", "profit >= 1000")
+    player = manager.join_contest(contest.join_code, "alice")
+    assert manager.process_trade(player.id, "AAPL", "BUY", 1, 100.0, datetime(2024, 1, 1)) is not None
+    contest_id = contest.id
+    Session.remove()
+    assert manager.get_leaderboard(contest_id)[0]["cash_balance"] == 9900.0
+    Session.remove()
+
+
+def test_old_schema_gets_new_columns_backfilled_and_money_scaled(tmp_path):
+    import sqlite3
+
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE players (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, contest_id INTEGER,
+                              starting_balance FLOAT NOT NULL, cash_balance FLOAT NOT NULL, created_at DATETIME);
+        CREATE TABLE trades (id INTEGER PRIMARY KEY, player_id INTEGER, ticker VARCHAR NOT NULL,
+                             quantity FLOAT NOT NULL, price FLOAT NOT NULL, type VARCHAR NOT NULL,
+                             total_amount FLOAT NOT NULL, trade_date DATETIME NOT NULL, created_at DATETIME);
+        INSERT INTO players VALUES (1, 'alice', 7, 100.0, 89.99, NULL);
+        INSERT INTO trades VALUES (1, 1, 'AAPL', 1.5, 6.67, 'BUY', 10.01, '2024-01-01 00:00:00', NULL);
+    """)
+    conn.close()
+
+    with get_engine(db_path).connect() as conn:
+        assert conn.exec_driver_sql("SELECT contest_id FROM trades").scalar() == 7
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(trades)")}
+        assert "ix_trades_contest_id_trade_date_id" in indexes
+        # Float dollars and shares become integer cents and micro-shares, once
+        assert conn.exec_driver_sql("SELECT starting_balance, cash_balance FROM players").one() == (10000, 8999)
+        assert conn.exec_driver_sql("SELECT quantity, price, total_amount FROM trades").one() == (1500000, 667, 1001)
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+    # Reopening (e.g. after a restart) does not scale again
+    database._engines.pop(db_path).dispose()
+    with get_engine(db_path).connect() as conn:
+        assert conn.exec_driver_sql("SELECT cash_balance FROM players").scalar() == 8999
+
+
+def test_baseline_database_gets_standings_built(tmp_path):
+    import sqlite3
+    from contest import ContestManager
+
+    # The schema as the first release created it, before contest_standings
+    db_path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE contests (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, join_code VARCHAR NOT NULL UNIQUE,
+                               win_condition VARCHAR NOT NULL, starting_balance FLOAT NOT NULL,
+                               status VARCHAR(9), created_at DATETIME);
+        CREATE TABLE players (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, contest_id INTEGER REFERENCES contests(id),
+                              starting_balance FLOAT NOT NULL, cash_balance FLOAT NOT NULL, created_at DATETIME);
+        CREATE TABLE positions (id INTEGER PRIMARY KEY, player_id INTEGER REFERENCES players(id),
+                                ticker VARCHAR NOT NULL, quantity FLOAT NOT NULL, average_price FLOAT NOT NULL,
+                                current_price FLOAT NOT NULL, last_updated DATETIME);
+        CREATE TABLE trades (id INTEGER PRIMARY KEY, player_id INTEGER REFERENCES players(id), ticker VARCHAR NOT NULL,
+                             quantity FLOAT NOT NULL, price FLOAT NOT NULL, type VARCHAR NOT NULL,
+                             total_amount FLOAT NOT NULL, trade_date DATETIME NOT NULL, created_at DATETIME);
+        INSERT INTO contests VALUES (1, 'Old', 'ABC123', 'profit >= 1000', 10000.0, 'ACTIVE', NULL);
+        INSERT INTO players VALUES (1, 'alice', 1, 10000.0, 9000.0, NULL);
+        INSERT INTO positions VALUES (1, 1, 'AAPL', 10, 100.0, 110.0, NULL);
+        INSERT INTO trades VALUES (1, 1, 'AAPL', 10, 100.0, 'BUY', 1000.0, '2024-01-01 00:00:00', NULL);
+    """)
+    conn.close()
+
+    db = init_db(db_path)
+    [row] = ContestManager(db).get_leaderboard(1)
+    assert (row["name"], row["cash_balance"], row["market_value"], row["total_profit"]) == ("alice", 9000.0, 1100.0, 100.0)
+    db.close()
+
+
+def test_duplicate_positions_are_merged_before_the_unique_index(tmp_path):
+    import sqlite3
+
+    db_path = str(tmp_path / "duplicates.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE players (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, contest_id INTEGER,
+                              starting_balance FLOAT NOT NULL, cash_balance FLOAT NOT NULL, created_at DATETIME);
+        CREATE TABLE positions (id INTEGER PRIMARY KEY, player_id INTEGER, ticker VARCHAR NOT NULL,
+                                quantity FLOAT NOT NULL, average_price FLOAT NOT NULL,
+                                current_price FLOAT NOT NULL, last_updated DATETIME);
+        INSERT INTO positions VALUES (1, 1, 'AAPL', 10, 100.0, 110.0, NULL);
+        INSERT INTO positions VALUES (2, 1, 'AAPL', 10, 120.0, 115.0, NULL);
+        INSERT INTO positions VALUES (3, 1, 'MSFT', 1, 300.0, 300.0, NULL);
+    """)
+    conn.close()
+
+    with get_engine(db_path).connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT id, ticker, quantity, average_price, current_price FROM positions ORDER BY id"
+        ).all()
+        assert rows == [(1, "AAPL", 20_000_000, 11000, 11500), (3, "MSFT", 1_000_000, 30000, 30000)]
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(positions)")}
+        assert "uq_positions_player_ticker" in indexes
+
+
+def test_interrupted_migration_is_rolled_back_and_scales_once(tmp_path, monkeypatch):
+    import sqlite3
+    import pytest
+
+    db_path = str(tmp_path / "interrupted.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE players (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, contest_id INTEGER,
+                              starting_balance FLOAT NOT NULL, cash_balance FLOAT NOT NULL, created_at DATETIME);
+        INSERT INTO players VALUES (1, 'alice', 7, 100.0, 89.99, NULL);
+    """)
+    conn.close()
+
+    # Fail after the money is scaled but before the version is set
+    def crash(conn):
+        raise RuntimeError("killed")
+    monkeypatch.setattr(database, "create_missing_indexes", crash)
+    with pytest.raises(RuntimeError):
+        get_engine(db_path)
+    monkeypatch.undo()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT cash_balance FROM players").fetchone() == (89.99,)
+    assert conn.execute("PRAGMA user_version").fetchone() == (0,)
+    conn.close()
+    with get_engine(db_path).connect() as conn:
+        assert conn.exec_driver_sql("SELECT cash_balance FROM players").scalar() == 8999
+
+
+def test_existing_contests_get_their_equity_curves_backfilled(tmp_path):
+    from datetime import datetime
+    from contest import ContestManager
+    from database import EquityPoint
+
+    db_path = str(tmp_path / "curves.db")
+    db = init_db(db_path)
+    manager = ContestManager(db)
+    contest = manager.create_contest("Old", "profit >= 1000")
+    contest_id = contest.id
+    alice = manager.join_contest(contest.join_code, "alice")
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(alice.id, "AAPL", "SELL", 5, 110.0, datetime(2024, 1, 2))
+    manager.process_trade(alice.id, "MSFT", "BUY", 1, 300.0, datetime(2024, 1, 3))
+    curve = manager.get_equity_curve(contest_id)
+    # Recorded before equity points existed: only the trades since the upgrade have points
+    db.query(EquityPoint).filter(EquityPoint.day < datetime(2024, 1, 3).date()).delete()
+    db.commit()
+    db.close()
+
+    database._engines.pop(db_path).dispose()
+    database._session_factories.pop(db_path, None)
+    db = init_db(db_path)
+    assert ContestManager(db).get_equity_curve(contest_id) == curve
+    db.close()
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+from api import create_app
+from cache import ReadCache
+from contest import ContestManager
+from feed import ChangeFeed
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from feed_load import run_load  # noqa: E402
+
+
+def test_since_returns_missed_events_or_none_after_a_gap():
+    feed = ChangeFeed(history=3)
+    for i in range(5):
+        feed.publish(1, "standings", [{"player_id": i}])
+
+    assert feed.latest(1) == 5 and feed.latest(2) == 0
+    assert [event.seq for event in feed.since(1, 3)] == [4, 5]
+    assert [event.seq for event in feed.since(1, 2)] == [3, 4, 5]
+    assert feed.since(1, 5) == [] and feed.since(2, 0) == []
+    assert feed.since(1, 1) is None  # event 2 fell out of the history
+    assert feed.since(1, 9) is None  # seen before a restart
+
+
+def test_subscribers_get_events_and_overflow():
+    async def run():
+        feed = ChangeFeed(max_queue=2)
+        subscription = feed.subscribe(1)
+        feed.publish(2, "standings", [])
+        feed.publish(1, "standings", [{"player_id": 7}])
+        event = await subscription.get(1)
+        assert (event.seq, event.data) == (1, [{"player_id": 7}])
+        assert await subscription.get(0.01) is None
+
+        for _ in range(3):
+            feed.publish(1, "standings", [])
+        await asyncio.sleep(0)
+        assert subscription.overflowed
+        subscription.close()
+        assert feed.subscribers() == 0
+
+    asyncio.run(run())
+
+
+def test_trades_publish_only_the_changed_rows(db):
+    feed = ChangeFeed()
+    manager = ContestManager(db, cache=ReadCache(), feed=feed)
+    contest = manager.create_contest("Feed", "profit >= 1000", starting_balance=10000.0)
+    alice = manager.join_contest(contest.join_code, "alice")
+    bob = manager.join_contest(contest.join_code, "bob")
+    seq = feed.latest(contest.id)
+
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 2))
+    [event] = feed.since(contest.id, seq)
+    assert event.kind == "standings"
+    assert event.data == [row for row in manager.get_leaderboard(contest.id) if row["player_id"] == alice.id]
+
+    manager.process_trade(bob.id, "MSFT", "BUY", 10, 100.0, datetime(2024, 1, 2))
+    manager.process_trade(bob.id, "MSFT", "SELL", 10, 300.0, datetime(2024, 1, 3))
+    events = feed.since(contest.id, event.seq)
+    assert [e.kind for e in events] == ["standings", "standings", "contest"]
+    assert [row["player_id"] for e in events[:2] for row in e.data] == [bob.id, bob.id]
+    assert events[1].data[0]["total_profit"] == 2000.0
+    assert events[2].data["status"] == "completed" and events[2].data["winner_id"] == bob.id
+
+
+def test_event_stream_sends_a_snapshot_then_resumes_from_last_event_id(db):
+    cache, feed = ReadCache(), ChangeFeed()
+    manager = ContestManager(db, cache=cache, feed=feed)
+    contest = manager.create_contest("Stream", "profit >= 1000", starting_balance=10000.0)
+    alice = manager.join_contest(contest.join_code, "alice")
+    manager.process_trade(alice.id, "AAPL", "BUY", 1, 100.0, datetime(2024, 1, 2))
+    client = TestClient(create_app(sessionmaker(bind=db.get_bind(), expire_on_commit=False), cache, feed))
+    url = f"/api/contests/{contest.id}/events"
+
+    assert client.get(f"/api/contests/{contest.id + 1}/events").status_code == 404
+    assert TestClient(create_app(lambda: db, cache)).get(url).status_code == 404
+
+    # Streams end once the contest completes
+    manager.process_trade(alice.id, "AAPL", "SELL", 1, 1200.0, datetime(2024, 1, 3))
+    with client.stream("GET", url, headers={"Last-Event-ID": "2"}) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        lines = response.iter_lines()
+        assert next(lines) == "retry: 2000"
+        assert next(lines) == ""
+        assert [next(lines) for _ in range(2)] == ["id: 3", "event: standings"]
+        assert '"total_profit": 1100.0' in next(lines)
+        assert next(lines) == ""
+        assert [next(lines) for _ in range(2)] == ["id: 4", "event: contest"]
+
+    with client.stream("GET", url, headers={"Last-Event-ID": "99"}) as response:
+        lines = response.iter_lines()
+        next(lines), next(lines)
+        assert [next(lines) for _ in range(2)] == ["id: 4", "event: snapshot"]
+        assert '"name": "alice"' in next(lines)
+    # Completed and up to date: nothing more to send
+    assert client.get(url, headers={"Last-Event-ID": "4"}).status_code == 204
+    assert feed.subscribers() == 0
+
+
+def test_hundreds_of_idle_subscribers_each_get_every_trade():
+    result = run_load(subscribers=300, trades=5, players=50)
+
+    assert result["subscribers"] == 300
+    # Idle streams are served by the event loop, not a thread each
+    assert result["threads"] < 100
+    assert result["event_bytes"] < 1000
@@ -0,0 +1,53 @@
+import io
+
+import pytest
+from PIL import Image
+
+from conftest import make_screenshot
+from image_prep import ImagePreprocessor
+
+
+def test_large_png_is_cropped_downscaled_and_reencoded():
+    original = make_screenshot()
+    preprocessor = ImagePreprocessor(max_dimension=1024)
+
+    result = preprocessor.process(original)
+
+    assert result["source_format"] == "PNG"
+    assert result["mime_type"] == "image/jpeg"
+    assert max(result["size"]) <= 1024
+    assert result["bytes"] < result["original_bytes"]
+    assert result["bytes_saved"] == result["original_bytes"] - result["bytes"]
+    assert Image.open(io.BytesIO(result["data"])).format == "JPEG"
+    assert preprocessor.stats()["images"] == 1
+    assert preprocessor.stats()["bytes_saved"] == result["bytes_saved"]
+
+
+def test_small_jpeg_is_not_enlarged():
+    original = make_screenshot(size=(200, 300), fmt="JPEG")
+
+    result = ImagePreprocessor(output_format="WEBP").process(original)
+
+    assert result["bytes"] <= result["original_bytes"]
+    assert result["mime_type"] in ("image/jpeg", "image/webp")
+
+
+def test_output_format_names_are_normalised():
+    original = make_screenshot()
+    keys = set(ImagePreprocessor().process(original))
+
+    for name in ("jpg", "JPG", "jpeg"):
+        result = ImagePreprocessor(output_format=name).process(original)
+        assert result["mime_type"] == "image/jpeg"
+        assert set(result) == keys
+
+    # Noise does not compress losslessly, so the JPEG is kept as is, and "size" describes what was kept
+    buffer = io.BytesIO()
+    Image.effect_noise((40, 60), 64).convert("RGB").save(buffer, format="JPEG", quality=50)
+    small = buffer.getvalue()
+    kept = ImagePreprocessor(output_format="png").process(small)
+    assert set(kept) == keys
+    assert kept["data"] == small and kept["size"] == (40, 60)
+
+    with pytest.raises(ValueError):
+        ImagePreprocessor(output_format="bmp")
@@ -0,0 +1,141 @@
+from datetime import datetime
+
+import pytest
+
+from contest import TradeRejected
+from database import LedgerSnapshot, Trade
+from ledger import Ledger, LedgerError, PlayerState, replay
+from money import to_cents, to_micros
+
+
+def setup_contest(manager):
+    contest = manager.create_contest("Ledger", "profit >= 1000", starting_balance=10000.0)
+    alice = manager.join_contest(contest.join_code, "alice")
+    bob = manager.join_contest(contest.join_code, "bob")
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "MSFT", "BUY", 5, 300.0, datetime(2024, 1, 2))
+    manager.process_trade(alice.id, "AAPL", "SELL", 4, 150.0, datetime(2024, 1, 3))
+    manager.process_trade(bob.id, "MSFT", "SELL", 5, 200.0, datetime(2024, 1, 4))
+    return contest.id, alice.id, bob.id
+
+
+def test_state_at_replays_trades_up_to_a_timestamp(manager):
+    contest_id, alice_id, bob_id = setup_contest(manager)
+    ledger = Ledger(manager.db)
+
+    states = ledger.state_at(contest_id, datetime(2024, 1, 2, 12))
+    # States are in cents and micro-shares, as stored
+    assert states[alice_id].cash == 900_000
+    assert states[alice_id].positions == {"AAPL": [10_000_000, 10_000, 10_000]}
+    assert states[bob_id].cash == 850_000
+
+    standings = manager.get_standings_at(contest_id, datetime(2024, 1, 5))
+    assert [row["player_id"] for row in standings] == [alice_id, bob_id]
+    assert standings[0]["total_profit"] == 9000.0 + 600.0 + 6 * 150.0 - 10000.0
+    assert standings[1]["total_profit"] == -500.0
+
+    only_bob = ledger.state_at(contest_id, datetime(2024, 1, 5), player_id=bob_id)
+    assert list(only_bob) == [bob_id] and only_bob[bob_id].positions == {}
+
+
+def test_snapshots_shortcut_replay_and_are_invalidated_by_backdated_trades(manager):
+    contest_id, alice_id, bob_id = setup_contest(manager)
+    ledger = Ledger(manager.db)
+    expected = ledger.standings_at(contest_id, datetime(2024, 1, 5))
+
+    manager.snapshot_ledger(contest_id, datetime(2024, 1, 2, 12))
+    manager.snapshot_ledger(contest_id, datetime(2024, 1, 5))
+    assert ledger.standings_at(contest_id, datetime(2024, 1, 5)) == expected
+    assert ledger.standings_at(contest_id, datetime(2024, 1, 3, 12)) == \
+        Ledger(manager.db).standings_at(contest_id, datetime(2024, 1, 3, 12))
+
+    # A trade dated before the later snapshot makes it stale
+    manager.process_trade(bob_id, "TSLA", "BUY", 1, 100.0, datetime(2024, 1, 3))
+    assert [s.as_of for s in manager.db.query(LedgerSnapshot)] == [datetime(2024, 1, 2, 12)]
+    bob = {row["player_id"]: row for row in ledger.standings_at(contest_id, datetime(2024, 1, 5))}[bob_id]
+    assert bob["cash_balance"] == 10000.0 - 1500.0 + 1000.0 - 100.0
+    assert bob["market_value"] == 100.0
+
+
+def test_trades_are_append_only(manager):
+    contest_id, alice_id, _ = setup_contest(manager)
+    trade = manager.db.query(Trade).filter_by(player_id=alice_id).first()
+    trade.price = 1.0
+    with pytest.raises(ValueError):
+        manager.db.commit()
+    manager.db.rollback()
+
+
+def test_replay_matches_incremental_positions(manager):
+    contest_id, alice_id, _ = setup_contest(manager)
+    state = Ledger(manager.db).state_at(contest_id, player_id=alice_id)[alice_id]
+    positions = {p["ticker"]: p for p in manager.get_player_positions(alice_id)}
+    assert state.positions["AAPL"][0] == to_micros(positions["AAPL"]["quantity"])
+    assert state.positions["AAPL"][1] == to_cents(positions["AAPL"]["avg_price"])
+
+
+def test_replay_skips_unknown_players():
+    states = {1: PlayerState(10_000)}
+    applied = replay(states, [(1, "A", "BUY", 1_000_000, 1000, 1000), (2, "A", "BUY", 1_000_000, 1000, 1000)])
+    assert applied == 1
+    assert states[1].cash == 9000
+
+
+def test_replay_never_sells_shares_that_are_not_held():
+    states = {1: PlayerState(10_000)}
+    sell = (1, "A", "SELL", -1_000_000, 1000, 1000)
+    assert replay(states, [sell]) == 0
+    assert states[1].cash == 10_000 and states[1].positions == {}
+    with pytest.raises(LedgerError):
+        replay(states, [sell], strict=True)
+
+
+def test_backdated_trades_follow_the_ledger_order(manager):
+    contest = manager.create_contest("Backdated", "profit >= 100000", starting_balance=10000.0)
+    contest_id = contest.id
+    alice = manager.join_contest(contest.join_code, "alice").id
+    manager.process_trade(alice, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 5))
+
+    # No shares were held on Jan 1, so the sell is rejected rather than booking phantom cash
+    with pytest.raises(TradeRejected):
+        manager.process_trade(alice, "AAPL", "SELL", 10, 110.0, datetime(2024, 1, 1))
+    # Nor may a backdated sell leave a later sell without its shares
+    manager.process_trade(alice, "AAPL", "SELL", 10, 120.0, datetime(2024, 1, 7))
+    with pytest.raises(TradeRejected):
+        manager.process_trade(alice, "AAPL", "SELL", 1, 110.0, datetime(2024, 1, 6))
+
+    # A valid backdated buy changes the average price as the ledger computes it
+    manager.process_trade(alice, "AAPL", "BUY", 5, 110.0, datetime(2024, 1, 8))
+    assert manager.process_trade(alice, "AAPL", "BUY", 10, 90.0, datetime(2024, 1, 2))
+    assert manager.import_trades(alice, [
+        {"ticker": "MSFT", "trade_type": "SELL", "quantity": 1, "price": 300.0, "date": "2024-01-03"},
+        {"ticker": "AAPL", "trade_type": "SELL", "quantity": 5, "price": 95.0, "date": "2024-01-04"},
+    ])["imported"] == 1
+
+    live = [{key: row[key] for key in ("player_id", "cash_balance", "market_value", "total_profit")}
+            for row in manager.get_leaderboard(contest_id)]
+    assert manager.get_standings_at(contest_id, datetime(2024, 12, 31)) == \
+        [{**row, "portfolio_value": row["cash_balance"] + row["market_value"]} for row in live]
+    assert manager.rebuild_standings(contest_id) == 0
+
+
+def test_equity_curve_is_appended_per_trade_and_matches_backfill(manager):
+    contest_id, alice_id, bob_id = setup_contest(manager)
+    manager.process_trade(alice_id, "AAPL", "BUY", 1, 120.0, datetime(2024, 1, 3, 15))
+
+    curve = manager.get_equity_curve(contest_id)
+    alice = [(p["day"].day, p["portfolio_value"]) for p in curve if p["player_id"] == alice_id]
+    assert alice == [(1, 10000.0), (3, 9000.0 + 600.0 - 120.0 + 7 * 120.0)]
+    assert [p["day"].day for p in curve] == sorted(p["day"].day for p in curve)
+
+    # A backdated trade rewrites the player's later points from the ledger
+    manager.process_trade(bob_id, "TSLA", "BUY", 2, 50.0, datetime(2024, 1, 1))
+    bob = {p["day"].day: p for p in manager.get_equity_curve(contest_id) if p["player_id"] == bob_id}
+    assert sorted(bob) == [1, 2, 4]
+    assert bob[4]["cash_balance"] == 10000.0 - 100.0 - 1500.0 + 1000.0
+    assert bob[4]["market_value"] == 100.0
+
+    recorded = manager.get_equity_curve(contest_id)
+    assert manager.backfill_equity_curve(contest_id) == len(recorded)
+    assert manager.get_equity_curve(contest_id) == recorded
+    assert len(manager.get_equity_curve(contest_id, start=datetime(2024, 1, 2).date())) == 3
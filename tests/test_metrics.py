@@ -0,0 +1,81 @@
+import json
+import logging
+from datetime import datetime
+
+import pytest
+
+from contest import TradeRejected
+from logs import JSONFormatter
+from metrics import METRICS, Histogram, Metrics, timed
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    histogram = Histogram()
+    for value in [0.3] * 90 + [40.0] * 9 + [700.0]:
+        histogram.observe(value)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == 0.5
+    assert summary["p95_ms"] == 50
+    assert summary["p99_ms"] == 50
+    assert summary["max_ms"] == 700.0
+
+
+def test_operations_record_latency_and_statement_counts(manager):
+    METRICS.reset()
+    contest = manager.create_contest("Test", "profit >= 1000")
+    contest_id, join_code = contest.id, contest.join_code
+    player = manager.join_contest(join_code, "alice")
+    manager.process_trade(player.id, "AAPL", "BUY", 1, 100.0, datetime(2024, 1, 1))
+    manager.get_leaderboard(contest_id)
+    manager.get_leaderboard(contest_id)
+
+    operations = METRICS.snapshot()["operations"]
+    assert operations["ContestManager.get_leaderboard"]["count"] == 2
+    assert operations["ContestManager.get_leaderboard"]["statements"] == {"total": 2, "mean": 1.0, "max": 1}
+    assert operations["ContestManager.process_trade"]["count"] == 1
+    assert operations["ContestManager.process_trade"]["statements"]["max"] > 1
+
+
+def test_repeated_statements_are_flagged_as_n_plus_one(manager):
+    metrics = Metrics(n_plus_one_threshold=5)
+    metrics.instrument_engine(manager.db.get_bind())
+    contest = manager.create_contest("Test", "profit >= 1000")
+    contest_id, join_code = contest.id, contest.join_code
+    for i in range(8):
+        manager.join_contest(join_code, f"player{i}")
+
+    @timed("leaderboard_one_by_one", metrics=metrics)
+    def leaderboard_one_by_one():
+        return [manager.get_player_positions(player.id) for player in manager.get_contest_players(contest_id)]
+
+    leaderboard_one_by_one()
+    with metrics.timer("leaderboard"):
+        manager.get_leaderboard(contest_id)
+
+    flagged = metrics.snapshot()["n_plus_one"]
+    assert list(flagged) == ["leaderboard_one_by_one"]
+    assert flagged["leaderboard_one_by_one"]["max_executions"] == 8
+    assert "positions" in flagged["leaderboard_one_by_one"]["statement"]
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    with metrics.timer("op"):
+        pass
+    timed("op", metrics=metrics)(lambda: None)()
+    assert metrics.snapshot() == {"operations": {}, "n_plus_one": {}}
+
+
+def test_trade_logging_is_structured(manager, caplog):
+    contest = manager.create_contest("Test", "profit >= 1000")
+    player = manager.join_contest(contest.join_code, "alice")
+    with caplog.at_level(logging.INFO, logger="contest"), pytest.raises(TradeRejected):
+        manager.process_trade(player.id, "AAPL", "SELL", 1, 100.0, datetime(2024, 1, 1))
+
+    record = caplog.records[-1]
+    assert record.getMessage() == "trade rejected"
+    payload = json.loads(JSONFormatter().format(record))
+    assert payload["player_id"] == player.id
+    assert payload["reason"] == "Insufficient shares of AAPL to sell"
+    assert payload["level"] == "INFO"
@@ -0,0 +1,33 @@
+import pytest
+
+from money import average_price, divide, dollars, shares, to_cents, to_micros, value
+
+
+def test_conversions_round_half_to_even_from_the_decimal_value():
+    assert to_cents(1.005) == 100 and to_cents(1.015) == 102  # not 100.49999... / 101.4999...
+    assert to_cents(0.1) + to_cents(0.2) == to_cents(0.3)
+    assert to_cents("1,000".replace(",", "")) == 100_000 and to_cents(7) == 700
+    assert to_micros(0.000_000_5) == 0 and to_micros(1.5) == 1_500_000
+    assert dollars(to_cents(123.45)) == 123.45 and shares(to_micros(2.25)) == 2.25
+
+
+def test_integer_arithmetic():
+    assert value(to_micros(3), to_cents(19.99)) == 5997
+    assert value(to_micros(0.5), 1) == 1  # half a cent rounds up
+    assert divide(5, 2) == 2 and divide(7, 2) == 4 and divide(7, 3) == 2
+    # 10 @ $100 + 10 @ $120
+    assert average_price(to_micros(10), 10_000, to_micros(10), 12_000) == 11_000
+    assert average_price(to_micros(2), 1000, to_micros(1), 1001) == 1000
+
+
+def test_scaled_columns_reject_unscaled_floats(manager, db):
+    from database import Player
+
+    contest = manager.create_contest("Test", "profit >= 1000", starting_balance=100.5)
+    player = manager.join_contest(contest.join_code, "alice")
+    assert player.cash_balance == 10_050
+    player.cash_balance = 99.5
+    with pytest.raises(Exception, match="not a scaled integer"):
+        db.commit()
+    db.rollback()
+    assert db.get(Player, player.id).cash_balance == 10_050
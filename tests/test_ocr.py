@@ -1,6 +1,10 @@
+import time
 import pytest
 from src.ocr import TradeParser
 from datetime import datetime
+from conftest import make_screenshot
+from ocr_backends import FixtureBackend
+from ocr_cache import ParseCache
 
 def test_trade_parser_initialization():
     parser = TradeParser(api_key="test_key")
@@ -12,13 +16,32 @@ def test_parse_screenshot_with_invalid_path():
     assert result["success"] is False
     assert "error" in result
 
-# TODO: Add more tests with actual screenshot samples
-# def test_parse_screenshot_with_valid_image():
-#     parser = TradeParser()
-#     result = parser.parse_screenshot("tests/fixtures/sample_trade.jpg")
-#     assert result["success"] is True
-#     assert "ticker" in result
-#     assert "quantity" in result
-#     assert "price" in result
-#     assert "trade_type" in result
-#     assert isinstance(result["date"], datetime)
+def test_parse_screenshot_with_valid_image(tmp_path):
+    (tmp_path / "sample_trade.png").write_bytes(make_screenshot())
+    (tmp_path / "sample_trade.json").write_text(
+        '```json\n{"trade_type": "sell", "ticker": "TSLA", "quantity": 2, "price": 250.1, "date": "2024-03-01"}\n```'
+    )
+    parser = TradeParser(backend=FixtureBackend(str(tmp_path)), cache=ParseCache(path=None))
+
+    result = parser.parse_screenshot((tmp_path / "sample_trade.png").read_bytes())
+
+    assert result["success"] is True
+    assert result["ticker"] == "TSLA"
+    assert result["quantity"] == 2
+    assert result["price"] == 250.1
+    assert result["trade_type"] == "sell"
+    assert datetime.strptime(result["date"], "%Y-%m-%d") == datetime(2024, 3, 1)
+
+
+def test_fixture_backend_latency_is_overlapped_in_batches(tmp_path):
+    backend = FixtureBackend(latency=0.1)
+    images = [make_screenshot(text=f"Buy T{i}", size=(200, 400)) for i in range(10)]
+    for i, image in enumerate(images):
+        backend.add(image, f'{{"trade_type": "buy", "ticker": "T{i}", "quantity": 1, "price": 1, "date": null}}')
+    parser = TradeParser(backend=backend, cache=ParseCache(path=None), max_concurrency=10)
+
+    start = time.perf_counter()
+    results = parser.parse_screenshots(images)
+
+    assert time.perf_counter() - start < 0.5
+    assert [r["ticker"] for r in results] == [f"T{i}" for i in range(10)]
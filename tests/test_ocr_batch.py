@@ -0,0 +1,78 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+from ocr import TradeParser
+from ocr_backends import OCRBackend, OpenAIBackend
+from ocr_cache import ParseCache
+
+
+def passthrough(image_bytes):
+    return {"data": image_bytes, "mime_type": "image/png", "original_bytes": len(image_bytes),
+            "bytes": len(image_bytes), "elapsed_ms": 0.0}
+
+
+class FakeBackend(OCRBackend):
+    """Replies with the image bytes as the ticker, after calling `hook`."""
+
+    retryable_errors = OpenAIBackend(api_key="test_key").retryable_errors
+
+    def __init__(self, hook):
+        self.hook = hook
+
+    def complete(self, prompt, image, timeout=None):
+        self.hook(timeout)
+        ticker = image["data"].decode()
+        return f'{{"trade_type": "buy", "ticker": "{ticker}", "quantity": 1, "price": 10, "date": "2024-01-02"}}'
+
+
+def make_parser(hook, **kwargs):
+    return TradeParser(cache=ParseCache(path=None), preprocessor=SimpleNamespace(process=passthrough),
+                       backend=FakeBackend(hook), backoff_base=0.01, **kwargs)
+
+
+def test_batch_runs_concurrently_and_keeps_input_order():
+    tickers = [f"T{i}" for i in range(12)] + ["T0"]
+    in_flight, peak, calls = [0], [0], []
+    lock = threading.Lock()
+
+    def hook(timeout):
+        with lock:
+            calls.append(1)
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.2)
+        with lock:
+            in_flight[0] -= 1
+
+    parser = make_parser(hook, max_concurrency=12)
+    start = time.perf_counter()
+    results = parser.parse_screenshots([ticker.encode() for ticker in tickers])
+    elapsed = time.perf_counter() - start
+
+    assert [r["ticker"] for r in results] == tickers
+    assert len(calls) == 12  # the duplicate image is parsed once
+    assert peak[0] == 12
+    assert elapsed < 1.0
+
+
+def test_rate_limits_are_retried_with_a_timeout():
+    attempts = []
+
+    def hook(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            response = SimpleNamespace(request=None, status_code=429, headers={})
+            raise openai.RateLimitError("slow down", response=response, body=None)
+
+    parser = make_parser(hook, request_timeout=5.0)
+    assert parser.parse_screenshots([b"AAPL"])[0]["ticker"] == "AAPL"
+    assert attempts == [5.0, 5.0, 5.0]
+
+    attempts.clear()
+    parser = make_parser(hook, max_retries=1)
+    result = parser.parse_screenshot(b"MSFT")
+    assert result["success"] is False
+    assert len(attempts) == 2
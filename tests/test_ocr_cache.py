@@ -0,0 +1,51 @@
+import hashlib
+
+from conftest import make_screenshot
+from ocr import TradeParser
+from ocr_backends import FixtureBackend
+from ocr_cache import ParseCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ParseCache(path=None, max_memory_entries=2)
+    cache.put("a", {"ticker": "A"})
+    cache.put("b", {"ticker": "B"})
+    assert cache.get("a") == {"ticker": "A"}
+    cache.put("c", {"ticker": "C"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"ticker": "A"}
+    assert cache.stats()["memory_hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_store_persists_expires_and_is_bounded(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ParseCache(path=path, max_disk_entries=2)
+    cache.put("a", {"ticker": "A"})
+    cache.put("b", {"ticker": "B"})
+    cache.put("c", {"ticker": "C"})
+
+    reopened = ParseCache(path=path)
+    assert reopened.get("a") is None
+    assert reopened.get("c") == {"ticker": "C"}
+    assert reopened.stats()["disk_hits"] == 1
+
+    expired = ParseCache(path=path, ttl_seconds=-1)
+    assert expired.get("b") is None
+
+
+def test_parse_screenshot_calls_model_once_per_image():
+    image = make_screenshot()
+    backend = FixtureBackend()
+    backend.add(image, '{"trade_type": "buy", "ticker": "AAPL", "quantity": 3, "price": 190.5, "date": "2024-01-02"}')
+    cache = ParseCache(path=None)
+    parser = TradeParser(cache=cache, backend=backend)
+
+    first = parser.parse_screenshot(image)
+    second = parser.parse_screenshot(image)
+
+    assert first == second
+    assert first["ticker"] == "AAPL"
+    assert backend.calls == 1
+    assert cache.get(hashlib.sha256(image).hexdigest())["price"] == 190.5
@@ -0,0 +1,222 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+
+from database import Contest, Payout, PayoutStatus
+from payouts import HTTPPaymentGateway, PaymanGateway, PayoutWorker
+
+
+@pytest.fixture
+def payment_server():
+    """A payments API that fails the next `state["fail"]` requests (to `state["path"]`, if set)."""
+    state = {"fail": 0, "status": 503, "path": None, "requests": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["requests"].append((self.path, self.headers["Idempotency-Key"], body))
+            if state["fail"] and state["path"] in (None, self.path):
+                state["fail"] -= 1
+                self.send_response(state["status"])
+                self.end_headers()
+                return
+            reply = {"id": "payee-1"} if self.path == "/payees" else {"reference": "ref-" + body["payee_id"]}
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(reply).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", state
+    server.shutdown()
+
+
+@pytest.fixture
+def queued(manager):
+    contest = manager.create_contest("Test", "profit >= 1000")
+    alice = manager.join_contest(contest.join_code, "alice")
+    return contest.id, alice.id
+
+
+def make_worker(db, url, **kwargs):
+    factory = sessionmaker(bind=db.get_bind(), expire_on_commit=False)
+    return PayoutWorker(factory, HTTPPaymentGateway(url), backoff_base=0, **kwargs)
+
+
+def test_payout_is_queued_once_per_winner(manager, queued):
+    contest_id, alice_id = queued
+    first = manager.payout_winner(contest_id, alice_id)
+    second = manager.payout_winner(contest_id, alice_id)
+    assert first["id"] == second["id"]
+    assert first["status"] == "pending" and first["amount"] == 50.0
+    assert manager.db.query(Payout).count() == 1
+    assert manager.payout_winner(contest_id, alice_id + 1) is None
+
+
+def test_worker_sends_payment_with_idempotency_key(manager, db, queued, payment_server):
+    url, state = payment_server
+    payout = manager.payout_winner(*queued)
+    worker = make_worker(db, url)
+
+    assert worker.run_once() == 1
+    assert worker.run_once() == 0
+    result = manager.get_payout(payout["id"])
+    assert result["status"] == "succeeded"
+    assert result["reference"] == "ref-payee-1"
+    assert result["attempts"] == 1
+    key = f"contest-{queued[0]}-winner-{queued[1]}"
+    assert [(path, header) for path, header, _ in state["requests"]] == [
+        ("/payees", f"{key}-payee"), ("/payments", key),
+    ]
+    assert state["requests"][1][2]["amount"] == 50.0  # stored in cents, sent in dollars
+    # A repeat click after success does not pay again
+    assert manager.payout_winner(*queued)["status"] == "succeeded"
+    assert worker.run_once() == 0
+
+
+def test_worker_retries_transient_failures(manager, db, queued, payment_server):
+    url, state = payment_server
+    state["fail"], state["path"] = 2, "/payments"
+    payout = manager.payout_winner(*queued)
+    worker = make_worker(db, url)
+
+    worker.run_once()
+    assert manager.get_payout(payout["id"])["status"] == "pending"
+    worker.run_once()
+    worker.run_once()
+    result = manager.get_payout(payout["id"])
+    assert result["status"] == "succeeded" and result["attempts"] == 3
+    # The payee was created once and reused by the retries
+    assert [path for path, _, _ in state["requests"]] == ["/payees"] + ["/payments"] * 3
+    assert state["requests"][-1][2]["payee_id"] == "payee-1"
+
+
+def test_exhausted_or_rejected_payouts_fail_and_can_be_requeued(manager, db, queued, payment_server):
+    url, state = payment_server
+    state["fail"] = 2
+    payout = manager.payout_winner(*queued)
+    worker = make_worker(db, url, max_attempts=2)
+    worker.run_once()
+    worker.run_once()
+    result = manager.get_payout(payout["id"])
+    assert result["status"] == "failed" and "HTTP 503" in result["last_error"]
+
+    assert manager.payout_winner(*queued)["status"] == "pending"
+    state["fail"], state["status"] = 1, 400
+    worker.run_once()
+    assert manager.get_payout(payout["id"])["status"] == "failed"  # 4xx is not retried
+
+    manager.payout_winner(*queued)
+    worker.run_once()
+    assert manager.get_payout(payout["id"])["status"] == "succeeded"
+
+
+def test_stale_claims_are_retried(manager, db, queued, payment_server):
+    url, _ = payment_server
+    payout = manager.payout_winner(*queued)
+    # A worker claimed the job and died before recording the outcome
+    db.execute(update(Payout).values(status=PayoutStatus.PROCESSING,
+                                     claimed_at=datetime.utcnow() - timedelta(minutes=1)))
+    db.commit()
+    worker = make_worker(db, url, lease_seconds=3600)
+    assert worker.run_once() == 0
+
+    worker.lease_seconds = 30
+    assert worker.run_once() == 1
+    assert manager.get_payout(payout["id"])["status"] == "succeeded"
+
+
+class FakePaymanClient:
+    """Stands in for the Payman SDK client, recording each call's keyword arguments."""
+
+    def __init__(self):
+        self.calls = []
+        self.payments = self
+
+    def create_payee(self, **kwargs):
+        self.calls.append(("create_payee", kwargs))
+        return type("Payee", (), {"id": "payee-1"})
+
+    def send_payment(self, **kwargs):
+        self.calls.append(("send_payment", kwargs))
+        return type("Payment", (), {"reference": "ref-1"})
+
+
+def test_payman_payments_carry_the_key_and_are_not_resent_after_a_lost_outcome(manager, db, queued):
+    client = FakePaymanClient()
+    factory = sessionmaker(bind=db.get_bind(), expire_on_commit=False)
+    worker = PayoutWorker(factory, PaymanGateway(client), lease_seconds=30)
+    payout = manager.payout_winner(*queued)
+
+    assert worker.run_once() == 1
+    assert manager.get_payout(payout["id"])["status"] == "succeeded"
+    key = f"contest-{queued[0]}-winner-{queued[1]}"
+    assert [kwargs["extra_headers"]["Idempotency-Key"] for _, kwargs in client.calls] == [f"{key}-payee", key]
+    assert db.get(Payout, payout["id"], populate_existing=True).sending_at is None
+
+    # A worker died after marking the job as sending: the payment may have gone out
+    db.execute(update(Payout).values(status=PayoutStatus.PROCESSING, reference=None,
+                                     claimed_at=datetime.utcnow() - timedelta(minutes=1),
+                                     sending_at=datetime.utcnow() - timedelta(minutes=1)))
+    db.commit()
+    client.calls.clear()
+    assert worker.run_once() == 0
+    result = manager.get_payout(payout["id"])
+    assert result["status"] == "failed" and "check with the provider" in result["last_error"]
+    assert client.calls == []
+
+
+def test_non_idempotent_sends_are_not_retried(manager, db, queued):
+    client = FakePaymanClient()
+    sends = []
+
+    def time_out(**kwargs):
+        # The provider may have taken the payment before the reply was lost
+        sends.append(kwargs)
+        raise TimeoutError("read timed out")
+    client.send_payment = time_out
+    factory = sessionmaker(bind=db.get_bind(), expire_on_commit=False)
+    worker = PayoutWorker(factory, PaymanGateway(client), backoff_base=0)
+    payout = manager.payout_winner(*queued)
+
+    worker.run_once()
+    worker.run_once()
+    assert len(sends) == 1
+    result = manager.get_payout(payout["id"])
+    assert result["status"] == "failed" and result["last_error"].startswith("Outcome unknown")
+
+    # Failing to create the payee sends nothing, so it is retried
+    def refuse(**kwargs):
+        raise TimeoutError("connect timed out")
+    client.create_payee = refuse
+    bob = manager.join_contest(db.get(Contest, queued[0]).join_code, "bob")
+    retried = manager.payout_winner(queued[0], bob.id)
+    worker.run_once()
+    assert manager.get_payout(retried["id"])["status"] == "pending"
+    assert len(sends) == 1
+
+
+def test_background_worker_processes_queued_payouts(manager, db, queued, payment_server):
+    url, _ = payment_server
+    worker = make_worker(db, url, poll_interval=60)
+    worker.start()
+    try:
+        payout = manager.payout_winner(*queued)
+        worker.wake()
+        deadline = time.monotonic() + 5
+        while manager.get_payout(payout["id"])["status"] != "succeeded" and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert manager.get_payout(payout["id"])["status"] == "succeeded"
+    finally:
+        worker.stop(timeout=5)
@@ -0,0 +1,89 @@
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from sqlalchemy import event
+
+from database import ContestStatus, Position
+from prices import FileQuoteSource, HTTPQuoteSource, PriceService
+
+QUOTES = {"AAPL": 150.0, "MSFT": 400.0, "TSLA": 90.0}
+
+
+@pytest.fixture
+def quote_server():
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            symbols = parse_qs(urlparse(self.path).query)["symbols"][0].split(",")
+            requests.append(symbols)
+            body = json.dumps({s: QUOTES[s] for s in symbols if s in QUOTES}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/quotes", requests
+    server.shutdown()
+
+
+def setup_contests(manager, db):
+    active = manager.create_contest("Active", "profit >= 1000")
+    finished = manager.create_contest("Finished", "profit >= 1000")
+    alice = manager.join_contest(active.join_code, "alice")
+    bob = manager.join_contest(active.join_code, "bob")
+    carol = manager.join_contest(finished.join_code, "carol")
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(alice.id, "MSFT", "BUY", 1, 300.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "AAPL", "BUY", 5, 120.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "NFLX", "BUY", 1, 500.0, datetime(2024, 1, 1))
+    manager.process_trade(carol.id, "TSLA", "BUY", 1, 200.0, datetime(2024, 1, 1))
+    finished.status = ContestStatus.COMPLETED
+    db.commit()
+    return active.id, carol.id
+
+
+def test_refresh_batches_quotes_and_revalues_standings(manager, db, quote_server):
+    url, requests = quote_server
+    active_id, carol_id = setup_contests(manager, db)
+    service = PriceService(HTTPQuoteSource(url), ttl_seconds=60)
+
+    updates = []
+    listener = lambda conn, cursor, statement, params, context, executemany: updates.append(statement) \
+        if statement.startswith("UPDATE positions") else None  # noqa: E731
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        result = service.refresh(manager)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+    assert requests == [["AAPL", "MSFT", "NFLX"]]
+    assert result == {"tickers": 3, "priced": 2, "missing": ["NFLX"], "positions_updated": 3}
+    assert len(updates) == 1  # one executemany, one parameter set per ticker
+    assert db.query(Position).filter_by(player_id=carol_id).one().current_price == 20_000
+
+    leaderboard = manager.get_leaderboard(active_id)
+    assert leaderboard[0]["name"] == "alice"
+    assert leaderboard[0]["market_value"] == pytest.approx(10 * 150.0 + 400.0)
+    assert leaderboard[0]["total_profit"] == pytest.approx(600.0)
+    assert leaderboard[1]["total_profit"] == pytest.approx(5 * 30.0)
+    assert manager.rebuild_standings(active_id) == 0
+
+    service.refresh(manager)
+    assert requests == [["AAPL", "MSFT", "NFLX"], ["NFLX"]]  # cached quotes are not refetched
+
+
+def test_file_quote_source(tmp_path):
+    path = tmp_path / "quotes.json"
+    path.write_text(json.dumps({"aapl": 1.5}))
+    assert FileQuoteSource(str(path)).get_quotes(["AAPL", "MSFT"]) == {"AAPL": 1.5}
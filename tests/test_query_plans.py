@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from database import ContestStatus
+from payouts import PaymentGateway, PayoutWorker
+
+
+class StubGateway(PaymentGateway):
+    def create_payee(self, payout):
+        return "payee"
+
+    def send_payment(self, payout, payee_id):
+        return "reference"
+
+
+def test_contest_manager_queries_use_indexes(manager, db):
+    engine = db.get_bind()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        contest = manager.create_contest("Test", "profit >= 1000")
+        contest_id, join_code = contest.id, contest.join_code
+        alice = manager.join_contest(join_code, "alice")
+        bob = manager.join_contest(join_code, "bob")
+        alice_id, bob_id = alice.id, bob.id
+        manager.process_trade(alice_id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+        manager.process_trade(alice_id, "AAPL", "SELL", 10, 110.0, datetime(2024, 1, 2))
+        manager.record_trade(bob_id, {"ticker": "MSFT", "quantity": 1, "price": 300.0, "trade_type": "BUY"})
+        manager.get_active_contests()
+        manager.get_contest_players(contest_id)
+        manager.get_player_positions(alice_id)
+        manager.get_player_trades(alice_id)
+        manager.get_leaderboard(contest_id, limit=10)
+        page = manager.get_contest_trades(contest_id, limit=1)
+        manager.get_contest_trades(contest_id, before=page["next_cursor"], ticker="AAPL", trade_type="BUY")
+        manager.get_contest_trades(contest_id, player_id=alice_id)
+        manager.rebuild_standings(contest_id)
+        manager.get_active_tickers()
+        manager.update_prices({"AAPL": 120.0, "MSFT": 310.0})
+        manager.snapshot_ledger(contest_id, datetime(2024, 1, 1, 12))
+        manager.get_standings_at(contest_id, datetime(2024, 1, 3))
+        manager.process_trade(alice_id, "AAPL", "BUY", 1, 100.0, datetime(2024, 1, 1))
+        manager.backfill_equity_curve(contest_id)
+        manager.get_equity_curve(contest_id, start=datetime(2024, 1, 1).date())
+        payout = manager.payout_winner(contest_id, alice_id)
+        PayoutWorker(sessionmaker(bind=engine), StubGateway()).run_once()
+        manager.get_payout(payout["id"])
+        manager.check_contest_completion(contest_id)
+        manager.get_contests(ContestStatus.ACTIVE, ContestStatus.COMPLETED)
+        manager.expire_contests()
+        manager.snapshot_active_ledgers()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert statements
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            details = [row[-1] for row in plan]
+            full_scans = [d for d in details if d.startswith("SCAN") and "USING" not in d]
+            assert not full_scans, f"{statement}\n{details}"
@@ -0,0 +1,128 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from contest import TradeRejected
+from database import Contest, ContestStatus
+from rules import RuleError, Threshold, TopAtEnd, compile_rule
+from test_contest import count_queries
+
+
+def standing(profit, starting_balance=1_000_000, market_value=0):
+    """A standings row; amounts in cents."""
+    return SimpleNamespace(total_profit=profit, starting_balance=starting_balance,
+                           cash_balance=starting_balance + profit - market_value, market_value=market_value)
+
+
+def test_compile_rules():
+    rule = compile_rule("Profit >= $1,000")
+    assert isinstance(rule, Threshold) and rule.value == 100_000 and rule.ends_at is None
+    assert rule.met_by(standing(100_000), datetime(2024, 1, 1))
+    assert not rule.met_by(standing(99_999), datetime(2024, 1, 1))
+
+    rule = compile_rule("return >= 10% by 2024-06-30")
+    assert rule.ends_at == datetime(2024, 7, 1)
+    assert rule.value == 10.0
+    assert rule.met_by(standing(100_000), datetime(2024, 6, 30, 23, 59))
+    assert not rule.met_by(standing(100_000), datetime(2024, 7, 1))
+    assert compile_rule("value > 25000").met_by(standing(1_500_001, market_value=2_000_000), datetime(2024, 1, 1))
+    assert not compile_rule("value > 25000").met_by(standing(1_500_000), datetime(2024, 1, 1))
+
+    rule = compile_rule("top 3 at 2024-12-31")
+    assert isinstance(rule, TopAtEnd) and rule.top == 3 and rule.ends_at == datetime(2025, 1, 1)
+    assert not rule.met_by(standing(10 ** 9), datetime(2024, 1, 1))
+
+
+@pytest.mark.parametrize("text", [
+    "When a player reaches $1,000 in profits", "profit >= 10%", "top 0 at 2024-12-31",
+    "return >= 10% by 2024-02-30", "profit >=",
+])
+def test_invalid_rules_are_rejected(manager, text):
+    with pytest.raises(RuleError):
+        compile_rule(text)
+    with pytest.raises(RuleError):
+        manager.create_contest("Bad", text)
+
+
+def test_trade_that_meets_the_rule_completes_the_contest(manager, db):
+    contest = manager.create_contest("Race", "profit >= 500", starting_balance=10000.0)
+    contest_id = contest.id
+    alice = manager.join_contest(contest.join_code, "alice")
+    bob = manager.join_contest(contest.join_code, "bob")
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    assert db.get(Contest, contest_id).status == ContestStatus.ACTIVE
+
+    # Selling at 160 books $600 profit: the check reads only bob's standing
+    statements, stop = count_queries(db)
+    before = datetime.utcnow()
+    try:
+        assert manager.process_trade(bob.id, "AAPL", "SELL", 10, 160.0, datetime(2024, 1, 2))
+    finally:
+        stop()
+    assert not [s for s in statements if "FROM contest_standings" in s and "ORDER BY" in s]
+
+    contest = db.get(Contest, contest_id, populate_existing=True)
+    assert contest.status == ContestStatus.COMPLETED
+    # Completed when the trade was entered, not on the trade's own date
+    assert contest.winner_id == bob.id and before <= contest.completed_at <= datetime.utcnow()
+    assert manager.get_active_contests() == []
+    assert [c.id for c in manager.get_contests(ContestStatus.ACTIVE, ContestStatus.COMPLETED)] == [contest_id]
+    # The contest is over: no more trades
+    with pytest.raises(TradeRejected):
+        manager.process_trade(alice.id, "AAPL", "SELL", 10, 200.0, datetime(2024, 1, 3))
+
+
+def test_backdated_trades_do_not_win_after_the_deadline(manager, db):
+    contest = manager.create_contest("Past", "profit >= 500 by 2020-01-31", starting_balance=10000.0)
+    contest_id = contest.id
+    alice = manager.join_contest(contest.join_code, "alice")
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2020, 1, 1))
+    # Dated before the deadline, but entered after it
+    assert manager.process_trade(alice.id, "AAPL", "SELL", 10, 160.0, datetime(2020, 1, 2))
+    assert manager.import_trades(alice.id, [
+        {"ticker": "AAPL", "trade_type": "BUY", "quantity": 10, "price": 100.0, "date": "2020-01-03"},
+        {"ticker": "AAPL", "trade_type": "SELL", "quantity": 10, "price": 200.0, "date": "2020-01-04"},
+    ])["imported"] == 2
+    contest = db.get(Contest, contest_id, populate_existing=True)
+    assert contest.status == ContestStatus.ACTIVE and contest.winner_id is None
+
+
+def test_import_stops_at_the_winning_trade(manager, db):
+    contest = manager.create_contest("Race", "return >= 5%", starting_balance=10000.0)
+    alice = manager.join_contest(contest.join_code, "alice")
+    result = manager.import_trades(alice.id, [
+        {"ticker": "AAPL", "trade_type": "BUY", "quantity": 10, "price": 100.0, "date": "2024-01-01"},
+        {"ticker": "AAPL", "trade_type": "SELL", "quantity": 10, "price": 150.0, "date": "2024-01-02"},
+        {"ticker": "MSFT", "trade_type": "BUY", "quantity": 1, "price": 300.0, "date": "2024-01-03"},
+    ])
+    assert result["imported"] == 2
+    assert result["rejected"] == [{"row": 2, "error": "Contest is completed"}]
+    assert db.get(Contest, contest.id, populate_existing=True).winner_id == alice.id
+
+
+def test_price_moves_and_end_dates_complete_contests(manager, db):
+    by_price = manager.create_contest("Prices", "profit >= 500")
+    ranked = manager.create_contest("Ranked", "top 2 at 2099-03-31")
+    expiring = manager.create_contest("Expiring", "profit >= 500 by 2099-03-31")
+    alice = manager.join_contest(by_price.join_code, "alice")
+    bob = manager.join_contest(ranked.join_code, "bob")
+    carol = manager.join_contest(ranked.join_code, "carol")
+    manager.process_trade(alice.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(carol.id, "MSFT", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    ids = by_price.id, ranked.id, expiring.id
+    assert db.get(Contest, ranked.id).ends_at == datetime(2099, 4, 1)
+
+    manager.update_prices({"AAPL": 160.0})
+    assert db.get(Contest, ids[0], populate_existing=True).winner_id == alice.id
+    assert not manager.check_contest_completion(ids[1], now=datetime(2099, 3, 31, 12))
+
+    assert manager.check_contest_completion(ids[1], now=datetime(2099, 4, 1))
+    assert manager.check_contest_completion(ids[2], now=datetime(2099, 4, 1))
+    ranked = db.get(Contest, ids[1], populate_existing=True)
+    # "top 2": both standings win, best first
+    assert ranked.winner_id == bob.id and ranked.winners == [bob.id, carol.id]
+    expired = db.get(Contest, ids[2], populate_existing=True)
+    assert expired.status == ContestStatus.COMPLETED and expired.winner_id is None and expired.winners == []
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from database import Contest, ContestStatus, JobRun, LedgerSnapshot, Position
+from scheduler import Job, Scheduler, default_jobs
+
+NOW = datetime(2099, 1, 1)
+
+
+@pytest.fixture
+def factory(db):
+    return sessionmaker(bind=db.get_bind(), expire_on_commit=False)
+
+
+def test_jobs_run_when_due_and_state_persists(db, factory):
+    calls = []
+    scheduler = Scheduler(factory)
+
+    @scheduler.register("count", interval=60, jitter=0.5)
+    def count(manager):
+        calls.append(manager)
+        return {"calls": len(calls)}
+
+    # The first run is jittered into the first half interval
+    assert scheduler.run_pending(NOW) == {}
+    assert scheduler.run_pending(NOW + timedelta(seconds=30)) == {"count": {"calls": 1}}
+    row = db.get(JobRun, "count")
+    assert row.runs == 1 and row.last_status == "ok" and json.loads(row.last_result) == {"calls": 1}
+    assert NOW + timedelta(seconds=60) <= row.next_run_at <= NOW + timedelta(seconds=120)
+
+    # A new scheduler (e.g. after a restart) keeps the schedule
+    restarted = Scheduler(factory, [Job("count", count, interval=60)])
+    assert restarted.run_pending(NOW + timedelta(seconds=59)) == {}
+    assert restarted.run_pending(NOW + timedelta(seconds=121)) == {"count": {"calls": 2}}
+    assert [job["runs"] for job in restarted.status()] == [2]
+
+
+def test_a_running_job_is_not_started_again(db, factory):
+    started, release = threading.Event(), threading.Event()
+
+    def slow(manager):
+        started.set()
+        release.wait(5)
+
+    first = Scheduler(factory, [Job("slow", slow, interval=1, jitter=0, lease=60)])
+    second = Scheduler(factory, [Job("slow", slow, interval=1, jitter=0, lease=60)])
+    thread = threading.Thread(target=first.run_pending, args=(NOW,))
+    thread.start()
+    try:
+        assert started.wait(5)
+        assert second.run_pending(NOW + timedelta(seconds=10)) == {}
+        # Once the lease runs out the job is considered abandoned
+        started.clear()
+        threading.Thread(target=second.run_pending, args=(NOW + timedelta(seconds=61),)).start()
+        assert started.wait(5)
+    finally:
+        release.set()
+        thread.join(5)
+
+
+def test_failed_jobs_are_recorded_and_retried(db, factory):
+    attempts = []
+
+    def flaky(manager):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("quote source down")
+        return "ok"
+
+    scheduler = Scheduler(factory, [Job("flaky", flaky, interval=60, jitter=0)])
+    scheduler.run_pending(NOW)
+    status = scheduler.status()[0]
+    assert status["last_status"] == "error" and status["last_error"] == "quote source down"
+    assert scheduler.run_pending(NOW + timedelta(seconds=30)) == {}
+    assert scheduler.run_pending(NOW + timedelta(seconds=60)) == {"flaky": "ok"}
+    assert scheduler.status()[0]["last_error"] is None
+
+
+def test_default_jobs(manager, db, factory, tmp_path, monkeypatch):
+    quotes = tmp_path / "quotes.json"
+    quotes.write_text(json.dumps({"AAPL": 120.0}))
+    monkeypatch.setenv("QUOTES_FILE", str(quotes))
+    ended = manager.create_contest("Ended", "top 1 at 2024-12-31")
+    running = manager.create_contest("Running", "profit >= 100000")
+    alice = manager.join_contest(ended.join_code, "alice")
+    bob = manager.join_contest(running.join_code, "bob")
+    manager.process_trade(alice.id, "MSFT", "BUY", 1, 300.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+    ended_id, running_id = ended.id, running.id
+
+    scheduler = Scheduler(factory, default_jobs())
+    assert sorted(scheduler.jobs) == ["expire_contests", "refresh_prices", "snapshot_ledgers"]
+    assert scheduler.run_pending(NOW) == {}  # registers the jobs, first runs jittered
+    results = scheduler.run_pending(NOW + timedelta(hours=1))
+    assert results["expire_contests"] == [ended_id]
+    assert results["snapshot_ledgers"] == [running_id]
+    assert results["refresh_prices"]["positions_updated"] == 1
+
+    db.commit()  # end the test session's read transaction to see the jobs' writes
+    contest = db.get(Contest, ended_id, populate_existing=True)
+    assert contest.status == ContestStatus.COMPLETED and contest.winner_id == alice.id
+    assert db.query(LedgerSnapshot).filter_by(contest_id=running_id).count() == 1
+    assert db.query(Position).filter_by(player_id=bob.id).one().current_price == 12_000
+    # Nothing new to snapshot next time
+    assert manager.snapshot_active_ledgers() == []
+
+
+def test_background_thread_runs_triggered_jobs(factory):
+    ran = threading.Event()
+    scheduler = Scheduler(factory, [Job("ping", lambda manager: ran.set(), interval=3600, jitter=0)])
+    scheduler.run_pending()
+    ran.clear()
+    scheduler.start()
+    try:
+        scheduler.trigger("ping")
+        assert ran.wait(5)
+        deadline = time.monotonic() + 5
+        while scheduler.status()[0]["runs"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert scheduler.status()[0]["runs"] == 2
+    finally:
+        scheduler.stop(timeout=5)
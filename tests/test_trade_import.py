@@ -0,0 +1,60 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from database import Position, Trade
+from trade_import import read_trades_csv
+
+ROBINHOOD_CSV = """Activity Date,Process Date,Settle Date,Instrument,Description,Trans Code,Quantity,Price,Amount
+1/03/2024,1/03/2024,1/05/2024,AAPL,Apple,Sell,5,$120.00,$600.00
+1/02/2024,1/02/2024,1/04/2024,AAPL,Apple,Buy,10,$100.00,($1000.00)
+1/02/2024,1/02/2024,1/04/2024,,ACH Deposit,ACH,,,$500.00
+1/04/2024,1/04/2024,1/08/2024,MSFT,Microsoft,Buy,1,"$1,000.00",($1000.00)
+1/05/2024,1/05/2024,1/09/2024,TSLA,Tesla,Sell,3,$200.00,$600.00
+1/06/2024,1/06/2024,1/10/2024,NVDA,Nvidia,Buy,0,$50.00,$0.00
+"""
+
+
+def test_read_robinhood_export_keeps_only_trades():
+    rows = read_trades_csv(io.StringIO(ROBINHOOD_CSV))
+    assert rows["ticker"].tolist() == ["AAPL", "AAPL", "MSFT", "TSLA", "NVDA"]
+    assert rows["row"].tolist() == [2, 3, 5, 6, 7]
+
+
+def test_import_trades_applies_in_date_order_and_reports_rejections(manager, db):
+    contest = manager.create_contest("Test", "profit >= 1000", starting_balance=1000.0)
+    contest_id = contest.id
+    player = manager.join_contest(contest.join_code, "alice")
+
+    result = manager.import_trades(player.id, read_trades_csv(io.StringIO(ROBINHOOD_CSV)))
+
+    assert result["imported"] == 2
+    assert result["rejected"] == [
+        {"row": 5, "error": "Insufficient funds. Required: $1,000.00, Available: $600.00"},
+        {"row": 6, "error": "Insufficient shares of TSLA to sell"},
+        {"row": 7, "error": "Quantity must be a positive number"},
+    ]
+    assert [t.type for t in db.query(Trade).order_by(Trade.id)] == ["BUY", "SELL"]
+    assert db.query(Position).filter_by(player_id=player.id).one().quantity == 5_000_000
+    assert manager.get_leaderboard(contest_id)[0]["cash_balance"] == pytest.approx(600.0)
+    assert manager.rebuild_standings(contest_id) == 0
+
+
+def test_import_trades_round_trips_closed_positions(manager, db):
+    contest = manager.create_contest("Test", "profit >= 1000")
+    player = manager.join_contest(contest.join_code, "alice")
+    rows = [
+        {"ticker": "aapl", "trade_type": "buy", "quantity": 2, "price": 10.0, "date": datetime(2024, 1, 1)},
+        {"ticker": "AAPL", "trade_type": "SELL", "quantity": 2, "price": 11.0, "date": datetime(2024, 1, 2)},
+        {"ticker": "AAPL", "trade_type": "BUY", "quantity": 1, "price": 12.0, "date": datetime(2024, 1, 3)},
+        {"ticker": "MSFT", "trade_type": "BUY", "quantity": 1, "price": 5.0, "date": datetime(2024, 1, 3)},
+        {"ticker": "MSFT", "trade_type": "SELL", "quantity": 1, "price": 6.0, "date": datetime(2024, 1, 4)},
+        {"ticker": "", "trade_type": "BUY", "quantity": 1, "price": 5.0, "date": "not a date"},
+    ]
+
+    result = manager.import_trades(player.id, rows)
+
+    assert result == {"imported": 5, "rejected": [{"row": 5, "error": "Missing ticker"}]}
+    positions = db.query(Position).filter_by(player_id=player.id).all()
+    assert [(p.ticker, p.quantity, p.average_price) for p in positions] == [("AAPL", 1_000_000, 1200)]
@@ -0,0 +1,70 @@
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from contest import ContestManager, TradeRejected
+from database import ContestStanding, Player, Position, Trade, init_db
+
+
+def test_process_trade_commits_once(manager, db):
+    contest = manager.create_contest("Test", "profit >= 1000")
+    player = manager.join_contest(contest.join_code, "alice")
+
+    commits = []
+    engine = db.get_bind()
+    listener = lambda conn: commits.append(conn)  # noqa: E731
+    event.listen(engine, "commit", listener)
+    try:
+        assert manager.process_trade(player.id, "AAPL", "BUY", 10, 100.0, datetime(2024, 1, 1))
+        with pytest.raises(TradeRejected):
+            manager.process_trade(player.id, "AAPL", "SELL", 20, 100.0, datetime(2024, 1, 2))
+    finally:
+        event.remove(engine, "commit", listener)
+
+    assert len(commits) == 1
+    assert db.query(Trade).count() == 1
+
+
+def test_concurrent_trades_for_one_player_serialize(tmp_path):
+    db_path = str(tmp_path / "stress.db")
+    setup = ContestManager(init_db(db_path))
+    contest = setup.create_contest("Stress", "profit >= 1000", starting_balance=1000.0)
+    player_id = setup.join_contest(contest.join_code, "alice").id
+    contest_id = contest.id
+
+    threads, per_thread = 16, 10
+    results = []
+    barrier = threading.Barrier(threads)
+
+    def submit(n):
+        manager = ContestManager(init_db(db_path))
+        barrier.wait()
+        for i in range(per_thread):
+            # 160 buys of $10 against $1,000 of cash: exactly 100 can succeed
+            try:
+                results.append(manager.process_trade(player_id, "AAPL", "BUY", 1, 10.0, datetime(2024, 1, 1, 0, n, i))
+                               is not None)
+            except TradeRejected:
+                results.append(False)
+        manager.db.close()
+
+    workers = [threading.Thread(target=submit, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    db = init_db(db_path)
+    player = db.get(Player, player_id)
+    position = db.query(Position).filter_by(player_id=player_id).one()
+    standing = db.get(ContestStanding, (contest_id, player_id))
+
+    assert sum(results) == 100
+    assert db.query(Trade).count() == 100
+    assert player.cash_balance == 0
+    assert position.quantity == 100_000_000
+    assert standing.cash_balance == 0
+    assert standing.market_value == 100_000
+    assert ContestManager(db).rebuild_standings(contest_id) == 0
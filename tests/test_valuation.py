@@ -0,0 +1,51 @@
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from valuation import ContestPositions, value_portfolios
+
+
+def test_valuation_matches_leaderboard_and_applies_quotes(manager):
+    contest = manager.create_contest("Test", "profit >= 1000", starting_balance=1000.0)
+    contest_id, join_code = contest.id, contest.join_code
+    alice = manager.join_contest(join_code, "alice")
+    bob = manager.join_contest(join_code, "bob")
+    manager.join_contest(join_code, "carol")
+    manager.process_trade(alice.id, "AAPL", "BUY", 2, 100.0, datetime(2024, 1, 1))
+    manager.process_trade(alice.id, "MSFT", "BUY", 1, 300.0, datetime(2024, 1, 1))
+    manager.process_trade(bob.id, "AAPL", "BUY", 5, 110.0, datetime(2024, 1, 2))
+
+    valuation = manager.get_valuation(contest_id)
+    leaderboard = manager.get_leaderboard(contest_id)
+    for row, expected in zip(valuation, leaderboard):
+        assert row["player_id"] == expected["player_id"]
+        for key in ("cash_balance", "market_value", "unrealized_pl", "portfolio_value", "total_profit"):
+            assert row[key] == pytest.approx(expected[key])
+
+    what_if = {row["player_id"]: row for row in manager.get_valuation(contest_id, {"AAPL": 150.0})}
+    assert what_if[alice.id]["market_value"] == pytest.approx(2 * 150.0 + 300.0)
+    assert what_if[bob.id]["total_profit"] == pytest.approx(5 * 40.0)
+    assert what_if[bob.id]["return_pct"] == pytest.approx(20.0)
+
+
+def test_values_100k_positions_quickly():
+    rng = np.random.default_rng(0)
+    players, positions = 5_000, 100_000
+    player_ids = np.arange(1, players + 1)
+    frame = ContestPositions(
+        player_ids, rng.integers(0, 1_000_000, players), np.full(players, 1_000_000),
+        rng.integers(1, players + 1, positions), [f"T{i}" for i in rng.integers(0, 500, positions)],
+        rng.integers(1, 100, positions) * 1_000_000, rng.integers(100, 50_000, positions),
+        rng.integers(100, 50_000, positions),
+    )
+    quotes = {f"T{i}": (i + 1) * 100 for i in range(0, 500, 2)}
+
+    start = time.perf_counter()
+    result = value_portfolios(frame, quotes)
+    elapsed = time.perf_counter() - start
+
+    assert len(result) == players
+    assert result["total_profit"].is_monotonic_decreasing
+    assert elapsed < 0.1